@@ -1,7 +1,10 @@
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, inputs
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.user import User
 from extensions import db
+from services.response_cache import get_response_cache
+from services.semantic_cache import get_semantic_cache
+from services.bulk_delete import user_data_steps, run_steps, start_deletion_job, get_deletion_job
 
 ns = Namespace("admin", description="Gestion des utilisateurs (admin)")
 
@@ -54,6 +57,9 @@ class AdminUsers(Resource):
         db.session.commit()
         return {"message": "Utilisateur créé"}, 201
 
+user_delete_parser = ns.parser()
+user_delete_parser.add_argument("background", type=inputs.boolean, location="args", default=False, help="Supprimer en arrière-plan et suivre la progression")
+
 @ns.route("/users/<int:user_id>")
 class AdminUser(Resource):
     @admin_required()
@@ -77,8 +83,76 @@ class AdminUser(Resource):
         return {"message": "Utilisateur mis à jour"}, 200
 
     @admin_required()
+    @ns.expect(user_delete_parser)
     def delete(self, user_id):
+        """
+        Supprime l'utilisateur et ses données (DELETE par lots, transactions courtes, table par table).
+        Avec background=true, retourne 202 et un job_id à suivre via GET /admin/deletions/<job_id>.
+        """
         user = User.query.get_or_404(user_id)
-        db.session.delete(user)
-        db.session.commit()
-        return {"message": "Utilisateur supprimé"}, 200
\ No newline at end of file
+        args = user_delete_parser.parse_args()
+        if args["background"]:
+            job = start_deletion_job("user", int(get_jwt_identity()), f"user:{user.id}", lambda: user_data_steps(user_id))
+            return job.to_dict(), 202
+        deleted = run_steps(user_data_steps(user.id))
+        return {"message": "Utilisateur supprimé", "deleted": deleted}, 200
+
+@ns.route("/deletions/<string:job_id>")
+class AdminDeletionJob(Resource):
+    @admin_required()
+    def get(self, job_id):
+        """Progression d'une suppression lancée en arrière-plan (lignes supprimées / total, état)."""
+        job = get_deletion_job(job_id)
+        if job is None:
+            return {"message": "Suppression non trouvée."}, 404
+        return job.to_dict(), 200
+
+llm_cache_parser = ns.parser()
+llm_cache_parser.add_argument("model", type=str, location="args", help="Ne purger que les réponses de ce modèle")
+llm_cache_parser.add_argument("prompt", type=str, location="args", help="Ne purger que ce message (normalisé comme la clé du cache)")
+llm_cache_parser.add_argument("expired_only", type=inputs.boolean, location="args", default=False, help="Ne purger que les entrées expirées")
+
+@ns.route("/llm_cache")
+class AdminLLMCache(Resource):
+    @admin_required()
+    def get(self):
+        """Taille et paramètres du cache des réponses du LLM."""
+        cache = get_response_cache()
+        if cache is None:
+            return {"message": "Cache des réponses désactivé (LLM_CACHE_ENABLED)."}, 404
+        return cache.get_stats(), 200
+
+    @admin_required()
+    @ns.expect(llm_cache_parser)
+    def delete(self):
+        """Purge le cache des réponses du LLM (tout, ou filtré par modèle / message / expiration)."""
+        cache = get_response_cache()
+        if cache is None:
+            return {"message": "Cache des réponses désactivé (LLM_CACHE_ENABLED)."}, 404
+        args = llm_cache_parser.parse_args()
+        deleted = cache.purge(model=args["model"], prompt=args["prompt"], expired_only=args["expired_only"])
+        return {"message": "Cache des réponses purgé", "deleted": deleted}, 200
+
+semantic_cache_parser = ns.parser()
+semantic_cache_parser.add_argument("model", type=str, location="args", help="Ne purger que les réponses de ce modèle")
+
+@ns.route("/semantic_cache")
+class AdminSemanticCache(Resource):
+    @admin_required()
+    def get(self):
+        """Taille et paramètres du cache sémantique des réponses du LLM."""
+        cache = get_semantic_cache()
+        if cache is None:
+            return {"message": "Cache sémantique désactivé (SEMANTIC_CACHE_ENABLED)."}, 404
+        return cache.get_stats(), 200
+
+    @admin_required()
+    @ns.expect(semantic_cache_parser)
+    def delete(self):
+        """Purge le cache sémantique (tout, ou les réponses d'un modèle)."""
+        cache = get_semantic_cache()
+        if cache is None:
+            return {"message": "Cache sémantique désactivé (SEMANTIC_CACHE_ENABLED)."}, 404
+        args = semantic_cache_parser.parse_args()
+        deleted = cache.purge(model=args["model"])
+        return {"message": "Cache sémantique purgé", "deleted": deleted}, 200
@@ -1,10 +1,20 @@
-from flask_restx import Namespace, Resource, fields
+from flask_restx import Namespace, Resource, fields, inputs
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from services.chat_service import process_chat_message
+from services.chat_service import process_chat_message, stream_chat_message, get_chat_metrics
+from services.llm_scheduler import LLMQueueFull
+from services.inference_pool import InferenceQueueFull
+from services.chat_jobs import enqueue_chat_job, ChatJobQueueFull
+from services.chat_history import list_conversations, list_messages, get_history
+from services.bulk_delete import chat_history_steps, run_steps, start_deletion_job, get_deletion_job
+from models.chat_job import ChatJob
 from models.chat_message import ChatMessage
 from models.user import User
 from extensions import db
+from flask import Response, stream_with_context, request
 import logging
+import json
+import math
+import os
 import uuid
 from sqlalchemy.exc import IntegrityError, DataError
 
@@ -14,6 +24,15 @@ logger = logging.getLogger(__name__)
 
 ns = Namespace("chat", description="Chatbot pour agriculteurs")
 
+@ns.errorhandler(LLMQueueFull)
+def handle_llm_queue_full(error):
+    """File de génération pleine (503) ou limite par utilisateur atteinte (429), avec l'attente estimée."""
+    return (
+        {"message": str(error), "retry_after": error.retry_after_s},
+        error.status,
+        {"Retry-After": str(max(1, math.ceil(error.retry_after_s)))}
+    )
+
 # Modèle pour l'envoi d'un message
 message_model = ns.model("ChatMessage", {
     "message": fields.String(required=True, description="Message envoyé par l'utilisateur"),
@@ -27,6 +46,25 @@ response_model = ns.model("ChatResponse", {
     "conversation_id": fields.String(description="ID de la conversation")
 })
 
+# Parser pour un message accompagné d'une photo (multipart/form-data)
+image_message_parser = ns.parser()
+image_message_parser.add_argument('image', type='file', location='files', required=True, help="Photo de la plante (jpg, png)")
+image_message_parser.add_argument('message', type=str, location='form', required=True, help="Message envoyé par l'utilisateur")
+image_message_parser.add_argument('conversation_id', type=str, location='form', help="ID de la conversation (optionnel, généré si non fourni)")
+
+ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# Durées du traitement : chaque étape, bout en bout et somme des étapes (recouvrement = somme - bout en bout)
+timings_model = ns.model("ChatTimings", {
+    "stages_ms": fields.Raw(description="Durée de chaque étape (ms)"),
+    "end_to_end_ms": fields.Float(description="Durée de bout en bout (ms)"),
+    "stage_sum_ms": fields.Float(description="Somme des durées des étapes (ms)")
+})
+
+image_response_model = ns.inherit("ChatImageResponse", response_model, {
+    "timings": fields.Nested(timings_model, description="Durées du traitement")
+})
+
 # Modèle pour les détails d'un message dans l'historique
 message_detail_model = ns.model("ChatMessageDetail", {
     "id": fields.Integer(description="ID du message"),
@@ -41,6 +79,36 @@ history_model = ns.model("ChatHistory", {
     "messages": fields.List(fields.Nested(message_detail_model))
 })
 
+# Modèle pour un élément de la liste des conversations
+conversation_summary_model = ns.model("ConversationSummary", {
+    "conversation_id": fields.String(description="ID de la conversation"),
+    "message_count": fields.Integer(description="Nombre de messages"),
+    "started_at": fields.String(description="Date du premier message"),
+    "last_message_at": fields.String(description="Date du dernier message"),
+    "last_message": fields.String(description="Aperçu du dernier message"),
+    "last_response": fields.String(description="Aperçu de la dernière réponse")
+})
+
+conversation_page_model = ns.model("ConversationPage", {
+    "conversations": fields.List(fields.Nested(conversation_summary_model)),
+    "next_cursor": fields.String(description="Curseur de la page suivante (null s'il n'y en a plus)")
+})
+
+message_page_model = ns.model("ChatMessagePage", {
+    "conversation_id": fields.String(description="ID de la conversation"),
+    "messages": fields.List(fields.Nested(message_detail_model), description="Messages de la page, dans l'ordre chronologique"),
+    "next_cursor": fields.String(description="Curseur des messages plus anciens (null s'il n'y en a plus)")
+})
+
+# Pagination par curseur : "cursor" est le next_cursor de la page précédente
+page_parser = ns.parser()
+page_parser.add_argument("limit", type=int, location="args", help="Nombre d'éléments par page (100 au maximum)")
+page_parser.add_argument("cursor", type=str, location="args", help="Curseur renvoyé par la page précédente")
+
+# Suppression par lots, éventuellement en arrière-plan (202 + suivi via GET /chat/deletions/<job_id>)
+delete_parser = ns.parser()
+delete_parser.add_argument("background", type=inputs.boolean, location="args", default=False, help="Supprimer en arrière-plan et suivre la progression")
+
 # Modèle pour la mise à jour d'un message
 update_message_model = ns.model("UpdateMessage", {
     "message": fields.String(required=True, description="Nouveau contenu du message")
@@ -91,6 +159,8 @@ class ChatSend(Resource):
             created_at = last_message.created_at.isoformat()
             return {"response": response, "created_at": created_at, "conversation_id": conversation_id}, 200
 
+        except LLMQueueFull:
+            raise
         except IntegrityError as e:
             db.session.rollback()
             logger.error(f"Erreur d'intégrité lors de l'envoi du message : {e}")
@@ -104,6 +174,175 @@ class ChatSend(Resource):
             logger.error(f"Erreur lors de l'envoi du message au chatbot : {e}")
             return {"message": "Une erreur s'est produite lors du traitement de votre message."}, 500
 
+@ns.route("/send_with_image")
+class ChatSendWithImage(Resource):
+    @jwt_required()
+    @ns.expect(image_message_parser)
+    @ns.response(200, "Réponse du chatbot", image_response_model)
+    def post(self):
+        """
+        Envoie un message accompagné d'une photo de plante (multipart/form-data : image, message, conversation_id).
+        Le diagnostic de l'image et la réponse au texte sont préparés en parallèle ; la réponse indique
+        la durée de chaque étape, la durée de bout en bout et la somme des étapes.
+        """
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        if not user:
+            logger.warning(f"Utilisateur avec ID {user_id} non trouvé.")
+            return {"message": "Utilisateur non trouvé."}, 404
+
+        image_file = request.files.get('image')
+        if image_file is None or image_file.filename == '':
+            return {"message": "Aucun fichier image n'a été soumis."}, 400
+        if os.path.splitext(image_file.filename)[1].lower() not in ALLOWED_IMAGE_EXTENSIONS:
+            return {"message": "Format d'image invalide. Utilisez JPG ou PNG."}, 400
+
+        try:
+            message, conversation_id = validate_message_payload(request.form)
+        except ValueError as e:
+            logger.warning(f"Message avec image invalide : {e}")
+            return {"message": str(e)}, 400
+
+        try:
+            timings = {}
+            response = process_chat_message(user_id, message, conversation_id=conversation_id, image=image_file, timings=timings)
+
+            last_message = ChatMessage.query.filter_by(user_id=user_id, conversation_id=conversation_id).order_by(ChatMessage.created_at.desc()).first()
+            if not last_message:
+                logger.error("Échec de l'enregistrement du message dans la base de données.")
+                return {"message": "Erreur lors de l'enregistrement du message."}, 500
+
+            return {
+                "response": response,
+                "created_at": last_message.created_at.isoformat(),
+                "conversation_id": conversation_id,
+                "timings": timings or None
+            }, 200
+
+        except LLMQueueFull:
+            raise
+        except InferenceQueueFull as e:
+            return {"message": str(e)}, 503
+        except ValueError as e:
+            db.session.rollback()
+            logger.error(f"Erreur lors de l'envoi du message avec image : {e}")
+            return {"message": str(e)}, 400
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Erreur lors de l'envoi du message avec image au chatbot : {e}")
+            return {"message": "Une erreur s'est produite lors du traitement de votre message."}, 500
+
+def validate_message_payload(data):
+    """Retourne (message, conversation_id normalisé) ou lève ValueError avec le message d'erreur."""
+    message = data.get("message")
+    conversation_id = data.get("conversation_id") or str(uuid.uuid4())
+    if not message or not message.strip():
+        raise ValueError("Le message ne peut pas être vide.")
+    try:
+        conversation_id = str(uuid.UUID(conversation_id))
+    except ValueError:
+        raise ValueError("L'ID de la conversation doit être un UUID valide.")
+    return message, conversation_id
+
+def sse_event(event, data):
+    """Formate un événement Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@ns.route("/stream")
+class ChatStream(Resource):
+    @jwt_required()
+    @ns.expect(message_model)
+    def post(self):
+        """
+        Envoie un message au chatbot et reçoit la réponse token par token (text/event-stream).
+        Événements : "token" ({"content"}), puis "done" ({"response", "created_at", "conversation_id"})
+        ou "error" ({"message"}). La réponse complète est enregistrée dans l'historique.
+        """
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        if not user:
+            logger.warning(f"Utilisateur avec ID {user_id} non trouvé.")
+            return {"message": "Utilisateur non trouvé."}, 404
+
+        try:
+            message, conversation_id = validate_message_payload(ns.payload or {})
+        except ValueError as e:
+            logger.warning(f"Message en flux invalide : {e}")
+            return {"message": str(e)}, 400
+
+        def generate():
+            try:
+                for event, payload in stream_chat_message(user_id, message, conversation_id):
+                    yield sse_event(event, payload)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Erreur lors de la génération en flux : {e}")
+                yield sse_event("error", {"message": "Une erreur s'est produite lors du traitement de votre message."})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # Pas de mise en tampon par nginx
+        )
+
+@ns.route("/jobs")
+class ChatJobs(Resource):
+    @jwt_required()
+    @ns.expect(message_model)
+    def post(self):
+        """
+        Mode asynchrone : met le message en file et retourne immédiatement un job_id (202).
+        La réponse est envoyée sur Socket.IO (namespace /expert, room user_<id>, événement "chat_job_done")
+        et reste consultable via GET /chat/jobs/<job_id>.
+        """
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        if not user:
+            logger.warning(f"Utilisateur avec ID {user_id} non trouvé.")
+            return {"message": "Utilisateur non trouvé."}, 404
+        try:
+            message, conversation_id = validate_message_payload(ns.payload or {})
+        except ValueError as e:
+            logger.warning(f"Message asynchrone invalide : {e}")
+            return {"message": str(e)}, 400
+        try:
+            job = enqueue_chat_job(user_id, message, conversation_id)
+        except ChatJobQueueFull as e:
+            return {"message": str(e)}, 503
+        logger.debug(f"Job de chat {job.id} mis en file pour l'utilisateur {user_id}")
+        return {"job_id": job.id, "status": job.status, "conversation_id": conversation_id}, 202
+
+    @jwt_required()
+    def get(self):
+        """
+        Derniers jobs de l'utilisateur (par exemple après une reconnexion, pour récupérer les réponses manquées).
+        """
+        user_id = get_jwt_identity()
+        jobs = ChatJob.query.filter_by(user_id=user_id).order_by(ChatJob.created_at.desc()).limit(20).all()
+        return [job.to_dict() for job in jobs], 200
+
+@ns.route("/jobs/<string:job_id>")
+class ChatJobResource(Resource):
+    @jwt_required()
+    def get(self, job_id):
+        """
+        État d'un job de chat (queued, running, done, failed) et réponse une fois disponible.
+        """
+        user_id = get_jwt_identity()
+        job = ChatJob.query.filter_by(id=job_id, user_id=user_id).first()
+        if not job:
+            return {"message": "Job non trouvé."}, 404
+        return job.to_dict(), 200
+
+@ns.route("/metrics")
+class ChatMetrics(Resource):
+    @jwt_required()
+    def get(self):
+        """
+        Statistiques du chatbot (temps jusqu'au premier token, débit de génération, erreurs).
+        """
+        return get_chat_metrics(), 200
+
 @ns.route("/history")
 class ChatHistory(Resource):
     @jwt_required()
@@ -111,6 +350,7 @@ class ChatHistory(Resource):
     def get(self):
         """
         Récupère l'historique des messages de l'utilisateur, regroupés par conversation.
+        Pour les historiques longs, préférer GET /chat/conversations puis GET /chat/conversations/<id>/messages.
         """
         try:
             user_id = get_jwt_identity()
@@ -120,27 +360,8 @@ class ChatHistory(Resource):
                 logger.warning(f"Utilisateur avec ID {user_id} non trouvé.")
                 return {"message": "Utilisateur non trouvé."}, 404
 
-            # Récupérer les conversations distinctes
-            conversations = db.session.query(ChatMessage.conversation_id).filter_by(user_id=user_id).distinct().all()
-            conversation_ids = [conv[0] for conv in conversations]
-
-            # Récupérer les messages pour chaque conversation
-            result = []
-            for conv_id in conversation_ids:
-                messages = ChatMessage.query.filter_by(user_id=user_id, conversation_id=conv_id).order_by(ChatMessage.created_at.asc()).all()
-                result.append({
-                    "conversation_id": conv_id,
-                    "messages": [
-                        {
-                            "id": m.id,  # Ajout de l'ID du message
-                            "message": m.message,
-                            "response": m.response,
-                            "created_at": m.created_at.isoformat()
-                        }
-                        for m in messages
-                    ]
-                })
-            return result, 200
+            # Une seule requête, messages regroupés par conversation (GET /chat/conversations pour paginer)
+            return get_history(user.id), 200
 
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de l'historique : {e}")
@@ -149,10 +370,13 @@ class ChatHistory(Resource):
 @ns.route("/history/delete")
 class ChatHistoryDelete(Resource):
     @jwt_required()
+    @ns.expect(delete_parser)
     def delete(self):
         """
-        Supprime l'historique des messages de l'utilisateur.
+        Supprime l'historique des messages de l'utilisateur (DELETE par lots, transactions courtes).
+        Avec background=true, retourne 202 et un job_id à suivre via GET /chat/deletions/<job_id>.
         """
+        args = delete_parser.parse_args()
         try:
             user_id = get_jwt_identity()
             # Vérifier si l'utilisateur existe
@@ -161,18 +385,17 @@ class ChatHistoryDelete(Resource):
                 logger.warning(f"Utilisateur avec ID {user_id} non trouvé.")
                 return {"message": "Utilisateur non trouvé."}, 404
 
-            messages = ChatMessage.query.filter_by(user_id=user_id).all()
-            
-            if not messages:
+            if not db.session.query(ChatMessage.id).filter_by(user_id=user.id).first():
                 logger.info(f"Aucun message à supprimer pour l'utilisateur {user_id}.")
                 return {"message": "Aucun historique à supprimer."}, 200
 
-            for message in messages:
-                db.session.delete(message)
-            db.session.commit()
+            if args["background"]:
+                job = start_deletion_job("chat_history", user.id, f"user:{user.id}", lambda: chat_history_steps(user.id))
+                return job.to_dict(), 202
 
-            logger.info(f"Historique supprimé avec succès pour l'utilisateur {user_id}.")
-            return {"message": "Historique supprimé avec succès."}, 200
+            deleted = run_steps(chat_history_steps(user.id))
+            logger.info(f"Historique supprimé avec succès pour l'utilisateur {user_id} ({deleted}).")
+            return {"message": "Historique supprimé avec succès.", "deleted": deleted}, 200
 
         except Exception as e:
             db.session.rollback()
@@ -181,6 +404,25 @@ class ChatHistoryDelete(Resource):
 
 @ns.route("/conversations")
 class Conversations(Resource):
+    @jwt_required()
+    @ns.expect(page_parser)
+    @ns.response(200, "Page de conversations", conversation_page_model)
+    def get(self):
+        """
+        Liste les conversations de l'utilisateur (la plus récemment active d'abord), avec le nombre de messages
+        et un aperçu du dernier échange. Pagination par curseur (next_cursor).
+        """
+        args = page_parser.parse_args()
+        try:
+            user_id = int(get_jwt_identity())
+            conversations, next_cursor = list_conversations(user_id, limit=args["limit"], cursor=args["cursor"])
+            return {"conversations": conversations, "next_cursor": next_cursor}, 200
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des conversations : {e}")
+            return {"message": "Une erreur s'est produite lors de la récupération des conversations."}, 500
+
     @jwt_required()
     def post(self):
         """
@@ -204,10 +446,13 @@ class Conversations(Resource):
 @ns.route("/conversations/<string:conversation_id>")
 class Conversation(Resource):
     @jwt_required()
+    @ns.expect(delete_parser)
     def delete(self, conversation_id):
         """
-        Supprime une conversation spécifique.
+        Supprime une conversation spécifique (DELETE par lots, transactions courtes).
+        Avec background=true, retourne 202 et un job_id à suivre via GET /chat/deletions/<job_id>.
         """
+        args = delete_parser.parse_args()
         try:
             user_id = get_jwt_identity()
             # Vérifier si l'utilisateur existe
@@ -224,24 +469,63 @@ class Conversation(Resource):
                 logger.warning(f"conversation_id invalide : {conversation_id}")
                 return {"message": "L'ID de la conversation doit être un UUID valide."}, 400
 
-            messages = ChatMessage.query.filter_by(user_id=user_id, conversation_id=conversation_id).all()
-            
-            if not messages:
+            if not db.session.query(ChatMessage.id).filter_by(user_id=user.id, conversation_id=conversation_id).first():
                 logger.info(f"Aucune conversation trouvée avec l'ID {conversation_id} pour l'utilisateur {user_id}.")
                 return {"message": "Conversation non trouvée."}, 404
 
-            for message in messages:
-                db.session.delete(message)
-            db.session.commit()
+            if args["background"]:
+                job = start_deletion_job("conversation", user.id, f"conversation:{conversation_id}",
+                                         lambda: chat_history_steps(user.id, conversation_id))
+                return job.to_dict(), 202
 
-            logger.info(f"Conversation {conversation_id} supprimée avec succès pour l'utilisateur {user_id}.")
-            return {"message": "Conversation supprimée avec succès."}, 200
+            deleted = run_steps(chat_history_steps(user.id, conversation_id))
+            logger.info(f"Conversation {conversation_id} supprimée avec succès pour l'utilisateur {user_id} ({deleted}).")
+            return {"message": "Conversation supprimée avec succès.", "deleted": deleted}, 200
 
         except Exception as e:
             db.session.rollback()
             logger.error(f"Erreur lors de la suppression de la conversation : {e}")
             return {"message": "Une erreur s'est produite lors de la suppression de la conversation."}, 500
 
+@ns.route("/conversations/<string:conversation_id>/messages")
+class ConversationMessages(Resource):
+    @jwt_required()
+    @ns.expect(page_parser)
+    @ns.response(200, "Page de messages", message_page_model)
+    def get(self, conversation_id):
+        """
+        Messages d'une conversation, page par page en remontant dans le temps : la première page contient
+        les derniers messages, next_cursor donne accès aux plus anciens. Chaque page est dans l'ordre chronologique.
+        """
+        args = page_parser.parse_args()
+        try:
+            conversation_id = str(uuid.UUID(conversation_id))
+        except ValueError:
+            return {"message": "L'ID de la conversation doit être un UUID valide."}, 400
+        try:
+            user_id = int(get_jwt_identity())
+            messages, next_cursor = list_messages(user_id, conversation_id, limit=args["limit"], cursor=args["cursor"])
+            if not messages and not args["cursor"]:
+                return {"message": "Conversation non trouvée."}, 404
+            return {"conversation_id": conversation_id, "messages": messages, "next_cursor": next_cursor}, 200
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        except Exception as e:
+            logger.error(f"Erreur lors de la récupération des messages de la conversation : {e}")
+            return {"message": "Une erreur s'est produite lors de la récupération des messages."}, 500
+
+@ns.route("/deletions/<string:job_id>")
+class ChatDeletionJob(Resource):
+    @jwt_required()
+    def get(self, job_id):
+        """
+        Progression d'une suppression lancée en arrière-plan (lignes supprimées / total, état).
+        """
+        job = get_deletion_job(job_id)
+        if job is None or job.owner_id != int(get_jwt_identity()):
+            return {"message": "Suppression non trouvée."}, 404
+        return job.to_dict(), 200
+
 @ns.route("/messages/<int:message_id>")
 class ChatMessageResource(Resource):
     @jwt_required()
@@ -292,6 +576,9 @@ class ChatMessageResource(Resource):
             logger.info(f"Message {message_id} mis à jour avec succès pour l'utilisateur {user_id}.")
             return {"message": "Message mis à jour avec succès."}, 200
 
+        except LLMQueueFull:
+            db.session.rollback()
+            raise
         except Exception as e:
             db.session.rollback()
             logger.error(f"Erreur lors de la mise à jour du message : {e}")
@@ -6,8 +6,8 @@ from models.user import User
 from services.expert_service import send_private_message, notify_all_experts, respond_to_request, send_session_ended
 from models.public_request import PublicRequest
 from models.expert_session import ExpertSession, SessionMessage
+from services.storage import UPLOAD_ROOT, save_upload, add_reference
 import os
-from datetime import datetime
 import logging
 
 # Configurer le logging
@@ -57,17 +57,14 @@ class PublicRequestResource(Resource):
             if ext not in allowed_extensions:
                 logger.error(f"Format non supporté: {ext}")
                 return {"message": "Format non supporté."}, 400
-            file_path = f"uploads/{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-            os.makedirs("uploads", exist_ok=True)
-            file.save(file_path)
-            content = f"/uploads/{os.path.basename(file_path)}"
+            blob_hash, content = save_upload(file, ext)
             if ext in {'.jpg', '.jpeg', '.png'}:
                 request_type = "image"
             elif ext == '.mp4':
                 request_type = "video"
             else:  # .wav, .mp3, .webm
                 request_type = "audio"
-            logger.debug(f"Fichier uploadé - chemin: {file_path}, type: {request_type}")
+            logger.debug(f"Fichier uploadé - chemin: {content}, type: {request_type}")
         elif not content:
             logger.error("Contenu ou fichier requis manquant")
             return {"message": "Contenu ou fichier requis."}, 400
@@ -75,6 +72,9 @@ class PublicRequestResource(Resource):
         try:
             request_obj = PublicRequest(user_id=user_id, request_type=request_type, content=content)
             db.session.add(request_obj)
+            if file:
+                db.session.flush()
+                add_reference(blob_hash, "public_request", request_obj.id)
             db.session.commit()
             logger.debug(f"Demande publique créée - request_id: {request_obj.id}")
             notify_all_experts(request_obj)
@@ -135,17 +135,14 @@ class RespondRequest(Resource):
             if ext not in allowed_extensions:
                 logger.error(f"Format non supporté: {ext}")
                 return {"message": "Format non supporté."}, 400
-            file_path = f"uploads/{expert_id}_{request_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-            os.makedirs("uploads", exist_ok=True)
-            file.save(file_path)
-            content = f"/uploads/{os.path.basename(file_path)}"
+            blob_hash, content = save_upload(file, ext)
             if ext in {'.jpg', '.jpeg', '.png'}:
                 message_type = "image"
             elif ext == '.mp4':
                 message_type = "video"
             else:  # .wav, .mp3, .webm
                 message_type = "audio"
-            logger.debug(f"Fichier uploadé - chemin: {file_path}, type: {message_type}")
+            logger.debug(f"Fichier uploadé - chemin: {content}, type: {message_type}")
 
         try:
             session = ExpertSession(user_id=public_request.user_id, expert_id=expert_id, public_request_id=request_id, status="active")
@@ -156,6 +153,9 @@ class RespondRequest(Resource):
 
             message = SessionMessage(session_id=session.id, sender_id=expert_id, message_type=message_type, content=content, status="sent")
             db.session.add(message)
+            if file:
+                db.session.flush()
+                add_reference(blob_hash, "session_message", message.id)
             public_request.responded = True
             db.session.commit()
 
@@ -213,18 +213,14 @@ class SendPrivateMessage(Resource):
                 logger.error(f"Format non supporté: {ext}")
                 return {"message": "Format non supporté."}, 400
             
-            file_path = f"uploads/{sender_id}_{session.id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-            os.makedirs("uploads", exist_ok=True)
-            logger.debug(f"Sauvegarde du fichier à: {file_path}")
-            file.save(file_path)
-            content = f"/uploads/{os.path.basename(file_path)}"
+            blob_hash, content = save_upload(file, ext)
             if ext in {'.jpg', '.jpeg', '.png'}:
                 message_type = "image"
             elif ext == '.mp4':
                 message_type = "video"
             else:  # .wav, .mp3, .webm
                 message_type = "audio"
-            logger.debug(f"Fichier uploadé - chemin: {file_path}, type: {message_type}")
+            logger.debug(f"Fichier uploadé - chemin: {content}, type: {message_type}")
 
         elif not content and message_type not in ["audio_call", "video_call", "audio_call_signal", "video_call_signal"]:
             logger.error("Contenu requis manquant")
@@ -233,6 +229,9 @@ class SendPrivateMessage(Resource):
         try:
             message = SessionMessage(session_id=session.id, sender_id=sender_id, message_type=message_type, content=content, status="sent")
             db.session.add(message)
+            if file:
+                db.session.flush()
+                add_reference(blob_hash, "session_message", message.id)
             db.session.commit()
             logger.debug(f"Message envoyé - message_id: {message.id}, type: {message_type}, content: {content}")
 
@@ -357,7 +356,7 @@ class ServeUploads(Resource):
     def get(self, filename):
         """Servir les fichiers uploadés"""
         try:
-            file_path = os.path.join("uploads", filename)
+            file_path = os.path.join(UPLOAD_ROOT, filename)
             if not os.path.exists(file_path):
                 logger.error(f"Fichier non trouvé: {file_path}")
                 return {"message": "Fichier non trouvé."}, 404
@@ -374,7 +373,7 @@ class ServeUploads(Resource):
             }.get(ext, 'application/octet-stream')
 
             logger.debug(f"Servir fichier: {file_path}, Content-Type: {content_type}")
-            response = send_from_directory("uploads", filename)
+            response = send_from_directory(UPLOAD_ROOT, filename)
             response.headers['Content-Type'] = content_type
             response.headers['Access-Control-Allow-Origin'] = '*'
             return response
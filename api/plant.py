@@ -1,7 +1,11 @@
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from services.plant_service import detect_plant_disease
-from flask import request
+from services.plant_service import detect_plant_disease, detect_plant_diseases, summarize_diagnoses, get_inference_metrics, get_inference_status, get_pool
+from services.inference_pool import InferenceQueueFull
+from config import Config
+from flask import request, Response, stream_with_context
+from contextlib import ExitStack
+import json
 import os 
 
 ns = Namespace("plant", description="Détection des maladies des plantes")
@@ -18,6 +22,12 @@ response_model = ns.model("PlantDetectionResponse", {
 parser = ns.parser()
 parser.add_argument('image', type='file', location='files', required=True, help="Fichier image (jpg, png, etc.)")
 
+# Parser pour un lot d'images (champ "images" répété)
+batch_parser = ns.parser()
+batch_parser.add_argument('images', type='file', location='files', action='append', required=True, help="Fichiers images (jpg, png)")
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
 @ns.route("/detect")
 class PlantDetect(Resource):
     @jwt_required()
@@ -37,9 +47,90 @@ class PlantDetect(Resource):
         if image_file.filename == '':
             ns.abort(400, "Aucun fichier sélectionné.")
 
-        allowed_extensions = {'.jpg', '.jpeg', '.png'}
-        if not '.' in image_file.filename or os.path.splitext(image_file.filename)[1].lower() not in allowed_extensions:
+        if not '.' in image_file.filename or os.path.splitext(image_file.filename)[1].lower() not in ALLOWED_EXTENSIONS:
             ns.abort(400, "Format d'image invalide. Utilisez JPG ou PNG.")
 
-        result = detect_plant_disease(image_file, user_id)
-        return result, 200
\ No newline at end of file
+        try:
+            result = detect_plant_disease(image_file, user_id)
+        except InferenceQueueFull as e:
+            ns.abort(503, str(e))
+        return result, 200
+
+@ns.route("/detect_batch")
+class PlantDetectBatch(Resource):
+    @jwt_required()
+    @ns.expect(batch_parser)
+    def post(self):
+        """
+        Soumet plusieurs images (relevé de terrain) en une seule requête multipart.
+        Les résultats sont renvoyés en NDJSON au fil de l'eau (une ligne par image),
+        suivis d'une ligne {"summary": ...} avec le nombre d'images par maladie et la confiance moyenne.
+        La place dans la file d'inférence est réservée pour tout le lot avant le début du flux (503 sinon).
+        """
+        user_id = get_jwt_identity()
+
+        too_large = f"Lot trop volumineux (maximum {Config.PLANT_BATCH_MAX_BYTES // (1024 * 1024)} Mo)."
+        if request.content_length and request.content_length > Config.PLANT_BATCH_MAX_BYTES:
+            ns.abort(413, too_large)
+        # Sans Content-Length (envoi par morceaux), la limite s'applique pendant la lecture du multipart (413) ;
+        # limite par requête modifiable depuis Flask 3.1 (cf. requirements.txt)
+        request.max_content_length = Config.PLANT_BATCH_MAX_BYTES
+
+        image_files = [f for f in request.files.getlist('images') if f.filename]
+        if not image_files:
+            ns.abort(400, "Aucun fichier image n'a été soumis.")
+        if len(image_files) > Config.PLANT_BATCH_MAX_IMAGES:
+            ns.abort(400, f"Trop d'images dans le lot (maximum {Config.PLANT_BATCH_MAX_IMAGES}).")
+        invalid = [f.filename for f in image_files if os.path.splitext(f.filename)[1].lower() not in ALLOWED_EXTENSIONS]
+        if invalid:
+            ns.abort(400, f"Format d'image invalide pour : {', '.join(invalid)}. Utilisez JPG ou PNG.")
+        # Taille cumulée des fichiers lus (double contrôle, quel que soit le mode d'envoi)
+        total_bytes = 0
+        for image_file in image_files:
+            image_file.stream.seek(0, os.SEEK_END)
+            total_bytes += image_file.stream.tell()
+            image_file.stream.seek(0)
+        if total_bytes > Config.PLANT_BATCH_MAX_BYTES:
+            ns.abort(413, too_large)
+
+        # Une seule admission pour tout le lot, libérée à la fin du flux (ou à la fermeture de la réponse)
+        admission = ExitStack()
+        try:
+            admission.enter_context(get_pool().admission())
+        except InferenceQueueFull as e:
+            ns.abort(503, str(e))
+
+        def generate():
+            results = []
+            try:
+                for result in detect_plant_diseases(image_files, user_id):
+                    results.append(result)
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+            except Exception:
+                # Terminer proprement le flux : ligne d'erreur puis synthèse des résultats déjà envoyés
+                yield json.dumps({"error": "Erreur lors du diagnostic du lot, veuillez réessayer."}, ensure_ascii=False) + "\n"
+            finally:
+                admission.close()
+            yield json.dumps({"summary": summarize_diagnoses(results)}, ensure_ascii=False) + "\n"
+
+        response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        response.call_on_close(admission.close)
+        return response
+
+@ns.route("/ready")
+class PlantInferenceReady(Resource):
+    def get(self):
+        """
+        Indique si l'inférence est disponible (200) ou si le modèle est encore en cours de chargement (503).
+        """
+        status = get_inference_status()
+        return status, 200 if status["ready"] else 503
+
+@ns.route("/metrics")
+class PlantInferenceMetrics(Resource):
+    @jwt_required()
+    def get(self):
+        """
+        Statistiques du batcher d'inférence (profondeur de file, tailles de lot, temps d'attente).
+        """
+        return get_inference_metrics(), 200
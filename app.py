@@ -11,6 +11,8 @@ from flask_socketio import SocketIO, join_room, leave_room, emit
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from datetime import datetime, timedelta
+from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError, ProgrammingError
 import os
 import atexit
 from extensions import db, jwt, mail, socketio
@@ -112,6 +114,9 @@ def create_app():
     from models.live_session import LiveSession
     from models.expert_session import ExpertSession, SessionMessage
     from models.public_request import PublicRequest
+    from models.blob import Blob, BlobReference
+    from models.chat_job import ChatJob
+    from models.conversation_summary import ConversationSummary
 
     api = Api(
         title="Agri Assist API",
@@ -133,6 +138,23 @@ def create_app():
             db.create_all()
             logger.debug("Tables créées avec succès dans la base de données.")
 
+            # create_all ne crée pas les index ajoutés depuis à une table existante
+            def create_missing_indexes():
+                inspector = inspect(db.engine)
+                for table in db.metadata.sorted_tables:
+                    existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+                    for index in table.indexes:
+                        if index.name in existing:
+                            continue
+                        # Un autre worker peut le créer au même moment, ou un index équivalent exister sous un autre nom :
+                        # on le signale sans empêcher le démarrage
+                        try:
+                            index.create(db.engine, checkfirst=True)
+                            logger.info(f"Index {index.name} créé sur la table {table.name}.")
+                        except (OperationalError, ProgrammingError) as e:
+                            logger.warning(f"Index {index.name} non créé sur la table {table.name} : {e}")
+            create_missing_indexes()
+
             def create_admin_user():
                 admin_email = os.getenv("ADMIN_EMAIL")
                 admin_username = os.getenv("ADMIN_USERNAME")
@@ -152,15 +174,22 @@ def create_app():
                     logger.debug("Utilisateur admin existe déjà, aucune création nécessaire.")
             create_admin_user()
 
-            import requests
-            try:
-                response = requests.get("http://127.0.0.1:11434/")
-                if response.status_code == 200:
-                    logger.debug("Ollama est en marche et accessible localement.")
-                else:
-                    logger.warning(f"Ollama renvoie un statut inattendu : {response.status_code}")
-            except requests.RequestException as e:
-                logger.warning(f"Ollama n'est pas accessible, continuation sans : {e}")
+            # Même client que le chatbot : l'état de santé est ensuite rafraîchi en tâche de fond
+            from services.ollama_client import get_ollama_client
+            ollama_client = get_ollama_client()
+            if ollama_client.check_health():
+                logger.debug("Ollama est en marche et accessible localement.")
+            else:
+                logger.warning("Ollama n'est pas accessible, continuation sans.")
+            ollama_client.start_health_monitor()
+
+            # Index BM25 de agri_dataset.txt (memory-map ; reconstruit seulement si le jeu de données a changé)
+            if Config.RETRIEVAL_ENABLED:
+                from services.retrieval import get_index
+                try:
+                    get_index()
+                except Exception as e:
+                    logger.warning(f"Index BM25 indisponible, réponses via le LLM uniquement : {e}")
         except Exception as e:
             logger.error(f"Erreur dans le contexte d'application : {e}")
             return None
@@ -417,6 +446,20 @@ def create_app():
         api.add_namespace(admin_ns, path="/admin")
 
     register_namespaces()
+
+    # Chargement du modèle de détection des maladies (TensorFlow n'est plus importé au démarrage)
+    from services.plant_service import start_background_loading, warm_up
+    preload = app.config.get('INFERENCE_PRELOAD')
+    if preload == "eager":
+        warm_up()
+    elif preload == "background":
+        start_background_loading()
+    logger.debug(f"Chargement du modèle de détection : {preload}")
+
+    # Workers des jobs de chat asynchrones (séparés des greenlets qui servent les requêtes)
+    from services.chat_jobs import start_chat_workers
+    start_chat_workers(app)
+
     logger.debug("create_app terminé avec succès")
     return app
 
@@ -8,4 +8,128 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-    WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")  
\ No newline at end of file
+    WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")  
+
+    # Base de données : suppressions en masse (historique, conversations, utilisateurs via /admin),
+    # par lots de BULK_DELETE_CHUNK_SIZE lignes par transaction
+    BULK_DELETE_CHUNK_SIZE = int(os.getenv("BULK_DELETE_CHUNK_SIZE", "500"))
+
+    # Inférence du modèle de détection des maladies des plantes (micro-lots)
+    INFERENCE_BATCHING_ENABLED = os.getenv("INFERENCE_BATCHING_ENABLED", "true").lower() == "true"
+    INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+    INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+
+    # Exécution de l'inférence hors du hub eventlet : "inline", "thread" (eventlet.tpool) ou "process"
+    INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread")
+    INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "2"))
+    INFERENCE_QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE_SIZE", "32"))
+
+    # Chargement du modèle : "background" (après démarrage du serveur), "eager" (bloquant dans create_app) ou "lazy" (première requête)
+    INFERENCE_PRELOAD = os.getenv("INFERENCE_PRELOAD", "background")
+
+    # Backend d'inférence : "keras" (modèle .h5 complet), "tflite" (artefact quantifié, cf. scripts/convert_tflite.py)
+    # ou "stub" (modèle factice pour les benchmarks, cf. scripts/bench_plant.py)
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "keras")
+    INFERENCE_MODEL_PATH = os.getenv("INFERENCE_MODEL_PATH")  # Remplace le chemin par défaut du backend
+    TFLITE_QUANTIZATION = os.getenv("TFLITE_QUANTIZATION", "float16")  # "float16" ou "int8"
+    TFLITE_NUM_THREADS = int(os.getenv("TFLITE_NUM_THREADS", "2"))
+
+    # Cache des diagnostics par hash du contenu de l'image (invalidé quand l'artefact du modèle change)
+    DIAGNOSIS_CACHE_ENABLED = os.getenv("DIAGNOSIS_CACHE_ENABLED", "true").lower() == "true"
+    DIAGNOSIS_CACHE_SIZE = int(os.getenv("DIAGNOSIS_CACHE_SIZE", "1024"))
+    DIAGNOSIS_CACHE_PERCEPTUAL = os.getenv("DIAGNOSIS_CACHE_PERCEPTUAL", "false").lower() == "true"  # Quasi-doublons (dHash)
+    DIAGNOSIS_CACHE_MAX_DISTANCE = int(os.getenv("DIAGNOSIS_CACHE_MAX_DISTANCE", "4"))  # Distance de Hamming max
+
+    # Limites de l'endpoint POST /plant/detect_batch
+    PLANT_BATCH_MAX_IMAGES = int(os.getenv("PLANT_BATCH_MAX_IMAGES", "50"))
+    PLANT_BATCH_MAX_BYTES = int(os.getenv("PLANT_BATCH_MAX_BYTES", str(100 * 1024 * 1024)))
+
+    # Cascade : un modèle léger répond seul au-dessus du seuil de confiance, sinon escalade vers le modèle complet
+    CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() == "true"
+    CASCADE_STAGE1_BACKEND = os.getenv("CASCADE_STAGE1_BACKEND", "tflite")
+    CASCADE_STAGE1_MODEL_PATH = os.getenv("CASCADE_STAGE1_MODEL_PATH", "models/mobilenetv2_small_128.tflite")
+    CASCADE_STAGE1_INPUT_SIZE = int(os.getenv("CASCADE_STAGE1_INPUT_SIZE", "128"))
+    CASCADE_THRESHOLD = float(os.getenv("CASCADE_THRESHOLD", "0.9"))
+    CASCADE_RETRY_SECONDS = float(os.getenv("CASCADE_RETRY_SECONDS", "300"))  # Délai avant de recharger un premier étage en échec
+
+    # Latence simulée par le backend "stub"
+    STUB_BATCH_LATENCY_MS = float(os.getenv("STUB_BATCH_LATENCY_MS", "20"))
+    STUB_IMAGE_LATENCY_MS = float(os.getenv("STUB_IMAGE_LATENCY_MS", "5"))
+
+    # Client Ollama (chatbot) : pool keep-alive, délais (secondes), disjoncteur et contrôle de santé périodique
+    OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "2"))
+    OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+    OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+    OLLAMA_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "3"))
+    OLLAMA_RESET_TIMEOUT = float(os.getenv("OLLAMA_RESET_TIMEOUT", "30"))
+    OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+    OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "gemma:2b")  # Modèle par défaut (routage désactivé, résumés)
+
+    # Routage des messages entre un petit modèle rapide et un modèle plus grand (questions complexes)
+    LLM_ROUTING_ENABLED = os.getenv("LLM_ROUTING_ENABLED", "false").lower() == "true"
+    LLM_SMALL_MODEL = os.getenv("LLM_SMALL_MODEL", "gemma:2b")
+    LLM_LARGE_MODEL = os.getenv("LLM_LARGE_MODEL", "gemma:7b")
+    LLM_ROUTE_LONG_CHARS = int(os.getenv("LLM_ROUTE_LONG_CHARS", "280"))  # Message long -> grand modèle
+    LLM_ROUTE_MULTI_QUESTIONS = int(os.getenv("LLM_ROUTE_MULTI_QUESTIONS", "2"))  # Questions en plusieurs parties
+    LLM_ROUTE_DOMAIN_TERMS = int(os.getenv("LLM_ROUTE_DOMAIN_TERMS", "3"))  # Termes de la base de connaissances
+    LLM_ROUTE_IMAGE_TO_LARGE = os.getenv("LLM_ROUTE_IMAGE_TO_LARGE", "true").lower() == "true"
+    # Modèles de secours si un modèle échoue : "modèle=secours1|secours2,..."
+    LLM_MODEL_FALLBACKS = os.getenv("LLM_MODEL_FALLBACKS", "gemma:7b=gemma:2b")
+
+    # Recherche BM25 dans agri_dataset.txt : réponse directe (sans LLM) au-dessus du score normalisé minimal
+    RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+    RETRIEVAL_INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", "indexes/agri_bm25")
+    RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.75"))
+    # Termes présents dans au plus N questions (cultures, ravageurs, nutriments...) : tous ceux du message
+    # doivent figurer dans la question trouvée, sinon pas de réponse directe ("fraises" ≠ "épinards")
+    RETRIEVAL_ENTITY_MAX_DF = int(os.getenv("RETRIEVAL_ENTITY_MAX_DF", "3"))
+
+    # Cache des réponses du LLM (SQLite) : message normalisé + modèle + version de l'instruction système
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "cache/llm_responses.sqlite3")
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # Secondes
+
+    # Cache sémantique : réponse réutilisée pour un message de sens proche (embeddings Ollama, cosinus >= seuil)
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    SEMANTIC_CACHE_EMBED_MODEL = os.getenv("SEMANTIC_CACHE_EMBED_MODEL", "nomic-embed-text")
+    # Embeddings : client Ollama à part (son propre disjoncteur), délai court et nombre d'appels simultanés borné
+    SEMANTIC_CACHE_EMBED_TIMEOUT = float(os.getenv("SEMANTIC_CACHE_EMBED_TIMEOUT", "10"))
+    SEMANTIC_CACHE_EMBED_CONCURRENCY = int(os.getenv("SEMANTIC_CACHE_EMBED_CONCURRENCY", "2"))
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000"))
+    SEMANTIC_CACHE_DIR = os.getenv("SEMANTIC_CACHE_DIR", "cache/semantic")
+    SEMANTIC_CACHE_SAVE_EVERY = int(os.getenv("SEMANTIC_CACHE_SAVE_EVERY", "20"))  # Insertions entre deux enregistrements
+    SEMANTIC_CACHE_SAMPLE_RATE = float(os.getenv("SEMANTIC_CACHE_SAMPLE_RATE", "0.05"))  # Part des réponses servies journalisées
+    SEMANTIC_CACHE_SAMPLES_PATH = os.getenv("SEMANTIC_CACHE_SAMPLES_PATH", "cache/semantic_samples.jsonl")
+
+    # Ordonnanceur des générations Ollama : concurrence, file bornée, limite par utilisateur et priorités
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+    LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "20"))
+    LLM_MAX_PER_USER = int(os.getenv("LLM_MAX_PER_USER", "2"))  # Demandes en cours + en attente
+    LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))  # Attente maximale en file (secondes)
+    LLM_SHORT_PROMPT_CHARS = int(os.getenv("LLM_SHORT_PROMPT_CHARS", "120"))  # Messages courts prioritaires
+    LLM_PRIORITY_ROLES = os.getenv("LLM_PRIORITY_ROLES", "expert,admin")  # Rôles servis en premier
+
+    # Jobs de chat asynchrones (POST /chat/jobs) : workers dédiés et file bornée
+    CHAT_JOB_WORKERS = int(os.getenv("CHAT_JOB_WORKERS", "2"))
+    CHAT_JOB_QUEUE_SIZE = int(os.getenv("CHAT_JOB_QUEUE_SIZE", "100"))
+    # Au-delà, un job "running" est considéré comme abandonné (processus arrêté) et repris au démarrage
+    CHAT_JOB_LEASE_SECONDS = int(os.getenv("CHAT_JOB_LEASE_SECONDS", "900"))
+
+    # Budget de génération : limite d'affichage (caractères) convertie en num_predict Ollama,
+    # par endpoint ("send", "stream", "jobs") et par rôle, ex. "stream:*=1500,*:expert=2000" ; 0 = pas de plafond.
+    # Par défaut, comme avant : 500 caractères pour /send et les jobs, flux (/stream) sans plafond
+    CHAT_MAX_RESPONSE_CHARS = int(os.getenv("CHAT_MAX_RESPONSE_CHARS", "500"))
+    CHAT_RESPONSE_LIMITS = os.getenv("CHAT_RESPONSE_LIMITS", "stream:*=0")
+
+    # Contexte des conversations : résumé glissant (mis à jour en arrière-plan) + derniers échanges
+    CONTEXT_ENABLED = os.getenv("CONTEXT_ENABLED", "true").lower() == "true"
+    CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "768"))  # Tokens estimés du prompt complet
+    CONTEXT_RECENT_TURNS = int(os.getenv("CONTEXT_RECENT_TURNS", "3"))  # Échanges conservés tels quels hors résumé
+    CONTEXT_SUMMARY_MAX_TOKENS = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "160"))
+    # Le résumé n'est mis à jour qu'une fois N échanges sortis de la fenêtre, par lots de MAX_TURNS au plus ;
+    # en attendant, ces échanges restent dans le prompt (dans la limite de CONTEXT_TOKEN_BUDGET)
+    CONTEXT_SUMMARY_EVERY_TURNS = int(os.getenv("CONTEXT_SUMMARY_EVERY_TURNS", "4"))
+    CONTEXT_SUMMARY_MAX_TURNS = int(os.getenv("CONTEXT_SUMMARY_MAX_TURNS", "12"))
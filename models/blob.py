@@ -0,0 +1,25 @@
+from extensions import db
+from datetime import datetime
+
+class Blob(db.Model):
+    __tablename__ = 'blobs'
+    hash = db.Column(db.String(64), primary_key=True)  # SHA-256 du contenu
+    path = db.Column(db.String(255), nullable=False)  # Relatif au dossier uploads/ (ex. blobs/ab/cd/<hash>.jpg)
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    references = db.relationship('BlobReference', backref='blob', lazy=True, cascade="all, delete-orphan")
+
+    def __repr__(self):
+        return f"<Blob {self.hash[:12]}, Path: {self.path}, Size: {self.size}>"
+
+class BlobReference(db.Model):
+    __tablename__ = 'blob_references'
+    id = db.Column(db.Integer, primary_key=True)
+    blob_hash = db.Column(db.String(64), db.ForeignKey('blobs.hash'), nullable=False, index=True)
+    record_type = db.Column(db.String(50), nullable=False)  # 'plant_disease', 'public_request', 'session_message'
+    record_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_blob_references_record', 'record_type', 'record_id'),)
+
+    def __repr__(self):
+        return f"<BlobReference {self.record_type}:{self.record_id} -> {self.blob_hash[:12]}>"
@@ -0,0 +1,33 @@
+from extensions import db
+from datetime import datetime
+import uuid
+
+class ChatJob(db.Model):
+    __tablename__ = 'chat_jobs'
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    conversation_id = db.Column(db.String(36), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # 'queued', 'running', 'done', 'failed'
+    response = db.Column(db.Text)
+    error = db.Column(db.Text)
+    chat_message_id = db.Column(db.Integer)  # Ligne ChatMessage créée une fois la réponse générée
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "conversation_id": self.conversation_id,
+            "message": self.message,
+            "response": self.response,
+            "error": self.error,
+            "chat_message_id": self.chat_message_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f"<ChatJob {self.id}, User: {self.user_id}, Status: {self.status}>"
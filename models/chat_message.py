@@ -3,6 +3,8 @@ import uuid
 
 class ChatMessage(db.Model):
     __tablename__ = 'chat_message'
+    # Messages d'une conversation dans l'ordre (pagination par curseur sur created_at, id)
+    __table_args__ = (db.Index('ix_chat_message_user_conversation_created', 'user_id', 'conversation_id', 'created_at'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)  # Changé de "user.id" à "users.id"
     conversation_id = db.Column(db.String(36), nullable=False, index=True, default=lambda: str(uuid.uuid4()))
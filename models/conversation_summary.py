@@ -0,0 +1,13 @@
+from extensions import db
+from datetime import datetime
+
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summaries'
+    conversation_id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    summary = db.Column(db.Text, nullable=False, default="")
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)  # Dernier ChatMessage intégré au résumé
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ConversationSummary {self.conversation_id}, jusqu'au message {self.last_message_id}>"
@@ -0,0 +1,111 @@
+"""
+Micro-benchmark de la recherche dans la base de connaissances statique.
+
+Compare, pour des bases de taille croissante (la base réelle complétée par des entrées synthétiques
+construites sur les mêmes formulations), l'ancien parcours linéaire (`key in message` sur chaque entrée)
+et l'automate d'Aho–Corasick de services.knowledge_base :
+- build_ms  : compilation de l'automate ;
+- linear_us / automaton_us : temps moyen d'une recherche (messages courts et longs, avec et sans réponse).
+
+Usage :
+    python scripts/bench_knowledge_base.py --sizes 60,1000,10000,50000 --output bench_kb.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from services.knowledge_base import KNOWLEDGE_BASE, KnowledgeBaseMatcher
+
+TEMPLATES = [
+    "comment planter des {}",
+    "quel est le meilleur engrais pour les {}",
+    "quand dois-je récolter mes {}",
+    "pourquoi mes {} ont-elles des taches brunes",
+    "comment protéger mes {} des insectes",
+]
+
+FILLER = "bonjour je cultive un petit champ près de la rivière et j'aimerais savoir".split()
+
+
+def build_entries(size, rng):
+    entries = dict(KNOWLEDGE_BASE)
+    i = 0
+    while len(entries) < size:
+        entries[rng.choice(TEMPLATES).format(f"culture{i}")] = f"Réponse synthétique {i}"
+        i += 1
+    return entries
+
+
+def build_messages(entries, count, rng):
+    keys = list(entries)
+    messages = []
+    for i in range(count):
+        words = rng.sample(FILLER, rng.randint(2, len(FILLER)))
+        if i % 2 == 0:  # Une question sur deux contient une clé de la base
+            words.insert(rng.randint(0, len(words)), rng.choice(keys).capitalize() + " ?")
+        messages.append(" ".join(words * (4 if i % 5 == 0 else 1)))  # Quelques messages longs
+    return messages
+
+
+def linear_lookup(entries, message):
+    """Ancienne implémentation de get_static_response."""
+    message = message.lower().strip()
+    for key in entries:
+        if key in message:
+            return entries[key]
+    return None
+
+
+def time_lookups(lookup, messages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            lookup(message)
+    return (time.perf_counter() - start) / (repeat * len(messages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="60,1000,10000,50000", help="Nombre d'entrées de la base")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = []
+    for size in [int(s) for s in args.sizes.split(",")]:
+        entries = build_entries(size, rng)
+        messages = build_messages(entries, args.messages, rng)
+
+        start = time.perf_counter()
+        matcher = KnowledgeBaseMatcher(entries)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # Le parcours linéaire est coûteux sur les grandes bases : moins de répétitions
+        linear_repeat = max(1, args.repeat * 1000 // len(entries))
+        row = {
+            "entries": len(entries),
+            "automaton_nodes": len(matcher._automaton),
+            "build_ms": round(build_ms, 2),
+            "linear_us": round(time_lookups(lambda m: linear_lookup(entries, m), messages, linear_repeat), 2),
+            "automaton_us": round(time_lookups(matcher.match, messages, args.repeat), 2)
+        }
+        rows.append(row)
+        print(row, file=sys.stderr)
+
+    output = json.dumps({"messages": args.messages, "results": rows}, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark reproductible du pipeline de diagnostic des plantes.
+
+Des uploads synthétiques JPEG/PNG aux dimensions de photos de téléphone sont générés, puis
+envoyés à plusieurs niveaux de concurrence :
+- directement à services.plant_service.detect_plant_disease ("function") ;
+- à l'endpoint POST /plant/detect via le client de test Flask ("endpoint").
+
+L'application tourne sur une base SQLite temporaire (fichier partagé par les threads du benchmark,
+ou --database-url), avec le backend "stub" (latence simulée,
+cf. STUB_BATCH_LATENCY_MS / STUB_IMAGE_LATENCY_MS) ou le vrai modèle (--real-model).
+Le rapport JSON (latences p50/p95/p99, débit, pic de RSS, commit) permet de comparer les runs.
+
+Usage :
+    python scripts/bench_plant.py --concurrency 1,4,16 --requests 200 --output bench_plant.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dimensions courantes de photos prises au téléphone
+PHONE_SIZES = {
+    "12mp": (4032, 3024),
+    "8mp": (3264, 2448),
+    "2mp": (1600, 1200),
+}
+
+
+def make_upload(fmt, size, seed):
+    """Image synthétique (dégradé + bruit, proche d'une photo en taille compressée)."""
+    import numpy as np
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    width, height = size
+    x = np.linspace(0, 1, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, np.newaxis, np.newaxis]
+    base = rng.uniform(0, 255, 3).astype(np.float32)
+    img = base * (0.4 + 0.3 * x + 0.3 * y) + rng.normal(0, 12, (height, width, 3)).astype(np.float32)
+    buffer = BytesIO()
+    Image.fromarray(np.clip(img, 0, 255).astype(np.uint8)).save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def summarize(latencies, wall_s, errors):
+    import numpy as np
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2) if latencies else None,
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2) if latencies else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2) if latencies else None,
+        "throughput_rps": round(len(latencies) / wall_s, 2) if wall_s else None
+    }
+
+
+def run_load(call, payloads, concurrency, requests):
+    latencies, errors = [], 0
+
+    def one(i):
+        data, filename = payloads[i % len(payloads)]
+        start = time.perf_counter()
+        ok = call(data, filename)
+        return (time.perf_counter() - start) * 1000, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, ok in executor.map(one, range(requests)):
+            if ok:
+                latencies.append(latency)
+            else:
+                errors += 1
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16", help="Niveaux de concurrence")
+    parser.add_argument("--requests", type=int, default=100, help="Requêtes par niveau et par cible")
+    parser.add_argument("--formats", default="JPEG,PNG")
+    parser.add_argument("--sizes", default="12mp,2mp", help=f"Parmi {', '.join(PHONE_SIZES)}")
+    parser.add_argument("--images", type=int, default=8, help="Images distinctes générées par format et taille")
+    parser.add_argument("--targets", default="function,endpoint")
+    parser.add_argument("--real-model", action="store_true", help="Utiliser le backend configuré au lieu du stub")
+    parser.add_argument("--cache", action="store_true", help="Laisser le cache des diagnostics actif")
+    parser.add_argument("--database-url", help="Base à utiliser (SQLite temporaire par défaut)")
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    # Environnement isolé : base SQLite dans un fichier temporaire (une base en mémoire n'a qu'une connexion,
+    # partagée à tort entre les threads du benchmark), uploads dans un dossier temporaire
+    database_url = args.database_url
+    if not database_url:
+        database_path = os.path.join(tempfile.mkdtemp(prefix="bench_plant_db_"), "bench.sqlite3")
+        database_url = f"sqlite:///{database_path}?check_same_thread=False"
+    os.environ.update({
+        "DATABASE_URL": database_url,
+        "SECRET_KEY": "bench",
+        "JWT_SECRET_KEY": "bench",
+        "ADMIN_EMAIL": "admin@bench.local",
+        "ADMIN_USERNAME": "admin",
+        "ADMIN_PASSWORD": "admin",
+        "INFERENCE_PRELOAD": "eager",
+        "DIAGNOSIS_CACHE_ENABLED": "true" if args.cache else "false",
+    })
+    if not args.real_model:
+        os.environ["INFERENCE_BACKEND"] = "stub"
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    # Les modèles sont chargés depuis la racine du dépôt (préchargement "eager"),
+    # puis les uploads sont écrits dans un dossier temporaire
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    import app as app_module
+    from flask_jwt_extended import create_access_token
+    from werkzeug.datastructures import FileStorage
+    from config import Config
+    from models.user import User
+    from services.plant_service import detect_plant_disease, get_cascade
+    from dataset_utils import peak_rss_mb
+    if Config.CASCADE_ENABLED:
+        get_cascade()
+    os.chdir(tempfile.mkdtemp(prefix="bench_plant_"))
+
+    flask_app = app_module.app
+    with flask_app.app_context():
+        user = User.query.filter_by(email="admin@bench.local").first()
+        user_id = user.id
+        token = create_access_token(identity=str(user_id))
+
+    payloads = {}
+    seed = 0
+    for fmt in args.formats.split(","):
+        for size_name in args.sizes.split(","):
+            images = []
+            for _ in range(args.images):
+                images.append((make_upload(fmt, PHONE_SIZES[size_name], seed), f"leaf_{seed}.{'jpg' if fmt == 'JPEG' else 'png'}"))
+                seed += 1
+            payloads[f"{fmt.lower()}_{size_name}"] = images
+
+    def call_function(data, filename):
+        with flask_app.app_context():
+            try:
+                detect_plant_disease(FileStorage(stream=BytesIO(data), filename=filename), user_id)
+                return True
+            except Exception:
+                return False
+
+    client = flask_app.test_client()
+
+    def call_endpoint(data, filename):
+        response = client.post(
+            "/plant/detect",
+            data={"image": (BytesIO(data), filename)},
+            headers={"Authorization": f"Bearer {token}"},
+            content_type="multipart/form-data"
+        )
+        return response.status_code == 200
+
+    targets = {"function": call_function, "endpoint": call_endpoint}
+    results = {}
+    for payload_name, images in payloads.items():
+        results[payload_name] = {
+            "upload_kb_mean": round(sum(len(d) for d, _ in images) / len(images) / 1024, 1)
+        }
+        for target in args.targets.split(","):
+            for concurrency in [int(c) for c in args.concurrency.split(",")]:
+                results[payload_name][f"{target}_c{concurrency}"] = run_load(targets[target], images, concurrency, args.requests)
+                print(f"{payload_name} {target} c={concurrency} : {results[payload_name][f'{target}_c{concurrency}']}", file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "backend": Config.INFERENCE_BACKEND,
+            "mode": Config.INFERENCE_MODE,
+            "workers": Config.INFERENCE_WORKERS,
+            "batching": Config.INFERENCE_BATCHING_ENABLED,
+            "max_batch_size": Config.INFERENCE_MAX_BATCH_SIZE,
+            "max_wait_ms": Config.INFERENCE_MAX_WAIT_MS,
+            "cache": Config.DIAGNOSIS_CACHE_ENABLED,
+            "cascade": Config.CASCADE_ENABLED
+        },
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Mesure le temps de démarrage de l'application selon le mode de chargement du modèle.
+
+Pour chaque valeur de INFERENCE_PRELOAD ("eager" reproduit l'ancien chargement à l'import),
+un processus neuf est lancé et mesure :
+- import_s           : import de app.py (create_app compris) ;
+- first_request_s    : import + première requête HTTP servie (GET /plant/ready) ;
+- ready_s            : import + disponibilité de l'inférence (modèle chargé et préchauffé) ;
+- first_predict_ms   : latence de la première prédiction une fois le modèle prêt.
+
+Usage :
+    python scripts/bench_startup.py --runs 3 --output bench_startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_ENV = {
+    "DATABASE_URL": "sqlite://",
+    "SECRET_KEY": "bench",
+    "JWT_SECRET_KEY": "bench",
+    "ADMIN_EMAIL": "admin@bench.local",
+    "ADMIN_USERNAME": "admin",
+    "ADMIN_PASSWORD": "admin",
+}
+
+
+def run_child(timeout):
+    sys.path.insert(0, ROOT)
+    os.chdir(ROOT)
+    t0 = time.perf_counter()
+    import app as app_module
+    import_s = time.perf_counter() - t0
+
+    client = app_module.app.test_client()
+    response = client.get("/plant/ready")
+    first_request_s = time.perf_counter() - t0
+
+    # En mode "lazy", la première prédiction déclenche le chargement
+    if os.environ["INFERENCE_PRELOAD"] == "lazy":
+        from services.plant_service import warm_up
+        warm_up()
+    while response.status_code != 200 and time.perf_counter() - t0 < timeout:
+        time.sleep(0.05)
+        response = client.get("/plant/ready")
+    ready_s = time.perf_counter() - t0 if response.status_code == 200 else None
+
+    import numpy as np
+    from services.plant_service import predict, preprocess, INPUT_SIZE
+    img = preprocess(np.random.randint(0, 256, (1, *INPUT_SIZE, 3)).astype(np.float32))
+    start = time.perf_counter()
+    predict(img)
+    first_predict_ms = (time.perf_counter() - start) * 1000
+
+    print(json.dumps({
+        "import_s": round(import_s, 3),
+        "first_request_s": round(first_request_s, 3),
+        "ready_s": round(ready_s, 3) if ready_s is not None else None,
+        "first_predict_ms": round(first_predict_ms, 2)
+    }))
+
+
+def run_mode(mode, runs, timeout):
+    env = dict(os.environ, **BENCH_ENV, INFERENCE_PRELOAD=mode)
+    results = []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", "--timeout", str(timeout)],
+            env=env, cwd=ROOT, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"Échec du run ({mode}) : {proc.stderr[-2000:]}")
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    averages = {}
+    for key in results[0]:
+        # Moyenne des seuls runs où la mesure existe (ready_s vaut None si le modèle n'a pas été prêt à temps)
+        samples = [r[key] for r in results if r[key] is not None]
+        averages[key] = round(sum(samples) / len(samples), 3) if samples else None
+    return averages | {"runs": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="eager,background,lazy", help="Modes INFERENCE_PRELOAD à comparer")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="Fichier JSON de sortie (stdout par défaut)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.timeout)
+        return
+
+    report = {mode: run_mode(mode, args.runs, args.timeout) for mode in args.modes.split(",")}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
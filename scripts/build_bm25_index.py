@@ -0,0 +1,82 @@
+"""
+Construit l'index BM25 de agri_dataset.txt (services.retrieval) et affiche les meilleures
+correspondances pour quelques questions, afin de régler RETRIEVAL_MIN_SCORE.
+
+L'index est aussi reconstruit automatiquement au premier usage si le jeu de données a changé ;
+ce script permet de le préparer avant le déploiement.
+
+Avec --check, vérifie en plus que les questions de CHECKS (proches d'une question du jeu de données mais
+sur une autre culture, ou reformulées) sont bien tranchées ; code de sortie 1 sinon.
+
+Usage :
+    python scripts/build_bm25_index.py --query "Comment planter des tomates ?" --query "Mes feuilles jaunissent"
+    python scripts/build_bm25_index.py --check
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+from config import Config
+from services.retrieval import DATASET_PATH, BM25Index, build_index
+
+# (message, réponse directe attendue) : seule la culture diffère de "meilleur moment pour planter des épinards"
+CHECKS = [
+    ("Quel est le meilleur moment pour planter des fraises ?", False),
+    ("Quel est le meilleur moment pour planter des tomates ?", False),
+    ("Quel est le meilleur moment pour planter des carottes ?", False),
+    ("Quel est le meilleur moment pour planter des laitues ?", False),
+    ("Quel est le meilleur moment pour planter des épinards ?", True),
+    ("meilleur moment pour planter les épinards", True),
+    ("Quand récolter les carottes ?", True),
+    ("Quel engrais pour les fraises ?", True),
+]
+
+
+def is_direct(match):
+    return match is not None and match[2] >= Config.RETRIEVAL_MIN_SCORE and not match[3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--index-dir", default=Config.RETRIEVAL_INDEX_DIR)
+    parser.add_argument("--query", action="append", default=[], help="Question de test (option répétable)")
+    parser.add_argument("--check", action="store_true", help="Vérifier les questions de CHECKS (code de sortie 1 en cas d'écart)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build_index(args.dataset, args.index_dir)
+    print(f"Index construit en {(time.perf_counter() - start) * 1000:.1f} ms dans {args.index_dir}")
+
+    start = time.perf_counter()
+    index = BM25Index.load(args.index_dir)
+    print(f"Index chargé (memory-map) en {(time.perf_counter() - start) * 1000:.1f} ms : {len(index)} questions, {len(index.vocabulary)} termes")
+
+    for query in args.query:
+        match = index.search(query, entity_max_df=Config.RETRIEVAL_ENTITY_MAX_DF)
+        if match is None:
+            print(f"- {query!r} : aucune correspondance")
+            continue
+        question, _, score, missing = match
+        verdict = "réponse directe" if is_direct(match) else "LLM"
+        absent = f", absents : {', '.join(missing)}" if missing else ""
+        print(f"- {query!r} : {question!r} (score {score:.2f}{absent}, {verdict})")
+
+    if args.check:
+        failures = 0
+        for query, expected in CHECKS:
+            direct = is_direct(index.search(query, entity_max_df=Config.RETRIEVAL_ENTITY_MAX_DF))
+            if direct != expected:
+                failures += 1
+                print(f"ÉCHEC {query!r} : {'réponse directe' if direct else 'LLM'} (attendu : {'réponse directe' if expected else 'LLM'})")
+        print(f"Vérification : {len(CHECKS) - failures}/{len(CHECKS)} questions conformes")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
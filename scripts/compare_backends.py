@@ -0,0 +1,111 @@
+"""
+Compare les backends d'inférence (Keras et TFLite quantifiés) sur un dossier d'images étiquetées :
+précision top-1, accord top-1 avec le modèle Keras (global et par classe), latence et mémoire.
+
+Chaque backend est évalué dans un processus séparé pour que le pic de RSS lui soit propre.
+
+Usage :
+    python scripts/compare_backends.py data/plantvillage --backends keras,tflite:float16,tflite:int8 --output compare.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from dataset_utils import ROOT, iter_labelled_images, load_image, percentile, peak_rss_mb
+from services.plant_service import CLASSES, MODEL_PATH, TFLITE_MODEL_PATHS
+from services.inference_backends import create_backend
+
+
+def resolve_spec(spec):
+    """"keras", "tflite:float16", "tflite:int8" ou "tflite:/chemin/modele.tflite"."""
+    name, _, variant = spec.partition(":")
+    if name == "keras":
+        return name, variant or os.path.join(ROOT, MODEL_PATH)
+    if variant in TFLITE_MODEL_PATHS:
+        return name, os.path.join(ROOT, TFLITE_MODEL_PATHS[variant])
+    return name, variant
+
+
+def run_child(spec, folder, limit_per_class):
+    name, model_path = resolve_spec(spec)
+    start = time.perf_counter()
+    backend = create_backend(name, model_path).load()
+    load_s = time.perf_counter() - start
+
+    images = list(iter_labelled_images(folder, limit_per_class))
+    predictions, latencies = [], []
+    for i, (path, _) in enumerate(images):
+        img = load_image(path)
+        start = time.perf_counter()
+        probs = backend.predict(img)[0]
+        # La première prédiction (construction du graphe) est exclue des latences
+        if i > 0:
+            latencies.append((time.perf_counter() - start) * 1000)
+        predictions.append(int(probs.argmax()))
+
+    print(json.dumps({
+        "model_path": model_path,
+        "model_size_mb": round(os.path.getsize(model_path) / 1e6, 2),
+        "load_s": round(load_s, 3),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p95": percentile(latencies, 95),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "predictions": predictions
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="Dossier d'images (un sous-dossier par classe)")
+    parser.add_argument("--backends", default="keras,tflite:float16,tflite:int8",
+                        help="Backends à comparer ; le premier sert de référence pour l'accord top-1")
+    parser.add_argument("--limit-per-class", type=int, help="Nombre maximal d'images par classe")
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.folder, args.limit_per_class)
+        return
+
+    labels = [label for _, label in iter_labelled_images(args.folder, args.limit_per_class)]
+    specs = args.backends.split(",")
+    results = {}
+    for spec in specs:
+        cmd = [sys.executable, os.path.abspath(__file__), args.folder, "--child", spec]
+        if args.limit_per_class:
+            cmd += ["--limit-per-class", str(args.limit_per_class)]
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"Échec de l'évaluation de {spec} :\n{proc.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results[spec] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    predictions = {spec: result.pop("predictions") for spec, result in results.items()}
+    reference = predictions.get(specs[0])
+    report = {"images": len(labels), "reference": specs[0], "backends": {}}
+    for spec, result in results.items():
+        entry = dict(result)
+        entry["top1_accuracy"] = round(sum(p == l for p, l in zip(predictions[spec], labels)) / len(labels), 4) if labels else None
+        if reference is not None and spec != specs[0]:
+            agreements = [p == r for p, r in zip(predictions[spec], reference)]
+            entry["top1_agreement"] = round(sum(agreements) / len(agreements), 4) if agreements else None
+            disagreements = {}
+            for agree, label in zip(agreements, labels):
+                if not agree:
+                    disagreements[CLASSES[label]] = disagreements.get(CLASSES[label], 0) + 1
+            entry["disagreements_per_class"] = disagreements
+        report["backends"][spec] = entry
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
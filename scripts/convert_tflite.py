@@ -0,0 +1,102 @@
+"""
+Convertit models/mobilenetv2_color.h5 en artefacts TFLite quantifiés (post-training).
+
+- float16 : poids stockés en float16, calculs en float32 (taille ~/2, précision quasi identique) ;
+- int8    : quantification entière complète, calibrée sur un échantillon d'images
+            (--calibration-dir, même organisation que pour compare_backends.py) ;
+- stage1  : premier étage de la cascade (CASCADE_ENABLED=true) : le même réseau avec une entrée
+            réduite (--stage1-size, 128 par défaut), en float16, écrit dans CASCADE_STAGE1_MODEL_PATH.
+            MobileNetV2 suivi d'un pooling global ne dépend pas de la résolution : les poids sont repris
+            tels quels. Vérifier le seuil de confiance avec scripts/eval_cascade.py.
+
+Usage :
+    python scripts/convert_tflite.py --quantization float16
+    python scripts/convert_tflite.py --quantization int8 --calibration-dir data/plantvillage
+    python scripts/convert_tflite.py --quantization stage1 --stage1-size 128
+"""
+import argparse
+import os
+import random
+
+from dataset_utils import ROOT, iter_labelled_images, load_image
+from config import Config
+from services.plant_service import MODEL_PATH, TFLITE_MODEL_PATHS, INPUT_SIZE
+
+
+def representative_dataset(calibration_dir, samples):
+    import numpy as np
+    if calibration_dir:
+        paths = [path for path, _ in iter_labelled_images(calibration_dir)]
+        random.Random(0).shuffle(paths)
+        for path in paths[:samples]:
+            yield [load_image(path)]
+    else:
+        print("Attention : aucun dossier de calibration, utilisation d'images aléatoires (précision int8 dégradée).")
+        rng = np.random.default_rng(0)
+        for _ in range(samples):
+            yield [rng.uniform(-1, 1, (1, *INPUT_SIZE, 3)).astype(np.float32)]
+
+
+def resize_input(model, size):
+    """Même réseau, mêmes poids, avec une entrée (size, size, 3) au lieu de INPUT_SIZE."""
+    config = model.get_config()
+
+    def patch(node):
+        if isinstance(node, dict):
+            for key in ("batch_input_shape", "batch_shape"):
+                shape = node.get(key)
+                if isinstance(shape, (list, tuple)) and len(shape) == 4:
+                    node[key] = [shape[0], size, size, shape[3]]
+            for value in node.values():
+                patch(value)
+        elif isinstance(node, list):
+            for value in node:
+                patch(value)
+
+    patch(config)
+    resized = model.__class__.from_config(config)
+    resized.set_weights(model.get_weights())
+    return resized
+
+
+def convert(quantization, model_path, output, calibration_dir=None, samples=200, stage1_size=128):
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path)
+    if quantization == "stage1":
+        model = resize_input(model, stage1_size)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization in ("float16", "stage1"):
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        converter.representative_dataset = lambda: representative_dataset(calibration_dir, samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    tflite_model = converter.convert()
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "wb") as f:
+        f.write(tflite_model)
+    print(f"{quantization} : {output} ({len(tflite_model) / 1e6:.1f} Mo, source {os.path.getsize(model_path) / 1e6:.1f} Mo)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quantization", choices=["float16", "int8", "stage1", "all"], default="all")
+    parser.add_argument("--model", default=os.path.join(ROOT, MODEL_PATH), help="Modèle Keras source")
+    parser.add_argument("--output", help="Chemin de sortie (par défaut celui attendu par INFERENCE_BACKEND=tflite)")
+    parser.add_argument("--calibration-dir", help="Images étiquetées pour calibrer la quantification int8")
+    parser.add_argument("--samples", type=int, default=200, help="Nombre d'images de calibration int8")
+    parser.add_argument("--stage1-size", type=int, default=Config.CASCADE_STAGE1_INPUT_SIZE,
+                        help="Résolution d'entrée du premier étage de la cascade")
+    args = parser.parse_args()
+
+    quantizations = ["float16", "int8", "stage1"] if args.quantization == "all" else [args.quantization]
+    outputs = dict(TFLITE_MODEL_PATHS, stage1=Config.CASCADE_STAGE1_MODEL_PATH)
+    for quantization in quantizations:
+        output = args.output if args.output and len(quantizations) == 1 else os.path.join(ROOT, outputs[quantization])
+        convert(quantization, args.model, output, args.calibration_dir, args.samples, args.stage1_size)
+
+
+if __name__ == "__main__":
+    main()
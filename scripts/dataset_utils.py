@@ -0,0 +1,47 @@
+"""
+Utilitaires partagés par les scripts de conversion, de comparaison et de benchmark.
+
+Le dossier d'images étiquetées suit l'organisation PlantVillage : un sous-dossier par
+classe, nommé exactement comme dans services.plant_service.CLASSES.
+"""
+import os
+import sys
+import resource
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import numpy as np
+from services.plant_service import CLASSES, INPUT_SIZE, decode_image
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+
+def iter_labelled_images(folder, limit_per_class=None):
+    """Produit des couples (chemin, indice de classe) pour chaque image du dossier."""
+    for class_name in sorted(os.listdir(folder)):
+        class_dir = os.path.join(folder, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        if class_name not in CLASSES:
+            print(f"Dossier ignoré (classe inconnue) : {class_name}", file=sys.stderr)
+            continue
+        files = sorted(f for f in os.listdir(class_dir) if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS)
+        for filename in files[:limit_per_class]:
+            yield os.path.join(class_dir, filename), CLASSES.index(class_name)
+
+
+def load_image(path, size=INPUT_SIZE):
+    """Charge une image en tenseur prétraité (1, H, W, 3), avec le même décodage que l'API."""
+    with open(path, "rb") as f:
+        return decode_image(f.read(), size)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def peak_rss_mb():
+    """Pic de mémoire résidente du processus courant (Mo, Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
@@ -0,0 +1,100 @@
+"""
+Évalue le compromis précision / débit de la cascade à deux étages selon le seuil de confiance.
+
+Chaque image du dossier étiqueté est prédite une fois par le premier étage (modèle léger) et une
+fois par le modèle complet ; les seuils sont ensuite simulés sans nouvelle inférence :
+- escalation_rate : part des images renvoyées au modèle complet ;
+- accuracy        : précision top-1 de la cascade (premier étage si confiant, sinon modèle complet) ;
+- mean_ms         : coût moyen estimé par image (décodage + prédiction des étages exécutés) ;
+- images_per_s    : débit séquentiel correspondant.
+
+Usage :
+    python scripts/eval_cascade.py data/plantvillage --stage1-model models/mobilenetv2_small_128.tflite \
+        --stage1-size 128 --thresholds 0.5,0.7,0.8,0.9,0.95,0.99 --output cascade.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from dataset_utils import ROOT, iter_labelled_images
+from services.plant_service import MODEL_PATH, INPUT_SIZE, decode_image
+from services.inference_backends import create_backend
+
+
+def timed_predict(backend, data, size):
+    start = time.perf_counter()
+    probs = backend.predict(decode_image(data, size))[0]
+    return probs, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder", help="Dossier d'images (un sous-dossier par classe)")
+    parser.add_argument("--stage1-backend", default="tflite")
+    parser.add_argument("--stage1-model", required=True)
+    parser.add_argument("--stage1-size", type=int, default=128)
+    parser.add_argument("--full-backend", default="keras")
+    parser.add_argument("--full-model", default=os.path.join(ROOT, MODEL_PATH))
+    parser.add_argument("--thresholds", default="0.5,0.6,0.7,0.8,0.9,0.95,0.99")
+    parser.add_argument("--limit-per-class", type=int)
+    parser.add_argument("--output", help="Fichier JSON de sortie")
+    args = parser.parse_args()
+
+    stage1 = create_backend(args.stage1_backend, args.stage1_model).load()
+    full = create_backend(args.full_backend, args.full_model).load()
+    stage1_size = (args.stage1_size, args.stage1_size)
+
+    labels, stage1_conf, stage1_pred, full_pred, stage1_ms, full_ms = [], [], [], [], [], []
+    for i, (path, label) in enumerate(iter_labelled_images(args.folder, args.limit_per_class)):
+        with open(path, "rb") as f:
+            data = f.read()
+        probs1, ms1 = timed_predict(stage1, data, stage1_size)
+        probs2, ms2 = timed_predict(full, data, INPUT_SIZE)
+        labels.append(label)
+        stage1_conf.append(float(np.max(probs1)))
+        stage1_pred.append(int(np.argmax(probs1)))
+        full_pred.append(int(np.argmax(probs2)))
+        # La première image (construction des graphes) est exclue des latences
+        if i > 0:
+            stage1_ms.append(ms1)
+            full_ms.append(ms2)
+
+    if not labels:
+        raise SystemExit("Aucune image trouvée.")
+    labels, stage1_conf = np.array(labels), np.array(stage1_conf)
+    stage1_pred, full_pred = np.array(stage1_pred), np.array(full_pred)
+    mean_stage1_ms = float(np.mean(stage1_ms)) if stage1_ms else 0.0
+    mean_full_ms = float(np.mean(full_ms)) if full_ms else 0.0
+
+    rows = []
+    for threshold in [float(t) for t in args.thresholds.split(",")]:
+        confident = stage1_conf >= threshold
+        predictions = np.where(confident, stage1_pred, full_pred)
+        escalation_rate = float(1 - confident.mean())
+        mean_ms = mean_stage1_ms + escalation_rate * mean_full_ms
+        rows.append({
+            "threshold": threshold,
+            "escalation_rate": round(escalation_rate, 4),
+            "accuracy": round(float((predictions == labels).mean()), 4),
+            "stage1_accuracy_when_confident": round(float((stage1_pred[confident] == labels[confident]).mean()), 4) if confident.any() else None,
+            "mean_ms": round(mean_ms, 2),
+            "images_per_s": round(1000 / mean_ms, 2) if mean_ms else None
+        })
+
+    report = {
+        "images": int(len(labels)),
+        "full_model": {"accuracy": round(float((full_pred == labels).mean()), 4), "mean_ms": round(mean_full_ms, 2)},
+        "stage1_model": {"accuracy": round(float((stage1_pred == labels).mean()), 4), "mean_ms": round(mean_stage1_ms, 2)},
+        "thresholds": rows
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Outils de mesure du cache sémantique des réponses du LLM (SEMANTIC_CACHE_ENABLED=true).
+
+- samples : relit les réponses servies par similarité et journalisées au hasard
+  (SEMANTIC_CACHE_SAMPLES_PATH, part SEMANTIC_CACHE_SAMPLE_RATE) : répartition des similarités,
+  export d'un fichier TSV à annoter (colonne "same" : 1 si la réponse convient, 0 sinon) et, une fois
+  annoté (--labels), taux de faux positifs par tranche de similarité.
+- pairs : sur un fichier TSV de paires de messages annotées (message_a, message_b, same), calcule les
+  embeddings via Ollama (/api/embed) et donne, pour chaque seuil, le taux de succès (paires équivalentes
+  servies par le cache) et le taux de faux positifs (paires différentes servies quand même).
+
+Usage :
+    python scripts/semantic_cache_report.py samples --export review.tsv
+    python scripts/semantic_cache_report.py samples --labels review.tsv
+    python scripts/semantic_cache_report.py pairs paires.tsv --thresholds 0.85,0.9,0.92,0.95 --output semantic.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Bornes des tranches de similarité
+BANDS = [0.85, 0.9, 0.92, 0.94, 0.96, 0.98]
+
+
+def band_of(similarity):
+    lower = 0.0
+    for upper in BANDS:
+        if similarity < upper:
+            return f"{lower:.2f}-{upper:.2f}"
+        lower = upper
+    return f"{lower:.2f}-1.00"
+
+
+def read_samples(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report_samples(args):
+    if args.labels:
+        with open(args.labels, encoding="utf-8", newline="") as f:
+            rows = [row for row in csv.DictReader(f, delimiter="\t") if row.get("same", "").strip() in ("0", "1")]
+        if not rows:
+            print("Aucune ligne annotée (colonne same = 0 ou 1).")
+            return {}
+        bands = {}
+        for row in rows:
+            stats = bands.setdefault(band_of(float(row["similarity"])), {"samples": 0, "false_hits": 0})
+            stats["samples"] += 1
+            stats["false_hits"] += row["same"].strip() == "0"
+        false_hits = sum(b["false_hits"] for b in bands.values())
+        report = {
+            "labeled_samples": len(rows),
+            "false_hit_rate": round(false_hits / len(rows), 4),
+            "by_similarity": {
+                band: dict(stats, false_hit_rate=round(stats["false_hits"] / stats["samples"], 4))
+                for band, stats in sorted(bands.items())
+            }
+        }
+        print(f"{len(rows)} échantillons annotés, taux de faux positifs : {report['false_hit_rate']:.2%}")
+        for band, stats in report["by_similarity"].items():
+            print(f"  similarité {band:<10} {stats['samples']:>5} échantillons  faux positifs {stats['false_hit_rate']:.2%}")
+        return report
+
+    samples = read_samples(args.samples)
+    if not samples:
+        print(f"Aucun échantillon dans {args.samples}.")
+        return {}
+    bands = {}
+    for sample in samples:
+        band = band_of(sample["similarity"])
+        bands[band] = bands.get(band, 0) + 1
+    report = {"samples": len(samples), "by_similarity": dict(sorted(bands.items()))}
+    print(f"{len(samples)} réponses servies par similarité échantillonnées")
+    for band, count in report["by_similarity"].items():
+        print(f"  similarité {band:<10} {count:>5}")
+    if args.export:
+        with open(args.export, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter="\t")
+            writer.writerow(["similarity", "query", "matched_prompt", "answer", "same"])
+            for sample in sorted(samples, key=lambda s: s["similarity"]):
+                writer.writerow([sample["similarity"], sample["query"], sample["matched_prompt"],
+                                 sample["answer"].replace("\n", " ").replace("\t", " "), ""])
+        print(f"À annoter (colonne same) : {args.export}")
+    return report
+
+
+def embed_all(base_url, model, texts, batch_size=32):
+    import numpy as np
+    import requests
+    vectors = []
+    for start in range(0, len(texts), batch_size):
+        response = requests.post(f"{base_url}/api/embed", json={"model": model, "input": texts[start:start + batch_size]}, timeout=120)
+        response.raise_for_status()
+        vectors.extend(response.json()["embeddings"])
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def report_pairs(args):
+    import numpy as np
+    with open(args.pairs, encoding="utf-8", newline="") as f:
+        rows = [row for row in csv.reader(f, delimiter="\t") if len(row) >= 3 and row[2].strip() in ("0", "1")]
+    if not rows:
+        print("Aucune paire annotée (message_a, message_b, same).")
+        return {}
+    texts = sorted({row[0] for row in rows} | {row[1] for row in rows})
+    vectors = dict(zip(texts, embed_all(args.base_url.rstrip("/"), args.model, texts)))
+    similarities = np.array([float(vectors[a] @ vectors[b]) for a, b, *_ in rows])
+    same = np.array([row[2].strip() == "1" for row in rows])
+
+    thresholds = [float(t) for t in args.thresholds.split(",")]
+    report = {"pairs": len(rows), "equivalent": int(same.sum()), "model": args.model, "thresholds": {}}
+    print(f"{len(rows)} paires ({int(same.sum())} équivalentes), modèle d'embedding {args.model}")
+    for threshold in thresholds:
+        served = similarities >= threshold
+        hit_rate = float(served[same].mean()) if same.any() else 0.0
+        false_hit_rate = float(served[~same].mean()) if (~same).any() else 0.0
+        report["thresholds"][str(threshold)] = {"hit_rate": round(hit_rate, 4), "false_hit_rate": round(false_hit_rate, 4)}
+        print(f"  seuil {threshold:.2f} : succès {hit_rate:.2%}  faux positifs {false_hit_rate:.2%}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Taux de succès et faux positifs du cache sémantique")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    samples = sub.add_parser("samples", help="échantillons des réponses servies par similarité")
+    samples.add_argument("--samples", default=os.path.join(ROOT, "cache", "semantic_samples.jsonl"))
+    samples.add_argument("--export", help="fichier TSV à annoter")
+    samples.add_argument("--labels", help="fichier TSV annoté (colonne same)")
+    samples.add_argument("--output", help="rapport JSON")
+
+    pairs = sub.add_parser("pairs", help="paires de messages annotées, embeddings via Ollama")
+    pairs.add_argument("pairs", help="TSV : message_a, message_b, same (1/0)")
+    pairs.add_argument("--base-url", default=os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434"))
+    pairs.add_argument("--model", default=os.getenv("SEMANTIC_CACHE_EMBED_MODEL", "nomic-embed-text"))
+    pairs.add_argument("--thresholds", default="0.85,0.9,0.92,0.94,0.96")
+    pairs.add_argument("--output", help="rapport JSON")
+
+    args = parser.parse_args()
+    report = report_samples(args) if args.command == "samples" else report_pairs(args)
+    if args.output and report:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Rapport : {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
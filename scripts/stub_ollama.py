@@ -0,0 +1,174 @@
+"""
+Serveur Ollama factice pour les tests et les mesures du chatbot (routage, secours, flux, ordonnanceur).
+
+Il répond à GET / (contrôle de santé), GET /api/tags, POST /api/chat (avec ou sans flux) et
+POST /api/embed comme Ollama, sans modèle réel : chaque modèle déclaré a un temps de chargement du
+prompt et un débit (tokens/s) simulés, et génère un texte déterministe de `num_predict` tokens
+(60 par défaut). Les embeddings (modèle de --embed-models) sont des sacs de trigrammes de caractères
+hachés : deux messages qui partagent des mots ont une similarité cosinus élevée.
+Un modèle non déclaré renvoie 404 ("model not found"), un modèle de --fail renvoie 500 :
+de quoi vérifier le passage au modèle de secours (LLM_MODEL_FALLBACKS).
+
+Usage :
+    python scripts/stub_ollama.py --port 11435 --models "gemma:2b=80:40,gemma:7b=300:12" --fail phi3
+    OLLAMA_BASE_URL=http://127.0.0.1:11435 LLM_ROUTING_ENABLED=true py.exe app.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+import time
+import unicodedata
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "Arrosez régulièrement le matin, paillez le sol pour garder l'humidité, surveillez les feuilles "
+    "et apportez un engrais équilibré adapté à la culture."
+).split()
+
+
+def parse_models(spec):
+    """"gemma:2b=80:40,gemma:7b=300:12" -> {"gemma:2b": (0.08, 40.0), "gemma:7b": (0.3, 12.0)} (chargement s, tokens/s)"""
+    models = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, timing = item.partition("=")
+        load_ms, _, tokens_per_s = (timing or "50:50").partition(":")
+        models[name.strip()] = (float(load_ms) / 1000, float(tokens_per_s or 50))
+    return models
+
+
+def embed_text(text, dimension=256):
+    """Embedding déterministe : trigrammes de caractères des mots (sans accents), hachés dans `dimension` cases."""
+    text = "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+    vector = [0.0] * dimension
+    for word in re.findall(r"\w+", text):
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            vector[int(hashlib.md5(padded[i:i + 3].encode("utf-8")).hexdigest(), 16) % dimension] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def make_handler(models, failing, embed_models):
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/":
+                body = b"Ollama is running"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path == "/api/tags":
+                self._send_json(200, {"models": [{"name": name, "model": name} for name in models]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path not in ("/api/chat", "/api/embed"):
+                self._send_json(404, {"error": "not found"})
+                return
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = payload.get("model", "")
+            if self.path == "/api/embed":
+                if model not in embed_models:
+                    self._send_json(404, {"error": f"model '{model}' not found, try pulling it first"})
+                    return
+                texts = payload.get("input", [])
+                texts = [texts] if isinstance(texts, str) else texts
+                self._send_json(200, {"model": model, "embeddings": [embed_text(text) for text in texts]})
+                return
+            if model in failing:
+                self._send_json(500, {"error": f"model '{model}' failed to load"})
+                return
+            if model not in models:
+                self._send_json(404, {"error": f"model '{model}' not found, try pulling it first"})
+                return
+
+            load_s, tokens_per_s = models[model]
+            num_predict = int(payload.get("options", {}).get("num_predict") or 60)
+            prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+            start = time.perf_counter()
+            time.sleep(load_s)
+            tokens = [WORDS[i % len(WORDS)] + " " for i in range(num_predict)]
+
+            def stats():
+                total_ns = int((time.perf_counter() - start) * 1e9)
+                return {
+                    "model": model,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "done": True,
+                    "done_reason": "length",
+                    "total_duration": total_ns,
+                    "load_duration": int(load_s * 1e9),
+                    "prompt_eval_count": prompt_chars // 4,
+                    "eval_count": num_predict,
+                    "eval_duration": int(num_predict / tokens_per_s * 1e9)
+                }
+
+            if not payload.get("stream", True):
+                time.sleep(num_predict / tokens_per_s)
+                self._send_json(200, dict(stats(), message={"role": "assistant", "content": "".join(tokens).strip()}))
+                return
+
+            # Flux : un objet JSON par ligne, en transfert par morceaux comme Ollama
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def write_line(data):
+                line = (json.dumps(data) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+                self.wfile.flush()
+
+            for token in tokens:
+                time.sleep(1 / tokens_per_s)
+                write_line({"model": model, "message": {"role": "assistant", "content": token}, "done": False})
+            write_line(dict(stats(), message={"role": "assistant", "content": ""}))
+            self.wfile.write(b"0\r\n\r\n")
+
+    return StubOllamaHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur Ollama factice (tests du chatbot)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--models", default="gemma:2b=80:40,gemma:7b=300:12",
+                        help="modèle=chargement_ms:tokens_par_s, séparés par des virgules")
+    parser.add_argument("--fail", default="", help="modèles qui renvoient une erreur 500 (séparés par des virgules)")
+    parser.add_argument("--embed-models", default="nomic-embed-text", help="modèles d'embedding (séparés par des virgules)")
+    args = parser.parse_args()
+
+    models = parse_models(args.models)
+    failing = {m.strip() for m in args.fail.split(",") if m.strip()}
+    embed_models = {m.strip() for m in args.embed_models.split(",") if m.strip()}
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(models, failing, embed_models))
+    print(f"Ollama factice sur http://{args.host}:{args.port} — modèles : {', '.join(models) or 'aucun'}"
+          + (f" ; en échec : {', '.join(sorted(failing))}" if failing else ""))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
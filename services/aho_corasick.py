@@ -0,0 +1,63 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Automate d'Aho–Corasick sur des séquences de symboles hachables (ici des mots normalisés) :
+    toutes les occurrences de tous les motifs sont trouvées en un seul passage sur le texte,
+    quel que soit le nombre de motifs.
+    """
+
+    def __init__(self):
+        self._goto = [{}]      # Transitions de chaque nœud du trie
+        self._fail = [0]       # Lien d'échec (plus long suffixe propre présent dans le trie)
+        self._outputs = [[]]   # Valeurs des motifs se terminant sur ce nœud (y compris via les liens d'échec)
+        self._built = False
+
+    def __len__(self):
+        return len(self._goto)
+
+    def add(self, symbols, value):
+        """Ajoute le motif `symbols` ; `value` est renvoyée à chaque occurrence."""
+        if self._built:
+            raise ValueError("Impossible d'ajouter un motif après build().")
+        node = 0
+        for symbol in symbols:
+            next_node = self._goto[node].get(symbol)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][symbol] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append(value)
+
+    def build(self):
+        """Calcule les liens d'échec (parcours en largeur) ; à appeler une fois tous les motifs ajoutés."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for symbol, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and symbol not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(symbol, 0)
+                if self._outputs[self._fail[child]]:
+                    self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+        self._built = True
+        return self
+
+    def iter_matches(self, symbols):
+        """Génère (indice du dernier symbole, valeur) pour chaque occurrence d'un motif dans `symbols`."""
+        if not self._built:
+            self.build()
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        node = 0
+        for i, symbol in enumerate(symbols):
+            while node and symbol not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(symbol, 0)
+            for value in outputs[node]:
+                yield i, value
@@ -0,0 +1,205 @@
+import threading
+import time
+import uuid
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import or_, select
+from config import Config
+from extensions import db
+from services.metrics import metrics, elapsed_ms
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Jobs de suppression conservés en mémoire pour le suivi de la progression
+MAX_TRACKED_JOBS = 200
+
+
+def delete_rows(model, criteria, progress=None, before_chunk=None, chunk_size=None):
+    """
+    Supprime les lignes de `model` qui vérifient `criteria` par lots de `chunk_size` : sélection des clés
+    du lot (via l'index), DELETE ... WHERE clé IN (...) puis commit. Chaque transaction reste courte
+    (verrous brefs, mémoire bornée) et les autres greenlets reprennent la main entre deux lots.
+    `before_chunk(ids)` supprime les lignes dépendantes du lot dans la même transaction.
+    Retourne le nombre de lignes supprimées.
+    """
+    chunk_size = chunk_size or Config.BULK_DELETE_CHUNK_SIZE
+    key = model.__mapper__.primary_key[0]
+    table = model.__tablename__
+    deleted = 0
+    while True:
+        ids = [row[0] for row in db.session.query(key).filter(*criteria).order_by(key).limit(chunk_size).all()]
+        if not ids:
+            break
+        start = time.perf_counter()
+        try:
+            if before_chunk:
+                before_chunk(ids)
+            count = db.session.query(model).filter(key.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        deleted += count
+        metrics.counter(f"bulk_delete.{table}.rows").inc(count)
+        metrics.histogram("bulk_delete.chunk_ms").observe(elapsed_ms(start))
+        if progress:
+            progress(table, count)
+        time.sleep(0)  # Laisser la main aux autres greenlets entre deux lots
+    return deleted
+
+
+def _count(model, criteria):
+    return db.session.query(model.__mapper__.primary_key[0]).filter(*criteria).count()
+
+
+def _blob_references(record_type):
+    """before_chunk : supprime les références de blobs des enregistrements du lot."""
+    from models.blob import BlobReference
+
+    def delete_references(ids):
+        db.session.query(BlobReference).filter(
+            BlobReference.record_type == record_type, BlobReference.record_id.in_(ids)
+        ).delete(synchronize_session=False)
+    return delete_references
+
+
+def chat_history_steps(user_id, conversation_id=None):
+    """Étapes (modèle, critères, before_chunk) de la suppression de l'historique de chat (ou d'une conversation)."""
+    from models.chat_message import ChatMessage
+    from models.chat_job import ChatJob
+    from models.conversation_summary import ConversationSummary
+
+    def scope(model):
+        criteria = [model.user_id == user_id]
+        if conversation_id:
+            criteria.append(model.conversation_id == conversation_id)
+        return criteria
+
+    return [
+        (ChatMessage, scope(ChatMessage), None),
+        # Les résumés reprennent le contenu des messages : ils partent avec eux
+        (ConversationSummary, scope(ConversationSummary), None),
+        # Jobs terminés (copie du message et de la réponse) ; ceux en cours finissent normalement
+        (ChatJob, scope(ChatJob) + [ChatJob.status.in_(["done", "failed"])], None),
+    ]
+
+
+def user_data_steps(user_id):
+    """Étapes de la suppression d'un utilisateur et de tout ce qui le référence (clés étrangères d'abord)."""
+    from models.user import User
+    from models.plant_disease import PlantDisease
+    from models.live_comment import LiveComment
+    from models.live_session import LiveSession
+    from models.expert_session import ExpertSession, SessionMessage
+    from models.public_request import PublicRequest
+    from models.chat_job import ChatJob
+
+    user_sessions = select(ExpertSession.id).where(or_(ExpertSession.user_id == user_id, ExpertSession.expert_id == user_id))
+
+    def detach_requests(ids):
+        # Sessions d'autres utilisateurs ouvertes sur une demande supprimée : on garde la session, sans la demande
+        db.session.query(ExpertSession).filter(ExpertSession.public_request_id.in_(ids)) \
+            .update({ExpertSession.public_request_id: None}, synchronize_session=False)
+        _blob_references("public_request")(ids)
+
+    return chat_history_steps(user_id) + [
+        (ChatJob, [ChatJob.user_id == user_id], None),
+        (PlantDisease, [PlantDisease.user_id == user_id], _blob_references("plant_disease")),
+        (LiveComment, [LiveComment.user_id == user_id], None),
+        (SessionMessage, [or_(SessionMessage.sender_id == user_id, SessionMessage.session_id.in_(user_sessions))],
+         _blob_references("session_message")),
+        (ExpertSession, [or_(ExpertSession.user_id == user_id, ExpertSession.expert_id == user_id)], None),
+        (PublicRequest, [PublicRequest.user_id == user_id], detach_requests),
+        (LiveSession, [LiveSession.expert_id == user_id], None),
+        (User, [User.id == user_id], None),
+    ]
+
+
+def run_steps(steps, job=None):
+    """Exécute les étapes dans l'ordre ; retourne le nombre de lignes supprimées par table."""
+    if job is not None:
+        job.total = sum(_count(model, criteria) for model, criteria, _ in steps)
+    deleted = {}
+
+    def progress(table, count):
+        deleted[table] = deleted.get(table, 0) + count
+        if job is not None:
+            job.deleted = dict(deleted)
+
+    for model, criteria, before_chunk in steps:
+        delete_rows(model, criteria, progress=progress, before_chunk=before_chunk)
+    return deleted
+
+
+class DeletionJob:
+    """Suppression exécutée en arrière-plan ; `deleted` / `total` donnent la progression (lignes)."""
+
+    def __init__(self, kind, owner_id, target):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.owner_id = owner_id
+        self.target = target
+        self.status = "queued"
+        self.total = None
+        self.deleted = {}
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+
+    def to_dict(self):
+        done = sum(self.deleted.values())
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "target": self.target,
+            "status": self.status,
+            "deleted": done,
+            "total": self.total,
+            "progress": round(done / self.total, 4) if self.total else (1.0 if self.status == "done" else 0.0),
+            "deleted_by_table": self.deleted,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+def start_deletion_job(kind, owner_id, target, steps_factory):
+    """Lance `run_steps(steps_factory())` dans un thread (vert sous eventlet) ; retourne le DeletionJob."""
+    job = DeletionJob(kind, owner_id, target)
+    with _jobs_lock:
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_TRACKED_JOBS:
+            _jobs.popitem(last=False)
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            job.status = "running"
+            try:
+                run_steps(steps_factory(), job)
+                job.status = "done"
+                logger.info(f"Suppression {kind} ({target}) terminée : {sum(job.deleted.values())} ligne(s)")
+            except Exception as e:
+                db.session.rollback()
+                job.status = "failed"
+                job.error = str(e)
+                logger.error(f"Échec de la suppression {kind} ({target}) : {e}")
+            finally:
+                db.session.remove()
+                job.finished_at = datetime.utcnow()
+                metrics.counter(f"bulk_delete.jobs.{job.status}").inc()
+
+    threading.Thread(target=run, name=f"delete-{job.id[:8]}", daemon=True).start()
+    return job
+
+
+def get_deletion_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
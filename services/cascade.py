@@ -0,0 +1,50 @@
+import time
+import logging
+import numpy as np
+from services.metrics import metrics, elapsed_ms
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class CascadeClassifier:
+    """
+    Premier étage d'une cascade à deux modèles : un modèle bon marché (résolution réduite ou
+    tête distillée) répond seul lorsque sa confiance top-1 atteint `threshold` ; les images
+    ambiguës sont renvoyées (None) pour être traitées par le modèle complet.
+
+    L'appelant décode chaque image une seule fois, à `input_size` et à la taille du modèle complet
+    (cf. decode_image_sizes), pour réutiliser le second tenseur en cas d'escalade.
+    `execute_fn(fn, batch)` exécute la prédiction (hors du hub eventlet, cf. InferencePool.execute).
+    """
+
+    def __init__(self, backend, input_size, threshold, execute_fn):
+        self.backend = backend
+        self.input_size = tuple(input_size)
+        self.threshold = threshold
+        self.execute_fn = execute_fn
+
+        self._hits = metrics.counter("plant.cascade.stage1_hits")
+        self._escalations = metrics.counter("plant.cascade.escalations")
+        self._stage1_ms = metrics.histogram("plant.cascade.stage1_ms")
+
+    def first_stage(self, tensors):
+        """
+        Retourne, pour chaque tenseur prétraité (1, H, W, 3) à `input_size`, le vecteur de probabilités
+        du premier étage s'il est suffisamment confiant, None sinon (escalade vers le modèle complet).
+        """
+        start = time.perf_counter()
+        batch = np.concatenate(tensors, axis=0)
+        probabilities = self.execute_fn(self.backend.predict, batch)
+        self._stage1_ms.observe(elapsed_ms(start))
+
+        results = []
+        for probs in probabilities:
+            if float(np.max(probs)) >= self.threshold:
+                self._hits.inc()
+                results.append(probs)
+            else:
+                self._escalations.inc()
+                results.append(None)
+        return results
@@ -0,0 +1,128 @@
+import base64
+import logging
+from datetime import datetime
+from sqlalchemy import func, and_, or_
+from extensions import db
+from models.chat_message import ChatMessage
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Longueur des aperçus du dernier échange dans la liste des conversations
+PREVIEW_CHARS = 120
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(*values):
+    """Curseur opaque pour la page suivante (valeurs de la dernière ligne renvoyée)."""
+    raw = "|".join(value.isoformat() if isinstance(value, datetime) else str(value) for value in values)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor, count):
+    """Inverse d'encode_cursor ; lève ValueError si le curseur est invalide."""
+    try:
+        values = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+    except (ValueError, UnicodeError):
+        raise ValueError("Curseur de pagination invalide.")
+    if len(values) != count:
+        raise ValueError("Curseur de pagination invalide.")
+    return values
+
+
+def page_size(limit, default):
+    return max(1, min(limit or default, MAX_PAGE_SIZE))
+
+
+def _preview(text):
+    text = (text or "").strip()
+    return text if len(text) <= PREVIEW_CHARS else text[:PREVIEW_CHARS].rstrip() + "…"
+
+
+def message_to_dict(m):
+    return {
+        "id": m.id,
+        "message": m.message,
+        "response": m.response,
+        "created_at": m.created_at.isoformat()
+    }
+
+
+def list_conversations(user_id, limit=20, cursor=None):
+    """
+    Conversations de l'utilisateur, de la plus récemment active à la plus ancienne, en une requête :
+    agrégats par conversation (nombre de messages, début, dernier message) joints au dernier message
+    pour l'aperçu. Pagination par curseur sur l'ID du dernier message. Retourne (conversations, curseur suivant).
+    """
+    limit = page_size(limit, 20)
+    last_id = func.max(ChatMessage.id)
+    stats = db.session.query(
+        ChatMessage.conversation_id.label("conversation_id"),
+        func.count(ChatMessage.id).label("message_count"),
+        func.min(ChatMessage.created_at).label("started_at"),
+        last_id.label("last_message_id")
+    ).filter(ChatMessage.user_id == user_id).group_by(ChatMessage.conversation_id)
+    if cursor:
+        before_id, = decode_cursor(cursor, 1)
+        stats = stats.having(last_id < int(before_id))
+    stats = stats.subquery()
+
+    rows = db.session.query(
+        stats.c.conversation_id,
+        stats.c.message_count,
+        stats.c.started_at,
+        stats.c.last_message_id,
+        ChatMessage.created_at,
+        func.substr(ChatMessage.message, 1, PREVIEW_CHARS + 1),
+        func.substr(ChatMessage.response, 1, PREVIEW_CHARS + 1)
+    ).join(ChatMessage, ChatMessage.id == stats.c.last_message_id) \
+        .order_by(stats.c.last_message_id.desc()).limit(limit + 1).all()
+
+    conversations = [
+        {
+            "conversation_id": conversation_id,
+            "message_count": message_count,
+            "started_at": started_at.isoformat() if started_at else None,
+            "last_message_at": last_at.isoformat() if last_at else None,
+            "last_message": _preview(message),
+            "last_response": _preview(response)
+        }
+        for conversation_id, message_count, started_at, _, last_at, message, response in rows[:limit]
+    ]
+    next_cursor = encode_cursor(rows[limit - 1][3]) if len(rows) > limit else None
+    return conversations, next_cursor
+
+
+def list_messages(user_id, conversation_id, limit=50, cursor=None):
+    """
+    Messages d'une conversation par pages, des plus récents aux plus anciens (pagination par curseur sur
+    (created_at, id), servie par l'index (user_id, conversation_id, created_at)). Chaque page est renvoyée
+    dans l'ordre chronologique. Retourne (messages, curseur de la page précédente ou None).
+    """
+    limit = page_size(limit, 50)
+    query = ChatMessage.query.filter(ChatMessage.user_id == user_id, ChatMessage.conversation_id == conversation_id)
+    if cursor:
+        created_at, message_id = decode_cursor(cursor, 2)
+        try:
+            created_at, message_id = datetime.fromisoformat(created_at), int(message_id)
+        except ValueError:
+            raise ValueError("Curseur de pagination invalide.")
+        query = query.filter(or_(
+            ChatMessage.created_at < created_at,
+            and_(ChatMessage.created_at == created_at, ChatMessage.id < message_id)
+        ))
+    rows = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+    page = rows[:limit]
+    next_cursor = encode_cursor(page[-1].created_at, page[-1].id) if len(rows) > limit else None
+    return [message_to_dict(m) for m in reversed(page)], next_cursor
+
+
+def get_history(user_id):
+    """Tout l'historique de l'utilisateur regroupé par conversation, en une seule requête."""
+    messages = ChatMessage.query.filter_by(user_id=user_id) \
+        .order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).all()
+    conversations = {}
+    for m in messages:
+        conversations.setdefault(m.conversation_id, []).append(message_to_dict(m))
+    return [{"conversation_id": cid, "messages": msgs} for cid, msgs in conversations.items()]
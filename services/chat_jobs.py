@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+import logging
+from datetime import datetime, timedelta
+from config import Config
+from extensions import db, socketio
+from services.metrics import metrics
+from services.llm_scheduler import LLMQueueFull
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Tentatives lorsqu'un job est refusé par l'ordonnanceur du LLM (file pleine)
+MAX_SCHEDULER_RETRIES = 3
+
+
+class ChatJobQueueFull(Exception):
+    """Levée lorsque la file des jobs de chat est pleine."""
+    pass
+
+
+class ChatJobWorkers:
+    """
+    Pool de workers (threads, verts sous eventlet) qui traitent les messages de chat en arrière-plan,
+    indépendamment des greenlets qui servent les requêtes HTTP. Les jobs sont persistés dans la table
+    chat_jobs : au démarrage, ceux restés "queued", et ceux "running" depuis plus de CHAT_JOB_LEASE_SECONDS
+    (les autres tournent peut-être dans un autre processus), sont remis en file ; ceux qui n'y tiennent
+    pas restent "queued" et sont repris par les workers à mesure que des places se libèrent.
+    Un worker réserve le job (passage conditionnel de "queued" à "running") avant de le traiter :
+    un job présent dans les files de plusieurs processus n'est traité qu'une fois.
+    """
+
+    def __init__(self, app, workers, queue_size):
+        self.app = app
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._backlog = []  # Jobs repris au démarrage qui n'ont pas tenu dans la file
+        self._backlog_lock = threading.Lock()
+
+    def start(self):
+        from models.chat_job import ChatJob
+        with self.app.app_context():
+            expired = datetime.utcnow() - timedelta(seconds=Config.CHAT_JOB_LEASE_SECONDS)
+            ChatJob.query.filter(
+                ChatJob.status == "running",
+                db.or_(ChatJob.started_at.is_(None), ChatJob.started_at < expired)
+            ).update({"status": "queued"}, synchronize_session=False)
+            db.session.commit()
+            pending_ids = [job_id for job_id, in db.session.query(ChatJob.id).filter(ChatJob.status == "queued").order_by(ChatJob.created_at.asc())]
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"chat-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        # Sans attente au démarrage : le surplus reste "queued" et sera remis en file par les workers
+        self._backlog = list(pending_ids)
+        self._refill()
+        if pending_ids:
+            logger.info(f"{len(pending_ids)} job(s) de chat non terminés repris ({len(self._backlog)} en attente d'une place)")
+        logger.debug(f"Workers des jobs de chat démarrés ({self.workers} workers, file max: {self._queue.maxsize})")
+
+    def submit(self, job_id):
+        try:
+            self._queue.put_nowait(job_id)
+        except queue.Full:
+            metrics.counter("chat.jobs.rejected").inc()
+            raise ChatJobQueueFull("File des messages pleine, veuillez réessayer dans quelques instants.")
+        metrics.gauge("chat.jobs.queue_depth").set(self._queue.qsize())
+
+    def _refill(self):
+        """Remet en file les jobs repris au démarrage, tant qu'il y a de la place."""
+        with self._backlog_lock:
+            while self._backlog:
+                try:
+                    self._queue.put_nowait(self._backlog[0])
+                except queue.Full:
+                    break
+                self._backlog.pop(0)
+        metrics.gauge("chat.jobs.queue_depth").set(self._queue.qsize())
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if self._backlog:
+                self._refill()
+            metrics.gauge("chat.jobs.queue_depth").set(self._queue.qsize())
+            with self.app.app_context():
+                try:
+                    self._process(job_id)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Erreur inattendue lors du traitement du job {job_id} : {e}")
+                    self._fail(job_id, "Erreur inattendue lors du traitement du message.")
+                finally:
+                    db.session.remove()
+
+    def _fail(self, job_id, error):
+        """Termine le job en "failed" après une erreur inattendue (sinon il resterait "running")."""
+        from models.chat_job import ChatJob
+        try:
+            job = db.session.get(ChatJob, job_id)
+            if job is None or job.status not in ("queued", "running"):
+                return
+            job.status = "failed"
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            metrics.counter("chat.jobs.failed").inc()
+            socketio.emit("chat_job_done", job.to_dict(), room=f"user_{job.user_id}", namespace="/expert")
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Impossible de marquer le job {job_id} en échec : {e}")
+
+    def _process(self, job_id):
+        from models.chat_job import ChatJob
+        from services.chat_service import process_chat_message
+
+        # Réservation atomique : un autre worker (ou processus) a pu prendre le job entre-temps
+        claimed = ChatJob.query.filter(ChatJob.id == job_id, ChatJob.status == "queued").update(
+            {"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+        if not claimed:
+            return
+        job = db.session.get(ChatJob, job_id)
+
+        for attempt in range(MAX_SCHEDULER_RETRIES + 1):
+            try:
+                saved = {}
+                job.response = process_chat_message(job.user_id, job.message, conversation_id=job.conversation_id, endpoint="jobs", saved=saved)
+                job.chat_message_id = saved.get("chat_message_id")
+                job.status = "done"
+                break
+            except LLMQueueFull as e:
+                if attempt == MAX_SCHEDULER_RETRIES:
+                    job.status = "failed"
+                    job.error = str(e)
+                else:
+                    logger.debug(f"Job {job.id} refusé par l'ordonnanceur, nouvel essai dans {e.retry_after_s} s")
+                    time.sleep(max(1.0, e.retry_after_s))
+            except ValueError as e:
+                job.status = "failed"
+                job.error = str(e)
+                break
+
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        metrics.counter(f"chat.jobs.{job.status}").inc()
+        metrics.histogram("chat.jobs.latency_ms").observe((job.finished_at - job.created_at).total_seconds() * 1000)
+
+        # Livraison sur la room Socket.IO de l'utilisateur (namespace /expert) ; GET /chat/jobs/<id> en secours
+        socketio.emit("chat_job_done", job.to_dict(), room=f"user_{job.user_id}", namespace="/expert")
+        logger.debug(f"Job {job.id} terminé ({job.status}) et envoyé à la room user_{job.user_id}")
+
+
+_workers = None
+
+def start_chat_workers(app):
+    """Démarre le pool de workers des jobs de chat (une fois par processus)."""
+    global _workers
+    if _workers is None:
+        _workers = ChatJobWorkers(app, Config.CHAT_JOB_WORKERS, Config.CHAT_JOB_QUEUE_SIZE)
+        _workers.start()
+    return _workers
+
+
+def enqueue_chat_job(user_id, message, conversation_id):
+    """Enregistre un job de chat et le met en file ; retourne le ChatJob créé."""
+    from models.chat_job import ChatJob
+    if _workers is None:
+        raise ChatJobQueueFull("Le traitement asynchrone des messages n'est pas démarré.")
+    job = ChatJob(user_id=int(user_id), message=message, conversation_id=conversation_id)
+    db.session.add(job)
+    db.session.commit()
+    try:
+        _workers.submit(job.id)
+    except ChatJobQueueFull:
+        job.status = "failed"
+        job.error = "File des messages pleine."
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        raise
+    return job
@@ -2,52 +2,340 @@ from models.chat_message import ChatMessage
 from models.user import User
 from extensions import db
 import requests
+import hashlib
+from config import Config
+import threading
+import time
 import logging
+from flask import current_app
 from services.knowledge_base import get_static_response
+from services.retrieval import retrieve_answer
 from services.plant_service import detect_plant_disease
+from services.inference_pool import InferenceQueueFull
 from sqlalchemy.exc import IntegrityError, DataError
+from services.metrics import metrics, elapsed_ms
+from services.ollama_client import get_ollama_client, OllamaUnavailable
+from services.model_router import get_model_router, record_route_result, ROUTE_SMALL, ROUTE_LARGE, ROUTE_DEFAULT
+from services.response_cache import get_response_cache, cache_key
+from services.semantic_cache import get_semantic_cache
+from services.single_flight import SingleFlight
+from services.llm_scheduler import get_llm_scheduler, LLMQueueFull
+from services.conversation_context import build_context_prompt, schedule_summary_refresh
+from services.generation_budget import (
+    get_display_limit, generation_options, num_predict_for, trim_to_boundary, record_generation,
+    answer_budget, TRUNCATION_SUFFIX
+)
 
 # Configurer le logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# URL de l'API Ollama
-OLLAMA_API_URL = "http://127.0.0.1:11434/api/chat"
+# Modèle Ollama par défaut (URL, délais et disjoncteur : cf. services/ollama_client.py ;
+# choix entre petit et grand modèle : cf. services/model_router.py)
+OLLAMA_MODEL = Config.OLLAMA_MODEL
 
-def process_chat_message(user_id, message, conversation_id=None, image=None):
+# Instruction système envoyée à Ollama
+SYSTEM_PROMPT = (
+    "Vous êtes AgriBot, un assistant agricole expert. Votre rôle est de fournir des conseils pratiques et précis sur la plantation, "
+    "l'entretien des cultures, la gestion des sols, les engrais, et les maladies des plantes. Répondez de manière structurée et concise :\n"
+    "- Utilisez des en-têtes avec ### pour les sections (ex. ### Services, ### Conseils pratiques).\n"
+    "- Présentez les informations sous forme de listes avec - pour chaque point.\n"
+    "- Soyez clair, pratique et conversationnel."
+)
+
+# Version de l'instruction système (entre dans la clé du cache des réponses : le modifier invalide le cache)
+SYSTEM_PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+RESPONSE_INTRO = "### AgriBot\nJe suis votre assistant agricole expert. Voici ma réponse :"
+
+# Seuils pour le débit de génération (tokens/s)
+TOKENS_PER_S_BUCKETS = [1, 2, 5, 10, 20, 30, 50, 75, 100, 200]
+
+# Sources possibles d'une réponse (part de trafic exposée par get_chat_metrics)
+ANSWER_SOURCES = ("static", "retrieval", "llm", "error")
+
+def build_ollama_payload(full_message, stream=False, options=None, model=None):
+    """Construit la requête /api/chat pour Ollama avec une instruction claire (options : num_predict, stop...)."""
+    payload = {
+        "model": model or OLLAMA_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": full_message
+            }
+        ],
+        "stream": stream,
+        "temperature": 0.7
+    }
+    if options:
+        payload["options"] = options
+    return payload
+
+def generation_version(max_chars):
+    """Version de génération pour la clé du cache : instruction système + plafond de tokens."""
+    return f"{SYSTEM_PROMPT_VERSION}/np{num_predict_for(max_chars) or '-'}"
+
+def get_cached_answer(prompt, version, model=OLLAMA_MODEL):
+    """Réponse du LLM déjà générée pour ce message normalisé et ce modèle (cache SQLite), ou None."""
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    try:
+        cached = cache.get(prompt, model, version)
+    except Exception as e:
+        logger.error(f"Erreur de lecture du cache des réponses : {e}")
+        return None
+    if cached is None:
+        metrics.counter("chat.llm_cache.misses").inc()
+        return None
+    answer, generation_ms = cached
+    metrics.counter("chat.llm_cache.hits").inc()
+    metrics.counter("chat.llm_cache.saved_ms").inc(generation_ms)
+    logger.debug(f"Réponse du LLM trouvée dans le cache (génération évitée : {generation_ms:.0f} ms)")
+    return answer
+
+def cache_answer(prompt, version, answer, generation_ms, model=OLLAMA_MODEL):
+    cache = get_response_cache()
+    if cache is None:
+        return
+    try:
+        cache.put(prompt, model, version, answer, generation_ms)
+    except Exception as e:
+        logger.error(f"Erreur d'écriture dans le cache des réponses : {e}")
+
+def get_semantic_answer(prompt, version, model=OLLAMA_MODEL):
+    """
+    Réponse déjà générée pour un message de sens proche (cache sémantique), ou None.
+    Retourne (réponse, embedding du message) ; l'embedding sert à enregistrer la réponse générée ensuite.
+    """
+    cache = get_semantic_cache()
+    if cache is None:
+        return None, None
+    vector = cache.embed(prompt)
+    if vector is None:
+        return None, None
+    match = cache.search(vector, model, version)
+    if match is None:
+        metrics.counter("chat.semantic_cache.misses").inc()
+        return None, vector
+    answer, similarity, matched_prompt, generation_ms = match
+    metrics.counter("chat.semantic_cache.hits").inc()
+    metrics.counter("chat.semantic_cache.saved_ms").inc(generation_ms)
+    cache.sample_hit(prompt, similarity, matched_prompt, answer)
+    logger.debug(f"Réponse du LLM trouvée dans le cache sémantique (similarité {similarity:.3f} avec « {matched_prompt} »)")
+    return answer, vector
+
+def semantic_cache_answer(vector, prompt, version, answer, generation_ms, model=OLLAMA_MODEL):
+    cache = get_semantic_cache()
+    if cache is None or vector is None:
+        return
+    try:
+        cache.add(vector, prompt, model, version, answer, generation_ms)
+    except Exception as e:
+        logger.error(f"Erreur d'écriture dans le cache sémantique : {e}")
+
+# Générations Ollama en cours, regroupées par message normalisé
+_llm_flights = SingleFlight()
+
+def chat_with_fallback(route, prompt, options):
+    """
+    Appelle le modèle de la route puis, s'il échoue, ses modèles de secours dans l'ordre.
+    Retourne (réponse JSON d'Ollama, modèle utilisé). Un circuit ouvert n'est pas retenté.
+    """
+    client = get_ollama_client()
+    for attempt, model in enumerate(route.models):
+        try:
+            return client.chat(build_ollama_payload(prompt, options=options, model=model)), model
+        except OllamaUnavailable:
+            raise
+        except (requests.RequestException, ValueError) as e:
+            if attempt == len(route.models) - 1:
+                raise
+            logger.warning(f"Échec du modèle {model} ({e.__class__.__name__}), essai du modèle {route.models[attempt + 1]}")
+
+def generate_llm_answer(prompt, user, max_chars, route=None, semantic=False):
+    """
+    Réponse d'Ollama pour `prompt` (texte nettoyé), limitée à environ `max_chars` caractères par le
+    plafond num_predict, servie par le cache des réponses si possible. Les demandes identiques
+    (message normalisé) qui arrivent pendant une génération en cours attendent cette génération
+    au lieu d'en lancer une nouvelle (si elle échoue, chacune retente pour son compte) ; les autres passent
+    par l'ordonnanceur (LLMQueueFull si la file est pleine).
+    `route` (cf. services/model_router.py) désigne le modèle et ses secours ; par défaut, le prompt est routé tel quel.
+    Si `semantic` est vrai (message sans contexte ajouté), le cache sémantique est aussi consulté et alimenté.
+    Retourne (réponse, tokens générés) ; tokens générés vaut None si aucune génération n'a été faite pour cet appel.
+    """
+    route = route or get_model_router().route(prompt)
+    version = generation_version(max_chars)
+    answer = get_cached_answer(prompt, version, route.model)
+    if answer is not None:
+        return answer, None
+    vector = None
+    if semantic:
+        answer, vector = get_semantic_answer(prompt, version, route.model)
+        if answer is not None:
+            return answer, None
+
+    def generate():
+        with get_llm_scheduler().slot(user.id, prompt, user.role):
+            start = time.perf_counter()
+            response_data, model = chat_with_fallback(route, prompt, generation_options(max_chars))
+        generation_ms = elapsed_ms(start)
+        answer = response_data["message"]["content"].strip()
+        cache_answer(prompt, version, answer, generation_ms, model)
+        semantic_cache_answer(vector, prompt, version, answer, generation_ms, model)
+        record_route_result(route, model, generation_ms, response_data.get("eval_count"))
+        return answer, response_data.get("eval_count")
+
+    (answer, generated_tokens), shared = _llm_flights.do(cache_key(prompt, route.model, version), generate)
+    if shared:
+        metrics.counter("chat.llm.coalesced").inc()
+        logger.debug("Demande identique déjà en cours de génération : réponse partagée.")
+        return answer, None
+    return answer, generated_tokens
+
+def find_direct_answer(message):
+    """
+    Réponse sans LLM : base de connaissances statique, puis recherche BM25 dans agri_dataset.txt.
+    Retourne (source, réponse) avec source "static" ou "retrieval", ou None.
+    """
+    static_response = get_static_response(message)
+    if static_response:
+        logger.debug(f"Réponse statique trouvée : {static_response}")
+        return "static", static_response
+    match = retrieve_answer(message)
+    if match:
+        return "retrieval", match[1]
+    return None
+
+def record_answer_source(source):
+    """Compte l'origine de la réponse textuelle : "static", "retrieval", "llm" ou "error"."""
+    metrics.counter(f"chat.answer_source.{source}").inc()
+
+def save_chat_message(user_id, message, response, conversation_id):
+    """Enregistre un échange dans la base de données et retourne la ligne créée."""
+    chat = ChatMessage(
+        user_id=user_id,
+        message=message,
+        response=response,
+        conversation_id=conversation_id
+    )
+    db.session.add(chat)
+    db.session.commit()
+    return chat
+
+class _Stage:
+    """
+    Étape du traitement d'un message exécutée dans un thread (vert sous eventlet), avec son propre
+    contexte d'application et sa propre session. `result()` attend la fin de l'étape et relance son exception.
+    """
+
+    def __init__(self, name, fn, *args):
+        self.name = name
+        self.duration_ms = None
+        self._result = None
+        self._error = None
+        app = current_app._get_current_object()
+
+        def run():
+            start = time.perf_counter()
+            with app.app_context():
+                try:
+                    self._result = fn(*args)
+                except Exception as e:
+                    db.session.rollback()
+                    self._error = e
+                finally:
+                    db.session.remove()
+                    self.duration_ms = elapsed_ms(start)
+
+        self._thread = threading.Thread(target=run, name=f"chat-{name}", daemon=True)
+        self._thread.start()
+
+    def result(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+def record_pipeline_timings(timings, total_ms):
+    """
+    Enregistre la durée de chaque étape, la durée de bout en bout et la somme des étapes :
+    l'écart entre les deux mesure le recouvrement obtenu en exécutant les étapes en parallèle.
+    """
+    stage_sum_ms = sum(timings.values())
+    for stage, duration_ms in timings.items():
+        metrics.histogram(f"chat.pipeline.stage.{stage}_ms").observe(duration_ms)
+    metrics.histogram("chat.pipeline.end_to_end_ms").observe(total_ms)
+    metrics.histogram("chat.pipeline.stage_sum_ms").observe(stage_sum_ms)
+    metrics.counter("chat.pipeline.end_to_end_total_ms").inc(total_ms)
+    metrics.counter("chat.pipeline.stage_sum_total_ms").inc(stage_sum_ms)
+    logger.debug(f"Traitement du message : {total_ms:.0f} ms de bout en bout, {stage_sum_ms:.0f} ms cumulés sur les étapes "
+                 + ", ".join(f"{stage}={duration_ms:.0f}" for stage, duration_ms in timings.items()))
+    return {
+        "stages_ms": {stage: round(duration_ms, 1) for stage, duration_ms in timings.items()},
+        "end_to_end_ms": round(total_ms, 1),
+        "stage_sum_ms": round(stage_sum_ms, 1)
+    }
+
+def process_chat_message(user_id, message, conversation_id=None, image=None, endpoint="send", timings=None, saved=None):
     """
     Traite un message de l'utilisateur et génère une réponse structurée en utilisant l'API d'Ollama avec Gemma-2b.
     Si une image est fournie, analyse l'image pour détecter une maladie des plantes.
+    La longueur de la réponse est limitée selon l'endpoint ("send", "jobs"...) et le rôle de l'utilisateur.
+    Les étapes indépendantes (analyse de l'image, base de connaissances, contexte) s'exécutent en
+    parallèle ; l'appel au LLM part dès que ses entrées sont prêtes. Si `timings` (dict) est fourni, il reçoit
+    la durée de chaque étape, la durée de bout en bout et la somme des étapes. Si `saved` (dict) est fourni,
+    il reçoit l'id de la ligne ChatMessage enregistrée (`chat_message_id`).
     """
+    start = time.perf_counter()
+    stage_ms = {}
     try:
         # Convertir user_id en entier
         user_id = int(user_id)
         
         # Vérifier si l'utilisateur existe
+        stage_start = time.perf_counter()
         user = User.query.get(user_id)
+        stage_ms["user"] = elapsed_ms(stage_start)
         if not user:
             logger.error(f"Utilisateur avec ID {user_id} non trouvé.")
             raise ValueError("Utilisateur non trouvé.")
 
-        # Vérifier la disponibilité d'Ollama
-        try:
-            response = requests.get("http://127.0.0.1:11434/", timeout=2)
-            response.raise_for_status()
-            logger.debug("Ollama est accessible.")
-        except requests.RequestException as e:
-            logger.error(f"Ollama n'est pas accessible : {e.__class__.__name__} - {str(e)}")
-            raise ValueError("Le service Ollama n'est pas accessible.")
+        # Lancer en arrière-plan l'analyse de l'image, qui ne dépend pas du texte
+        image_stage = None
+        if image:
+            logger.debug("Analyse de l'image pour détecter une maladie des plantes...")
+            image_stage = _Stage("image", detect_plant_disease, image, user_id)
+
+        # Limite d'affichage (caractères) pour cet endpoint et ce rôle
+        display_limit = get_display_limit(endpoint, user.role)
 
         # Initialiser la réponse finale
         response_parts = []
 
         # Ajouter une introduction standard
-        response_parts.append("### AgriBot\nJe suis votre assistant agricole expert. Voici ma réponse :")
+        response_parts.append(RESPONSE_INTRO)
+
+        # Vérifier si une réponse statique est disponible (pendant l'analyse de l'image)
+        stage_start = time.perf_counter()
+        direct_answer = find_direct_answer(message)
+        stage_ms["direct_answer"] = elapsed_ms(stage_start)
+
+        # Sans image, le contexte de la conversation (lectures en base) se prépare tout de suite
+        if not direct_answer and not image:
+            stage_start = time.perf_counter()
+            # Résumé de la conversation + derniers échanges, dans le budget de tokens du contexte
+            full_message = build_context_prompt(user_id, conversation_id, message)
+            stage_ms["context"] = elapsed_ms(stage_start)
 
         # Vérifier si une image est fournie
-        if image:
-            logger.debug("Analyse de l'image pour détecter une maladie des plantes...")
-            result = detect_plant_disease(image, user_id)
+        if image_stage:
+            result = image_stage.result()
+            stage_ms["image"] = image_stage.duration_ms
             disease = result["disease"]
             confidence = result.get("confidence", 0)
             recommendation = result["recommendation"]
@@ -62,10 +350,9 @@ def process_chat_message(user_id, message, conversation_id=None, image=None):
             response_parts.append(image_response)
             logger.debug(f"Résultat de l'analyse de l'image : {image_response}")
 
-        # Vérifier si une réponse statique est disponible
-        static_response = get_static_response(message)
-        if static_response:
-            logger.debug(f"Réponse statique trouvée : {static_response}")
+        if direct_answer:
+            source, static_response = direct_answer
+            record_answer_source(source)
             if response_parts and image:  # Si une image a été analysée
                 response_parts.append(
                     "\n### Réponse à votre question\n"
@@ -75,40 +362,21 @@ def process_chat_message(user_id, message, conversation_id=None, image=None):
                 response_parts.append(f"\n### Réponse\n{static_response}")
         else:
             # Préparer le message pour Ollama
-            full_message = message
             if response_parts and image:  # Si une image a été analysée
                 full_message = f"{response_parts[1]}\n\nUtilisateur : {message}"
 
-            # Préparer la requête pour l'API Ollama avec une instruction claire
+            # Envoyer la requête à Ollama (cache des réponses, connexion réutilisée, délais, court-circuit si indisponible)
             logger.debug(f"Envoi de la requête à Ollama avec le message : {full_message}")
-            payload = {
-                "model": "gemma:2b",
-                "messages": [
-                    {
-                        "role": "system",
-                        "content": (
-                            "Vous êtes AgriBot, un assistant agricole expert. Votre rôle est de fournir des conseils pratiques et précis sur la plantation, "
-                            "l'entretien des cultures, la gestion des sols, les engrais, et les maladies des plantes. Répondez de manière structurée et concise :\n"
-                            "- Utilisez des en-têtes avec ### pour les sections (ex. ### Services, ### Conseils pratiques).\n"
-                            "- Présentez les informations sous forme de listes avec - pour chaque point.\n"
-                            "- Soyez clair, pratique et conversationnel."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": full_message
-                    }
-                ],
-                "stream": False,
-                "temperature": 0.7
-            }
-
-            # Envoyer la requête à Ollama avec un timeout
+            # Place restante pour la réponse d'Ollama, en-tête de section compris (convertie en num_predict)
+            llm_budget = answer_budget(display_limit, len("\n".join(response_parts)) + 40)
+            # Petit ou grand modèle selon le message de l'utilisateur (pas le contexte ajouté)
+            route = get_model_router().route(message, has_image=bool(image))
+            stage_start = time.perf_counter()
             try:
-                logger.debug(f"Payload envoyé à Ollama : {payload}")
-                response = requests.post(OLLAMA_API_URL, json=payload)
-                response.raise_for_status()
-            except requests.RequestException as e:
+                generated_response, generated_tokens = generate_llm_answer(
+                    full_message, user, llm_budget, route, semantic=full_message == message
+                )
+            except (requests.RequestException, ValueError) as e:
                 logger.error(f"Erreur lors de la communication avec l'API Ollama : {e.__class__.__name__} - {str(e)}")
                 error_response = (
                     "### AgriBot\n"
@@ -116,20 +384,21 @@ def process_chat_message(user_id, message, conversation_id=None, image=None):
                     f"- Une erreur s'est produite avec l'API Ollama : {e.__class__.__name__} - {str(e)}.\n"
                     "- Veuillez réessayer plus tard."
                 )
-                chat = ChatMessage(
-                    user_id=user_id,
-                    message=message,
-                    response=error_response,
-                    conversation_id=conversation_id
-                )
-                db.session.add(chat)
-                db.session.commit()
+                record_answer_source("error")
+                chat = save_chat_message(user_id, message, error_response, conversation_id)
+                if saved is not None:
+                    saved["chat_message_id"] = chat.id
                 return error_response
+            stage_ms["llm"] = elapsed_ms(stage_start)
+
+            record_answer_source("llm")
+            logger.debug(f"Réponse d'Ollama : {generated_response}")
 
-            # Extraire et structurer la réponse
-            response_data = response.json()
-            ollama_response = response_data["message"]["content"].strip()
-            logger.debug(f"Réponse d'Ollama : {ollama_response}")
+            # Couper proprement (fin de phrase ou d'élément de liste) plutôt qu'au caractère près
+            ollama_response, truncated = trim_to_boundary(generated_response, llm_budget)
+            record_generation(len(generated_response), len(ollama_response), generated_tokens)
+            if truncated:
+                ollama_response += TRUNCATION_SUFFIX
 
             # Ajouter la réponse d'Ollama
             if response_parts and image:  # Si une image a été analysée
@@ -143,26 +412,34 @@ def process_chat_message(user_id, message, conversation_id=None, image=None):
         # Combiner les parties en une réponse finale
         final_response = "\n".join(response_parts)
 
-        # Limiter la longueur de la réponse
-        if len(final_response) > 500:
-            final_response = final_response[:500] + "... (réponse tronquée)"
+        # Limiter la longueur de la réponse (réponses directes ou analyse d'image trop longues)
+        if display_limit is not None and len(final_response) > display_limit + len(TRUNCATION_SUFFIX):
+            final_response = trim_to_boundary(final_response, display_limit)[0] + TRUNCATION_SUFFIX
 
         # Enregistrer dans la base de données
-        chat = ChatMessage(
-            user_id=user_id,
-            message=message,
-            response=final_response,
-            conversation_id=conversation_id
-        )
-        db.session.add(chat)
-        db.session.commit()
+        stage_start = time.perf_counter()
+        chat = save_chat_message(user_id, message, final_response, conversation_id)
+        stage_ms["save"] = elapsed_ms(stage_start)
+        if saved is not None:
+            saved["chat_message_id"] = chat.id
         logger.debug(f"Message et réponse enregistrés pour l'utilisateur {user_id}.")
+        schedule_summary_refresh(user_id, conversation_id)
+
+        report = record_pipeline_timings(stage_ms, elapsed_ms(start))
+        if timings is not None:
+            timings.update(report)
 
         return final_response
 
     except ValueError as e:
         logger.error(f"Erreur de validation : {e}")
         raise
+    except LLMQueueFull as e:
+        logger.warning(f"Demande refusée par l'ordonnanceur ({e.status}) : {e}")
+        raise
+    except InferenceQueueFull as e:
+        logger.warning(f"Analyse de l'image refusée : {e}")
+        raise
     except IntegrityError as e:
         db.session.rollback()
         logger.error(f"Erreur d'intégrité lors de l'enregistrement du message : {e}")
@@ -180,12 +457,183 @@ def process_chat_message(user_id, message, conversation_id=None, image=None):
             "- Désolé, une erreur inattendue s'est produite.\n"
             "- Veuillez réessayer plus tard."
         )
-        chat = ChatMessage(
-            user_id=user_id,
-            message=message,
-            response=error_response,
-            conversation_id=conversation_id
+        chat = save_chat_message(user_id, message, error_response, conversation_id)
+        if saved is not None:
+            saved["chat_message_id"] = chat.id
+        return error_response
+
+
+def get_chat_metrics():
+    """Instantané des métriques du chatbot (préfixe "chat."), avec la part de trafic servie par chaque source."""
+    snapshot = metrics.snapshot(prefix="chat.")
+    counts = {source: snapshot.get(f"chat.answer_source.{source}", 0) for source in ANSWER_SOURCES}
+    total = sum(counts.values())
+    snapshot["chat.answer_source_fraction"] = {
+        source: round(count / total, 4) if total else 0.0 for source, count in counts.items()
+    }
+    routes = {name: snapshot.get(f"chat.router.{name}.requests", 0) for name in (ROUTE_SMALL, ROUTE_LARGE, ROUTE_DEFAULT)}
+    routed = sum(routes.values())
+    snapshot["chat.router.route_fraction"] = {
+        name: round(count / routed, 4) if routed else 0.0 for name, count in routes.items()
+    }
+    hits = snapshot.get("chat.llm_cache.hits", 0)
+    lookups = hits + snapshot.get("chat.llm_cache.misses", 0)
+    snapshot["chat.llm_cache.hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+    semantic_hits = snapshot.get("chat.semantic_cache.hits", 0)
+    semantic_lookups = semantic_hits + snapshot.get("chat.semantic_cache.misses", 0)
+    snapshot["chat.semantic_cache.hit_rate"] = round(semantic_hits / semantic_lookups, 4) if semantic_lookups else 0.0
+    generated = snapshot.get("chat.budget.generated_tokens", 0)
+    snapshot["chat.budget.wasted_fraction"] = (
+        round(1 - snapshot.get("chat.budget.displayed_tokens", 0) / generated, 4) if generated else 0.0
+    )
+    stage_sum_ms = snapshot.get("chat.pipeline.stage_sum_total_ms", 0)
+    snapshot["chat.pipeline.overlap_fraction"] = (
+        round(1 - snapshot.get("chat.pipeline.end_to_end_total_ms", 0) / stage_sum_ms, 4) if stage_sum_ms else 0.0
+    )
+    snapshot["chat.scheduler.state"] = get_llm_scheduler().get_stats()
+    return snapshot
+
+def _observe_generation(start, first_token_at, final_chunk, token_count):
+    """Enregistre le TTFT et le débit (tokens/s) d'une génération en flux."""
+    ttft_ms = round((first_token_at - start) * 1000) if first_token_at else None
+    # Ollama renvoie eval_count / eval_duration (ns) dans le dernier fragment ;
+    # à défaut, on compte les fragments reçus depuis le premier token
+    eval_count = final_chunk.get("eval_count") or token_count
+    eval_duration_s = final_chunk.get("eval_duration", 0) / 1e9
+    if not eval_duration_s and first_token_at:
+        eval_duration_s = time.perf_counter() - first_token_at
+    tokens_per_s = eval_count / eval_duration_s if eval_duration_s else None
+
+    if ttft_ms is not None:
+        metrics.histogram("chat.stream.ttft_ms").observe(ttft_ms)
+    if tokens_per_s is not None:
+        metrics.histogram("chat.stream.tokens_per_s", TOKENS_PER_S_BUCKETS).observe(tokens_per_s)
+    metrics.histogram("chat.stream.total_ms").observe(elapsed_ms(start))
+    logger.info(
+        f"Génération Ollama terminée - TTFT: {ttft_ms} ms, tokens: {eval_count}, "
+        f"débit: {round(tokens_per_s, 1) if tokens_per_s else None} tokens/s, total: {elapsed_ms(start):.0f} ms"
+    )
+
+def stream_chat_message(user_id, message, conversation_id):
+    """
+    Variante en flux de process_chat_message (sans image) : génère des événements (type, données)
+    - ("token", {"content": ...}) pour chaque fragment de texte, dès qu'Ollama le produit ;
+    - ("done", {"response", "created_at", "conversation_id"}) une fois la réponse complète enregistrée ;
+    - ("error", {"message": ...}) si Ollama échoue en cours de route (la réponse d'erreur est enregistrée).
+    Si le client se déconnecte, la réponse partielle est enregistrée et la requête Ollama est fermée.
+    """
+    user_id = int(user_id)
+    user = User.query.get(user_id)
+    if not user:
+        logger.error(f"Utilisateur avec ID {user_id} non trouvé.")
+        raise ValueError("Utilisateur non trouvé.")
+
+    direct_answer = find_direct_answer(message)
+    if direct_answer:
+        source, static_response = direct_answer
+        record_answer_source(source)
+        final_response = "\n".join([RESPONSE_INTRO, f"\n### Réponse\n{static_response}"])
+        yield "token", {"content": final_response}
+        chat = save_chat_message(user_id, message, final_response, conversation_id)
+        schedule_summary_refresh(user_id, conversation_id)
+        yield "done", {"response": final_response, "created_at": chat.created_at.isoformat(), "conversation_id": conversation_id}
+        return
+
+    # Même mise en forme que process_chat_message : introduction, ligne vide, réponse d'Ollama
+    prefix = RESPONSE_INTRO + "\n\n"
+    yield "token", {"content": prefix}
+
+    llm_budget = answer_budget(get_display_limit("stream", user.role), len(prefix))
+    version = generation_version(llm_budget)
+    prompt = build_context_prompt(user_id, conversation_id, message)
+    route = get_model_router().route(message)
+    cached_answer = get_cached_answer(prompt, version, route.model)
+    vector = None
+    if cached_answer is None and prompt == message:  # Cache sémantique : message sans contexte ajouté
+        cached_answer, vector = get_semantic_answer(prompt, version, route.model)
+    if cached_answer is not None:
+        record_answer_source("llm")
+        cached_answer, truncated = trim_to_boundary(cached_answer, llm_budget)
+        if truncated:
+            cached_answer += TRUNCATION_SUFFIX
+        yield "token", {"content": cached_answer}
+        final_response = prefix + cached_answer
+        chat = save_chat_message(user_id, message, final_response, conversation_id)
+        schedule_summary_refresh(user_id, conversation_id)
+        yield "done", {"response": final_response, "created_at": chat.created_at.isoformat(), "conversation_id": conversation_id}
+        return
+
+    options = generation_options(llm_budget)
+    logger.debug(f"Envoi de la requête en flux à Ollama avec le message : {prompt}")
+    start = time.perf_counter()
+    first_token_at = None
+    token_count = 0
+    parts = []
+    final_chunk = {}
+    try:
+        with get_llm_scheduler().slot(user.id, prompt, user.role):
+            for attempt, model in enumerate(route.models):
+                try:
+                    # Ollama envoie un objet JSON par ligne ; le dernier porte "done": true et les statistiques
+                    for chunk in get_ollama_client().chat_stream(build_ollama_payload(prompt, stream=True, options=options, model=model)):
+                        content = chunk.get("message", {}).get("content", "")
+                        if content:
+                            if first_token_at is None:
+                                first_token_at = time.perf_counter()
+                                if not parts:
+                                    content = content.lstrip()
+                            token_count += 1
+                            parts.append(content)
+                            yield "token", {"content": content}
+                        if chunk.get("done"):
+                            final_chunk = chunk
+                            record_answer_source("llm")
+                            _observe_generation(start, first_token_at, chunk, token_count)
+                    break
+                except OllamaUnavailable:
+                    raise
+                except (requests.RequestException, ValueError) as e:
+                    # Modèle de secours seulement si rien n'a encore été envoyé au client
+                    if parts or attempt == len(route.models) - 1:
+                        raise
+                    logger.warning(f"Échec du modèle {model} en flux ({e.__class__.__name__}), essai du modèle {route.models[attempt + 1]}")
+    except LLMQueueFull as e:
+        logger.warning(f"Demande en flux refusée par l'ordonnanceur ({e.status}) : {e}")
+        yield "error", {"message": str(e), "status": e.status, "retry_after": e.retry_after_s}
+        return
+    except GeneratorExit:
+        # Client déconnecté en cours de génération : conserver ce qui a déjà été affiché
+        metrics.counter("chat.stream.cancelled").inc()
+        logger.info(f"Génération en flux interrompue par le client après {token_count} fragments.")
+        if parts:
+            save_chat_message(user_id, message, prefix + "".join(parts).strip() + "... (réponse interrompue)", conversation_id)
+        raise
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"Erreur lors de la génération en flux avec l'API Ollama : {e.__class__.__name__} - {str(e)}")
+        metrics.counter("chat.stream.errors").inc()
+        record_answer_source("error")
+        error_response = (
+            "### AgriBot\n"
+            "\n### Erreur\n"
+            f"- Une erreur s'est produite avec l'API Ollama : {e.__class__.__name__} - {str(e)}.\n"
+            "- Veuillez réessayer plus tard."
         )
-        db.session.add(chat)
-        db.session.commit()
-        return error_response
\ No newline at end of file
+        save_chat_message(user_id, message, error_response, conversation_id)
+        yield "error", {"message": error_response}
+        return
+
+    generated_answer = "".join(parts).strip()
+    generation_ms = elapsed_ms(start)
+    cache_answer(prompt, version, generated_answer, generation_ms, model)
+    semantic_cache_answer(vector, prompt, version, generated_answer, generation_ms, model)
+    record_route_result(route, model, generation_ms, final_chunk.get("eval_count"))
+    # La réponse enregistrée (et renvoyée dans "done") est coupée proprement à la limite d'affichage
+    answer, truncated = trim_to_boundary(generated_answer, llm_budget)
+    record_generation(len(generated_answer), len(answer), final_chunk.get("eval_count"))
+    if truncated:
+        answer += TRUNCATION_SUFFIX
+    final_response = prefix + answer
+    chat = save_chat_message(user_id, message, final_response, conversation_id)
+    logger.debug(f"Réponse en flux enregistrée pour l'utilisateur {user_id} ({len(final_response)} caractères).")
+    schedule_summary_refresh(user_id, conversation_id)
+    yield "done", {"response": final_response, "created_at": chat.created_at.isoformat(), "conversation_id": conversation_id}
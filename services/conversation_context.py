@@ -0,0 +1,207 @@
+import threading
+import time
+import logging
+from flask import current_app
+from config import Config
+from extensions import db
+from services.metrics import metrics, elapsed_ms
+from services.generation_budget import CHARS_PER_TOKEN
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Vous résumez une conversation entre un agriculteur et AgriBot, un assistant agricole. "
+    "Mettez à jour le résumé existant avec les nouveaux échanges : cultures, parcelles, problèmes, "
+    "conseils déjà donnés et questions en suspens. Répondez uniquement par le résumé, en quelques phrases."
+)
+
+# Seuils pour les tailles de prompt (tokens estimés)
+TOKEN_BUCKETS = [64, 128, 256, 512, 768, 1024, 1536, 2048, 4096]
+
+# Résumés en cours de mise à jour (une seule mise à jour à la fois par conversation)
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def _is_error_response(response):
+    return not response or "\n### Erreur\n" in response
+
+
+def _format_turn(chat):
+    """Un échange sous forme de texte, sans l'introduction standard d'AgriBot."""
+    from services.chat_service import RESPONSE_INTRO
+    response = chat.response.replace(RESPONSE_INTRO, "").strip()
+    return f"Utilisateur : {chat.message.strip()}\nAgriBot : {response}"
+
+
+def _unsummarized_messages(user_id, conversation_id, after_id, limit=None):
+    from models.chat_message import ChatMessage
+    query = ChatMessage.query.filter(
+        ChatMessage.user_id == user_id,
+        ChatMessage.conversation_id == conversation_id,
+        ChatMessage.id > after_id
+    ).order_by(ChatMessage.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return [m for m in query.all() if not _is_error_response(m.response)]
+
+
+def _overflow_messages(user_id, conversation_id, after_id, recent_turns, max_turns):
+    """
+    Échanges non résumés les plus anciens qui sortent de la fenêtre des `recent_turns` derniers, dans l'ordre
+    chronologique et au plus `max_turns` (une seule requête bornée, même sur une longue conversation).
+    Les réponses en erreur sont incluses : elles font avancer le résumé sans y figurer.
+    """
+    from models.chat_message import ChatMessage
+    rows = ChatMessage.query.filter(
+        ChatMessage.user_id == user_id,
+        ChatMessage.conversation_id == conversation_id,
+        ChatMessage.id > after_id
+    ).order_by(ChatMessage.id.asc()).limit(max_turns + recent_turns).all()
+    return rows[:max(0, min(max_turns, len(rows) - recent_turns))]
+
+
+def build_context_prompt(user_id, conversation_id, message, token_budget=None):
+    """
+    Assemble le prompt envoyé au LLM : résumé de la conversation + échanges non encore résumés (du plus récent
+    au plus ancien tant qu'ils tiennent dans le budget) + message actuel.
+    Sans historique, retourne le message tel quel.
+    """
+    from models.conversation_summary import ConversationSummary
+    if not Config.CONTEXT_ENABLED or not conversation_id:
+        return message
+    token_budget = token_budget or Config.CONTEXT_TOKEN_BUDGET
+
+    summary_row = db.session.get(ConversationSummary, conversation_id)
+    summary = summary_row.summary if summary_row and summary_row.user_id == int(user_id) else ""
+    after_id = summary_row.last_message_id if summary else 0
+    # Tous les échanges pas encore résumés, y compris ceux sortis de la fenêtre en attendant le prochain
+    # résumé (sinon ils ne figureraient ni dans le résumé ni dans le prompt) ; le budget fait le tri
+    limit = Config.CONTEXT_RECENT_TURNS + max(Config.CONTEXT_SUMMARY_MAX_TURNS, Config.CONTEXT_SUMMARY_EVERY_TURNS, 1)
+    recent = _unsummarized_messages(int(user_id), conversation_id, after_id, limit=limit)
+    if not summary and not recent:
+        metrics.histogram("chat.context.prompt_tokens", TOKEN_BUCKETS).observe(estimate_tokens(message))
+        return message
+
+    remaining = token_budget - estimate_tokens(message)
+    turns = []
+    for chat in recent:  # Du plus récent au plus ancien
+        turn = _format_turn(chat)
+        cost = estimate_tokens(turn)
+        if cost > remaining:
+            break
+        turns.insert(0, turn)
+        remaining -= cost
+    if summary and estimate_tokens(summary) > remaining:
+        summary = summary[:max(0, int(remaining * CHARS_PER_TOKEN))].rsplit(" ", 1)[0]
+
+    sections = []
+    if summary:
+        sections.append(f"Résumé de la conversation : {summary}")
+    if turns:
+        sections.append("Échanges récents :\n" + "\n\n".join(turns))
+    sections.append(f"Utilisateur : {message}")
+    prompt = "\n\n".join(sections)
+
+    prompt_tokens = estimate_tokens(prompt)
+    metrics.histogram("chat.context.prompt_tokens", TOKEN_BUCKETS).observe(prompt_tokens)
+    logger.debug(f"Contexte de la conversation {conversation_id} : résumé {'oui' if summary else 'non'}, "
+                 f"{len(turns)} échange(s), ~{prompt_tokens} tokens")
+    return prompt
+
+
+def refresh_summary(user_id, conversation_id):
+    """
+    Intègre au résumé les échanges qui sortent de la fenêtre des derniers échanges (appel LLM court).
+    Ne fait rien tant que moins de CONTEXT_SUMMARY_EVERY_TURNS échanges dépassent CONTEXT_RECENT_TURNS ;
+    un appel intègre au plus CONTEXT_SUMMARY_MAX_TURNS échanges (les suivants au prochain appel).
+    """
+    from models.conversation_summary import ConversationSummary
+    from services.chat_service import OLLAMA_MODEL
+    from services.ollama_client import get_ollama_client
+    from services.llm_scheduler import get_llm_scheduler
+
+    summary_row = db.session.get(ConversationSummary, conversation_id)
+    if summary_row is not None and summary_row.user_id != int(user_id):
+        # Même contrôle que build_context_prompt : ne jamais mettre à jour le résumé d'un autre utilisateur
+        logger.warning(f"Résumé de la conversation {conversation_id} non mis à jour : il appartient à un autre utilisateur")
+        return False
+    after_id = summary_row.last_message_id if summary_row else 0
+    max_turns = max(Config.CONTEXT_SUMMARY_MAX_TURNS, Config.CONTEXT_SUMMARY_EVERY_TURNS, 1)
+    overflow = _overflow_messages(user_id, conversation_id, after_id, Config.CONTEXT_RECENT_TURNS, max_turns)
+    if len(overflow) < max(Config.CONTEXT_SUMMARY_EVERY_TURNS, 1):
+        return False
+    last_message_id = overflow[-1].id
+    overflow = [chat for chat in overflow if not _is_error_response(chat.response)]
+    if summary_row is None:
+        summary_row = ConversationSummary(conversation_id=conversation_id, user_id=user_id, summary="")
+        db.session.add(summary_row)
+    if not overflow:
+        # Uniquement des réponses en erreur : avancer sans appel au LLM
+        summary_row.last_message_id = last_message_id
+        db.session.commit()
+        return False
+
+    previous = summary_row.summary
+    content = (
+        f"Résumé existant : {previous or '(aucun)'}\n\n"
+        "Nouveaux échanges :\n" + "\n\n".join(_format_turn(chat) for chat in overflow)
+    )
+    payload = {
+        "model": OLLAMA_MODEL,
+        "messages": [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": content}
+        ],
+        "stream": False,
+        "options": {"num_predict": Config.CONTEXT_SUMMARY_MAX_TOKENS}
+    }
+    start = time.perf_counter()
+    # Clé propre au résumé : ne consomme pas la limite par utilisateur des demandes de chat
+    with get_llm_scheduler().slot(f"summary:{conversation_id}", content):
+        response_data = get_ollama_client().chat(payload)
+    refresh_ms = elapsed_ms(start)
+
+    summary_row.summary = response_data["message"]["content"].strip()
+    summary_row.last_message_id = last_message_id
+    db.session.commit()
+
+    metrics.counter("chat.context.summary_refreshes").inc()
+    metrics.histogram("chat.context.summary_refresh_ms").observe(refresh_ms)
+    metrics.histogram("chat.context.summary_input_tokens", TOKEN_BUCKETS).observe(estimate_tokens(content))
+    if response_data.get("eval_count"):
+        metrics.counter("chat.context.summary_generated_tokens").inc(response_data["eval_count"])
+    logger.debug(f"Résumé de la conversation {conversation_id} mis à jour ({len(overflow)} échange(s), {refresh_ms:.0f} ms)")
+    return True
+
+
+def schedule_summary_refresh(user_id, conversation_id):
+    """Met à jour le résumé en arrière-plan après un échange (sans retarder la réponse)."""
+    if not Config.CONTEXT_ENABLED or not conversation_id:
+        return
+    with _refreshing_lock:
+        if conversation_id in _refreshing:
+            return
+        _refreshing.add(conversation_id)
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                refresh_summary(int(user_id), conversation_id)
+            except Exception as e:
+                db.session.rollback()
+                metrics.counter("chat.context.summary_errors").inc()
+                logger.warning(f"Mise à jour du résumé de la conversation {conversation_id} impossible : {e}")
+            finally:
+                db.session.remove()
+                with _refreshing_lock:
+                    _refreshing.discard(conversation_id)
+
+    threading.Thread(target=run, name=f"summary-{conversation_id[:8]}", daemon=True).start()
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+import logging
+from collections import OrderedDict
+from io import BytesIO
+from services.metrics import metrics
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def perceptual_hash(data, hash_size=8):
+    """
+    dHash 64 bits : compare la luminosité de pixels voisins sur une vignette 9x8 en niveaux de gris.
+    Deux photos quasi identiques (recompression, léger redimensionnement) ont des hashs proches.
+    """
+    from PIL import Image
+    img = Image.open(BytesIO(data))
+    img.draft("L", (hash_size * 8, hash_size * 8))
+    pixels = list(img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def model_fingerprint(model_path):
+    """Empreinte de l'artefact du modèle : toute modification invalide le cache."""
+    if model_path is None:
+        return "sans-artefact"
+    try:
+        stat = os.stat(model_path)
+        return f"{model_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    except OSError:
+        return f"{model_path}:absent"
+
+
+class DiagnosisCache:
+    """
+    Cache LRU borné des diagnostics, indexé par le hash SHA-256 des octets de l'image
+    (et optionnellement par un hash perceptuel pour les quasi-doublons).
+
+    Les entrées sont liées à l'empreinte du modèle : si l'artefact change, le cache est vidé.
+    """
+
+    def __init__(self, max_entries=1024, perceptual=False, max_distance=4):
+        self.max_entries = max(1, int(max_entries))
+        self.perceptual = perceptual
+        self.max_distance = max_distance
+        self._entries = OrderedDict()
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+        self._hits = metrics.counter("plant.cache.hits")
+        self._near_hits = metrics.counter("plant.cache.near_hits")
+        self._misses = metrics.counter("plant.cache.misses")
+        self._evictions = metrics.counter("plant.cache.evictions")
+        self._invalidations = metrics.counter("plant.cache.invalidations")
+        self._size = metrics.gauge("plant.cache.size")
+
+    def _check_fingerprint(self, fingerprint):
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                logger.info("Modèle ou pipeline de diagnostic modifié, cache des diagnostics invalidé")
+                self._invalidations.inc()
+            self._entries.clear()
+            self._size.set(0)
+            self._fingerprint = fingerprint
+
+    def get(self, data, fingerprint):
+        """
+        Retourne (clé, hash perceptuel, entrée) ; l'entrée vaut None en cas d'absence.
+        La clé et le hash sont à repasser à put() après l'inférence. Un quasi-doublon se reconnaît à
+        `entry["key"]`, différente de la clé retournée.
+        """
+        key = content_hash(data)
+        phash = None
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits.inc()
+                return key, None, entry
+
+        if self.perceptual:
+            try:
+                phash = perceptual_hash(data)
+            except Exception as e:
+                # Image illisible : pas de clé perceptuelle, le décodage pour l'inférence signalera l'erreur
+                logger.debug(f"Hash perceptuel impossible, recherche exacte uniquement : {e}")
+        if phash is not None:
+            with self._lock:
+                for other_key, other in reversed(self._entries.items()):
+                    if other.get("phash") is not None and bin(other["phash"] ^ phash).count("1") <= self.max_distance:
+                        self._entries.move_to_end(other_key)
+                        self._near_hits.inc()
+                        return key, phash, other
+
+        self._misses.inc()
+        return key, phash, None
+
+    def put(self, key, entry, phash=None):
+        entry = dict(entry, key=key, phash=phash)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions.inc()
+            self._size.set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size.set(0)
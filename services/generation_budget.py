@@ -0,0 +1,109 @@
+import math
+import re
+import logging
+from config import Config
+from services.metrics import metrics
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Caractères moyens par token de gemma pour du français (estimation prudente : mieux vaut quelques tokens de trop)
+CHARS_PER_TOKEN = 3.5
+# Marge de tokens au-delà de la limite d'affichage, pour pouvoir couper sur une fin de phrase
+TOKEN_MARGIN = 1.15
+MIN_ANSWER_CHARS = 100
+
+# Séquences qui terminent la génération (le modèle enchaîne sinon sur un faux tour de parole)
+STOP_SEQUENCES = ["\nUtilisateur :", "\nUtilisateur:", "\n\n\n"]
+
+TRUNCATION_SUFFIX = "... (réponse tronquée)"
+
+# Frontières de coupe, de la plus nette à la plus faible
+_LIST_ITEM_RE = re.compile(r"\n(?=\s*(?:[-*•]|\d+\.)\s)")
+_SENTENCE_END_RE = re.compile(r"[.!?…](?=\s)")
+
+
+def parse_limits(spec):
+    """
+    "send:*=500,stream:*=1500,*:expert=2000" -> {("send", "*"): 500, ("stream", "*"): 1500, ("*", "expert"): 2000}
+    Clé = "endpoint:rôle" (l'un ou l'autre peut valoir "*") ; une limite de 0 signifie "pas de plafond".
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, value = item.partition("=")
+        endpoint, _, role = key.partition(":")
+        limits[(endpoint.strip() or "*", role.strip() or "*")] = int(value)
+    return limits
+
+
+_limits = None
+
+def get_display_limit(endpoint, role=None):
+    """
+    Nombre maximal de caractères affichés : endpoint+rôle, puis rôle, puis endpoint, puis CHAT_MAX_RESPONSE_CHARS.
+    None si la limite retenue vaut 0 (pas de plafond).
+    """
+    global _limits
+    if _limits is None:
+        _limits = parse_limits(Config.CHAT_RESPONSE_LIMITS)
+    for key in ((endpoint, role), ("*", role), (endpoint, "*")):
+        if key in _limits:
+            return _limits[key] or None
+    return Config.CHAT_MAX_RESPONSE_CHARS or None
+
+
+def answer_budget(display_limit, used_chars):
+    """Caractères laissés à la réponse du LLM une fois `used_chars` affichés (None : pas de plafond)."""
+    if display_limit is None:
+        return None
+    return max(MIN_ANSWER_CHARS, display_limit - used_chars)
+
+
+def num_predict_for(max_chars):
+    """Plafond de tokens générés (option Ollama num_predict) pour `max_chars` caractères affichés (None : aucun)."""
+    if max_chars is None:
+        return None
+    return max(16, math.ceil(max(max_chars, MIN_ANSWER_CHARS) / CHARS_PER_TOKEN * TOKEN_MARGIN))
+
+
+def generation_options(max_chars):
+    if max_chars is None:
+        return {"stop": STOP_SEQUENCES}
+    return {"num_predict": num_predict_for(max_chars), "stop": STOP_SEQUENCES}
+
+
+def trim_to_boundary(text, max_chars):
+    """
+    Coupe `text` à au plus `max_chars` caractères, sur la dernière fin d'élément de liste ou de phrase
+    (ou à défaut le dernier espace). Retourne (texte, tronqué). Sans limite (None), le texte est rendu tel quel.
+    """
+    if max_chars is None or len(text) <= max_chars:
+        return text, False
+    head = text[:max_chars]
+    cut = 0
+    for pattern in (_LIST_ITEM_RE, _SENTENCE_END_RE):
+        ends = [m.end() for m in pattern.finditer(head)]
+        if ends and ends[-1] >= max_chars // 2:  # Ne pas sacrifier plus de la moitié du texte
+            cut = ends[-1]
+            break
+    if not cut:
+        cut = head.rfind(" ")
+        if cut < max_chars // 2:
+            cut = max_chars
+    return head[:cut].rstrip(), True
+
+
+def record_generation(generated_chars, displayed_chars, generated_tokens):
+    """
+    Compte les tokens générés et affichés (estimés au prorata des caractères) pour mesurer le calcul gaspillé.
+    `generated_tokens` vaut None si la réponse vient du cache ou d'une génération partagée (aucun calcul).
+    """
+    if not generated_tokens or not generated_chars:
+        return
+    displayed_tokens = round(generated_tokens * min(1.0, displayed_chars / generated_chars))
+    metrics.counter("chat.budget.generated_tokens").inc(generated_tokens)
+    metrics.counter("chat.budget.displayed_tokens").inc(displayed_tokens)
+    if displayed_tokens < generated_tokens:
+        metrics.counter("chat.budget.truncated").inc()
+        logger.debug(f"Génération tronquée à l'affichage : {displayed_tokens}/{generated_tokens} tokens affichés")
@@ -0,0 +1,152 @@
+import threading
+import time
+import logging
+import numpy as np
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def os_lock():
+    """
+    Verrou système, même après eventlet.monkey_patch().
+
+    Les backends s'exécutent sur de vrais threads (eventlet.tpool en mode "thread") : un verrou
+    vert créé après le monkey-patch n'y est pas fiable. Les greenlets ne doivent prendre ces
+    verrous qu'à travers le pool d'inférence.
+    """
+    try:
+        from eventlet.patcher import original
+    except ImportError:
+        return threading.Lock()
+    return original("threading").Lock()
+
+
+class KerasBackend:
+    """Modèle Keras complet (.h5), chargé avec tf.keras (chargement protégé par un verrou système)."""
+    name = "keras"
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self._model = None
+        self._lock = os_lock()
+
+    def load(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    import tensorflow as tf
+                    self._model = tf.keras.models.load_model(self.model_path)
+                    logger.debug(f"Modèle Keras chargé depuis {self.model_path}")
+        return self
+
+    def predict(self, img_batch):
+        """Retourne les probabilités (N, nb_classes) pour un lot prétraité (N, H, W, 3)."""
+        self.load()
+        return self._model.predict(img_batch, verbose=0)
+
+
+class TFLiteBackend:
+    """
+    Modèle TFLite (float16 ou int8 post-training), exécuté avec tf.lite.Interpreter
+    (ou tflite_runtime s'il est installé, beaucoup plus léger que TensorFlow).
+
+    L'interpréteur n'est pas thread-safe : les appels à predict, qui arrivent sur plusieurs threads
+    système (INFERENCE_WORKERS > 1), sont sérialisés par un verrou système (voir os_lock).
+    """
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._interpreter = None
+        self._input = None
+        self._output = None
+        self._batch_shape = None
+        self._lock = os_lock()
+
+    def load(self):
+        if self._interpreter is None:
+            with self._lock:
+                if self._interpreter is None:
+                    try:
+                        from tflite_runtime.interpreter import Interpreter
+                    except ImportError:
+                        import tensorflow as tf
+                        Interpreter = tf.lite.Interpreter
+                    interpreter = Interpreter(model_path=self.model_path, num_threads=self.num_threads)
+                    interpreter.allocate_tensors()
+                    self._input = interpreter.get_input_details()[0]
+                    self._output = interpreter.get_output_details()[0]
+                    self._batch_shape = tuple(self._input["shape"])
+                    self._interpreter = interpreter
+                    logger.debug(f"Modèle TFLite chargé depuis {self.model_path} (entrée: {self._input['dtype'].__name__})")
+        return self
+
+    def _quantize(self, img_batch):
+        dtype = self._input["dtype"]
+        if dtype == np.float32:
+            return img_batch.astype(np.float32)
+        scale, zero_point = self._input["quantization"]
+        info = np.iinfo(dtype)
+        return np.clip(np.round(img_batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+    def _dequantize(self, output):
+        if self._output["dtype"] == np.float32:
+            return output
+        scale, zero_point = self._output["quantization"]
+        return (output.astype(np.float32) - zero_point) * scale
+
+    def predict(self, img_batch):
+        """Retourne les probabilités (N, nb_classes) pour un lot prétraité (N, H, W, 3)."""
+        self.load()
+        with self._lock:
+            if tuple(img_batch.shape) != self._batch_shape:
+                self._interpreter.resize_tensor_input(self._input["index"], img_batch.shape)
+                self._interpreter.allocate_tensors()
+                self._input = self._interpreter.get_input_details()[0]
+                self._output = self._interpreter.get_output_details()[0]
+                self._batch_shape = tuple(img_batch.shape)
+            self._interpreter.set_tensor(self._input["index"], self._quantize(img_batch))
+            self._interpreter.invoke()
+            return self._dequantize(self._interpreter.get_tensor(self._output["index"]).copy())
+
+
+class StubBackend:
+    """
+    Modèle factice pour les benchmarks et les tests de charge : probabilités déterministes
+    dérivées de la couleur moyenne de l'image et latence simulée (fixe par lot + par image).
+    """
+    name = "stub"
+
+    def __init__(self, model_path=None, num_classes=38, batch_latency_ms=20, image_latency_ms=5):
+        self.model_path = model_path
+        self.batch_latency_ms = batch_latency_ms
+        self.image_latency_ms = image_latency_ms
+        self._projection = np.random.default_rng(0).normal(size=(3, num_classes)).astype(np.float32)
+
+    def load(self):
+        return self
+
+    def predict(self, img_batch):
+        time.sleep((self.batch_latency_ms + self.image_latency_ms * len(img_batch)) / 1000)
+        logits = img_batch.mean(axis=(1, 2)) @ self._projection * 10
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    TFLiteBackend.name: TFLiteBackend,
+    StubBackend.name: StubBackend,
+}
+
+
+def create_backend(name, model_path, **kwargs):
+    """Instancie le backend `name` ("keras", "tflite" ou "stub") sur l'artefact `model_path`."""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend d'inférence inconnu : {name} (attendu : {', '.join(BACKENDS)})")
+    return backend_cls(model_path, **kwargs)
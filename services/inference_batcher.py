@@ -0,0 +1,116 @@
+import threading
+import queue
+import time
+import logging
+import numpy as np
+from services.metrics import metrics, elapsed_ms
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    __slots__ = ("inputs", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class InferenceBatcher:
+    """
+    Regroupe les requêtes d'inférence concurrentes en micro-lots.
+
+    Chaque appel à `submit` dépose un tenseur (1, H, W, C) dans une file ; un thread collecteur
+    attend au plus `max_wait_ms` après la première requête (ou jusqu'à `max_batch_size`
+    requêtes), exécute une seule prédiction sur le lot, puis renvoie à chaque appelant
+    la ligne de résultat qui lui correspond.
+
+    Avec `workers` > 1, plusieurs threads collectent et exécutent des lots en parallèle
+    (utile lorsque `predict_fn` libère le hub, cf. InferencePool).
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, workers=1, name="plant.batcher"):
+        self.predict_fn = predict_fn
+        self.workers = max(1, int(workers))
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self._queue_depth = metrics.gauge(f"{name}.queue_depth")
+        self._batch_sizes = metrics.histogram(f"{name}.batch_size", buckets=list(range(1, self.max_batch_size + 1)))
+        self._wait_ms = metrics.histogram(f"{name}.wait_ms")
+        self._predict_ms = metrics.histogram(f"{name}.predict_ms")
+        self._errors = metrics.counter(f"{name}.errors")
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.debug(f"Batcher d'inférence démarré (lot max: {self.max_batch_size}, attente max: {self.max_wait * 1000:.1f} ms, workers: {self.workers})")
+
+    def submit(self, inputs):
+        """Soumet un tenseur (1, H, W, C) et bloque jusqu'à obtenir sa ligne de prédiction."""
+        self.start()
+        request = _PendingRequest(inputs)
+        self._queue.put(request)
+        self._queue_depth.set(self._queue.qsize())
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        self._queue_depth.set(self._queue.qsize())
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            self._execute(batch)
+
+    def _execute(self, batch):
+        for request in batch:
+            self._wait_ms.observe(elapsed_ms(request.enqueued_at))
+        self._batch_sizes.observe(len(batch))
+
+        start = time.perf_counter()
+        try:
+            outputs = self.predict_fn(np.concatenate([r.inputs for r in batch], axis=0))
+        except Exception as e:
+            self._errors.inc()
+            logger.error(f"Erreur lors de la prédiction d'un lot de {len(batch)} images : {e}")
+            for request in batch:
+                request.error = e
+                request.done.set()
+            return
+        self._predict_ms.observe(elapsed_ms(start))
+
+        for i, request in enumerate(batch):
+            request.result = outputs[i]
+            request.done.set()
+
+    def get_stats(self):
+        return metrics.snapshot(prefix=f"{self.name}.")
@@ -0,0 +1,120 @@
+import threading
+import logging
+from contextlib import contextmanager
+from services.metrics import metrics
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ("inline", "thread", "process")
+
+
+class InferenceQueueFull(Exception):
+    """Levée lorsque la file d'inférence est pleine (le client doit réessayer plus tard)."""
+    pass
+
+
+# --- Fonctions exécutées dans les processus de travail (mode "process") ---
+_worker_backend = None
+
+def _process_worker_init(backend_name, model_path, backend_options):
+    global _worker_backend
+    from services.inference_backends import create_backend
+    _worker_backend = create_backend(backend_name, model_path, **backend_options).load()
+
+def _process_predict(img_batch):
+    return _worker_backend.predict(img_batch)
+
+
+class InferencePool:
+    """
+    Exécute les prédictions hors du hub eventlet pour que les connexions Socket.IO
+    (heartbeats, messages) continuent d'être servies pendant l'inférence.
+
+    Modes :
+    - "inline"  : appel direct dans le greenlet courant (comportement historique, bloque le hub) ;
+    - "thread"  : vrais threads système via eventlet.tpool (le modèle reste dans ce processus) ;
+    - "process" : pool de processus, chacun chargeant sa propre copie du modèle.
+
+    `admission()` borne le nombre de requêtes en cours ou en attente ; au-delà de
+    `queue_size`, InferenceQueueFull est levée immédiatement.
+    """
+
+    def __init__(self, predict_fn, mode="thread", workers=1, queue_size=32, backend_spec=None):
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Mode d'inférence inconnu : {mode} (attendu : {', '.join(INFERENCE_MODES)})")
+        self.predict_fn = predict_fn
+        self.mode = mode
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        # (nom du backend, chemin de l'artefact, options) chargé par chaque processus en mode "process"
+        self.backend_spec = backend_spec
+        self._outstanding = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+        self._outstanding_gauge = metrics.gauge("plant.pool.outstanding")
+        self._rejected = metrics.counter("plant.pool.rejected")
+
+        if mode == "thread":
+            from eventlet import tpool
+            tpool.set_num_threads(self.workers)
+        elif mode == "process":
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            # "spawn" : les processus enfants ne doivent pas hériter de l'état monkey-patché d'eventlet
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_process_worker_init,
+                initargs=backend_spec
+            )
+        logger.debug(f"Pool d'inférence initialisé (mode: {mode}, workers: {self.workers}, file max: {self.queue_size})")
+
+    @contextmanager
+    def admission(self):
+        with self._lock:
+            if self._outstanding >= self.queue_size:
+                self._rejected.inc()
+                raise InferenceQueueFull("File d'inférence pleine, veuillez réessayer dans quelques instants.")
+            self._outstanding += 1
+            self._outstanding_gauge.set(self._outstanding)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                self._outstanding_gauge.set(self._outstanding)
+
+    def run(self, img_batch):
+        """Exécute une prédiction sur un lot selon le mode configuré."""
+        if self.mode == "thread":
+            from eventlet import tpool
+            return tpool.execute(self.predict_fn, img_batch)
+        if self.mode == "process":
+            return self._executor.submit(_process_predict, img_batch).result()
+        return self.predict_fn(img_batch)
+
+    def execute(self, fn, img_batch):
+        """
+        Exécute un autre modèle (ex. premier étage de la cascade) dans ce processus : via eventlet.tpool
+        en mode "thread", directement sinon.
+        """
+        if self.mode == "thread":
+            from eventlet import tpool
+            return tpool.execute(fn, img_batch)
+        return fn(img_batch)
+
+    def warm_up(self, img_batch):
+        """Exécute une prédiction factice sur chaque worker pour charger et préchauffer le modèle."""
+        if self.mode == "process":
+            futures = [self._executor.submit(_process_predict, img_batch) for _ in range(self.workers)]
+            for future in futures:
+                future.result()
+        else:
+            self.run(img_batch)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
@@ -1,3 +1,10 @@
+import re
+import unicodedata
+from services.aho_corasick import AhoCorasick
+
+_WORD_RE = re.compile(r"\w+")
+_COMBINING_RE = re.compile("[\u0300-\u036f]")  # Diacritiques séparés par la décomposition NFKD
+
 KNOWLEDGE_BASE = {
     "qu'est-ce que tu peux faire comme tâche": "Je suis AgriBot, un assistant agricole expert. Je peux vous aider avec des tâches comme : répondre à des questions sur la plantation, l'entretien et la récolte des cultures, fournir des conseils sur les engrais et la gestion des sols, diagnostiquer des maladies des plantes, donner des informations météorologiques et leur impact sur l'agriculture, et aider à planifier vos activités agricoles. Comment puis-je vous aider aujourd'hui ?",
     "comment planter des tomates": "Pour planter des tomates, choisissez un endroit ensoleillé avec un sol bien drainé. Plantez les graines à 1 cm de profondeur, espacées de 50 cm, après le dernier gel. Arrosez régulièrement et ajoutez un tuteur pour soutenir les plants.",
@@ -61,9 +68,55 @@ KNOWLEDGE_BASE = {
     "pourquoi mes melons ne sont-ils pas sucrés": "Les melons manquent de sucre s'ils n'ont pas assez de soleil ou si le sol est pauvre en potassium. Assurez-vous qu'ils reçoivent 8 heures de soleil par jour et ajoutez un engrais riche en potassium."
 }
 
+def normalize_words(text):
+    """Minuscules, accents retirés, ponctuation (apostrophes, tirets, ?) remplacée par des espaces ; retourne les mots."""
+    text = _COMBINING_RE.sub("", unicodedata.normalize("NFKD", text.lower()))
+    return _WORD_RE.findall(text)
+
+class KnowledgeBaseMatcher:
+    """
+    Base de connaissances compilée en automate d'Aho–Corasick sur les mots normalisés des clés :
+    un seul passage sur le message trouve toutes les clés présentes (mots entiers), et la plus
+    spécifique l'emporte (plus de mots, puis plus de caractères, puis ordre de la base).
+    """
+
+    def __init__(self, entries):
+        self._automaton = AhoCorasick()
+        self._entries = []
+        seen = set()
+        for key, answer in entries.items():
+            words = tuple(normalize_words(key))
+            if not words or words in seen:  # Clé vide ou doublon après normalisation : la première l'emporte
+                continue
+            seen.add(words)
+            rank = (len(words), sum(len(w) for w in words), -len(self._entries))
+            self._automaton.add(words, len(self._entries))
+            self._entries.append((rank, key, answer))
+        self._automaton.build()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def match(self, message):
+        """Retourne (clé, réponse) de la meilleure clé présente dans le message, ou None."""
+        best = None
+        for _, index in self._automaton.iter_matches(normalize_words(message)):
+            if best is None or self._entries[index][0] > self._entries[best][0]:
+                best = index
+        if best is None:
+            return None
+        _, key, answer = self._entries[best]
+        return key, answer
+
+_matcher = None
+
+def get_matcher():
+    """Automate de KNOWLEDGE_BASE (compilé à la première utilisation)."""
+    global _matcher
+    if _matcher is None:
+        _matcher = KnowledgeBaseMatcher(KNOWLEDGE_BASE)
+    return _matcher
+
 def get_static_response(message):
-    message = message.lower().strip()
-    for key in KNOWLEDGE_BASE:
-        if key in message:
-            return KNOWLEDGE_BASE[key]
-    return None
\ No newline at end of file
+    match = get_matcher().match(message)
+    return match[1] if match else None
\ No newline at end of file
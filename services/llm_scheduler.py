@@ -0,0 +1,198 @@
+import itertools
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from config import Config
+from services.metrics import metrics, elapsed_ms
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Priorités (la plus petite passe en premier)
+PRIORITY_PREMIUM = 0
+PRIORITY_SHORT = 1
+PRIORITY_NORMAL = 2
+
+
+class LLMQueueFull(Exception):
+    """
+    Demande refusée immédiatement : file pleine (503) ou trop de demandes du même utilisateur (429).
+    `retry_after_s` estime l'attente avant qu'une place se libère.
+    """
+
+    def __init__(self, message, status, retry_after_s):
+        super().__init__(message)
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+
+class _Waiter:
+    def __init__(self, user_id, priority, seq):
+        self.user_id = user_id
+        self.priority = priority
+        self.seq = seq
+        self.granted = threading.Event()
+
+
+class LLMScheduler:
+    """
+    Ordonnanceur placé devant Ollama :
+    - au plus `max_concurrency` générations simultanées ;
+    - au plus `max_queue` demandes en attente (au-delà : LLMQueueFull, 503) ;
+    - au plus `max_per_user` demandes (en cours + en attente) par utilisateur (au-delà : 429) ;
+    - quand une place se libère : priorité la plus haute d'abord (rôles premium, puis messages courts),
+      puis l'utilisateur qui a le moins de générations en cours, puis l'ordre d'arrivée.
+    L'attente estimée repose sur la durée moyenne (glissante) des dernières générations.
+    """
+
+    def __init__(self, max_concurrency, max_queue, max_per_user, wait_timeout_s,
+                 short_prompt_chars, premium_roles, initial_service_s=10.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.wait_timeout_s = wait_timeout_s
+        self.short_prompt_chars = short_prompt_chars
+        self.premium_roles = set(premium_roles)
+        self._avg_service_s = initial_service_s
+        self._running = 0
+        self._running_by_user = {}
+        self._pending_by_user = {}
+        self._waiters = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def priority_for(self, prompt, role=None):
+        if role in self.premium_roles:
+            return PRIORITY_PREMIUM
+        if len(prompt) <= self.short_prompt_chars:
+            return PRIORITY_SHORT
+        return PRIORITY_NORMAL
+
+    def estimated_wait_s(self, position=None):
+        """Attente estimée pour la `position`-ième demande en file (par défaut : une nouvelle demande)."""
+        if position is None:
+            position = len(self._waiters) + 1
+        return round(self._avg_service_s * position / self.max_concurrency, 1)
+
+    def _update_gauges(self):
+        metrics.gauge("chat.scheduler.queue_depth").set(len(self._waiters))
+        metrics.gauge("chat.scheduler.running").set(self._running)
+
+    def _acquire(self, user_id, priority):
+        with self._lock:
+            if self._pending_by_user.get(user_id, 0) >= self.max_per_user:
+                metrics.counter("chat.scheduler.rejected.user_limit").inc()
+                raise LLMQueueFull(
+                    "Vous avez déjà des demandes en cours, veuillez patienter.", 429, self.estimated_wait_s()
+                )
+            if self._running < self.max_concurrency and not self._waiters:
+                self._grant(user_id)
+                return None
+            if len(self._waiters) >= self.max_queue:
+                metrics.counter("chat.scheduler.rejected.queue_full").inc()
+                raise LLMQueueFull(
+                    "Le service est très sollicité, veuillez réessayer dans quelques instants.", 503, self.estimated_wait_s()
+                )
+            waiter = _Waiter(user_id, priority, next(self._seq))
+            self._waiters.append(waiter)
+            self._pending_by_user[user_id] = self._pending_by_user.get(user_id, 0) + 1
+            self._update_gauges()
+            return waiter
+
+    def _grant(self, user_id):
+        """Réserve une place de génération (verrou détenu)."""
+        self._running += 1
+        self._running_by_user[user_id] = self._running_by_user.get(user_id, 0) + 1
+        self._pending_by_user[user_id] = self._pending_by_user.get(user_id, 0) + 1
+        self._update_gauges()
+
+    def _decrement(self, counts, user_id):
+        counts[user_id] -= 1
+        if not counts[user_id]:
+            del counts[user_id]
+
+    def _release(self, user_id, service_s):
+        with self._lock:
+            self._running -= 1
+            self._decrement(self._running_by_user, user_id)
+            self._decrement(self._pending_by_user, user_id)
+            if service_s is not None:
+                self._avg_service_s = 0.8 * self._avg_service_s + 0.2 * service_s
+            self._dispatch()
+
+    def _dispatch(self):
+        """Attribue les places libres aux demandes en attente (verrou détenu)."""
+        while self._waiters and self._running < self.max_concurrency:
+            waiter = min(
+                self._waiters,
+                key=lambda w: (w.priority, self._running_by_user.get(w.user_id, 0), w.seq)
+            )
+            self._waiters.remove(waiter)
+            self._running += 1
+            self._running_by_user[waiter.user_id] = self._running_by_user.get(waiter.user_id, 0) + 1
+            waiter.granted.set()
+        self._update_gauges()
+
+    def _abandon(self, waiter):
+        """Retire une demande dont l'attente a expiré ; False si une place lui a été attribuée entre-temps."""
+        with self._lock:
+            if waiter.granted.is_set():
+                return False
+            self._waiters.remove(waiter)
+            self._decrement(self._pending_by_user, waiter.user_id)
+            self._update_gauges()
+            return True
+
+    @contextmanager
+    def slot(self, user_id, prompt, role=None):
+        """Réserve une place de génération pour la durée du bloc (attente éventuelle en file)."""
+        start = time.perf_counter()
+        waiter = self._acquire(user_id, self.priority_for(prompt, role))
+        if waiter is not None:
+            if not waiter.granted.wait(self.wait_timeout_s) and self._abandon(waiter):
+                metrics.counter("chat.scheduler.timeouts").inc()
+                raise LLMQueueFull(
+                    "Le service est très sollicité, veuillez réessayer dans quelques instants.", 503, self.estimated_wait_s()
+                )
+        wait_ms = elapsed_ms(start)
+        metrics.histogram("chat.scheduler.wait_ms").observe(wait_ms)
+        service_start = time.perf_counter()
+        service_s = None
+        try:
+            yield wait_ms
+            service_s = time.perf_counter() - service_start
+        finally:
+            self._release(user_id, service_s)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "running": self._running,
+                "queued": len(self._waiters),
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "avg_service_s": round(self._avg_service_s, 2),
+                "estimated_wait_s": self.estimated_wait_s()
+            }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_llm_scheduler():
+    """Ordonnanceur partagé des générations Ollama (créé à la première utilisation)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    max_concurrency=Config.LLM_MAX_CONCURRENCY,
+                    max_queue=Config.LLM_MAX_QUEUE,
+                    max_per_user=Config.LLM_MAX_PER_USER,
+                    wait_timeout_s=Config.LLM_QUEUE_TIMEOUT,
+                    short_prompt_chars=Config.LLM_SHORT_PROMPT_CHARS,
+                    premium_roles=[r for r in Config.LLM_PRIORITY_ROLES.split(",") if r]
+                )
+    return _scheduler
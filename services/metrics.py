@@ -0,0 +1,105 @@
+import threading
+import time
+import bisect
+
+# Registre de métriques en mémoire (par processus), exposé par les endpoints /metrics des namespaces
+
+class Counter:
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge:
+    def __init__(self):
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """
+    Histogramme à seuils fixes : chaque observation est comptée dans le premier seuil >= valeur
+    (le dernier compartiment "+Inf" reçoit le reste).
+    """
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._count += 1
+            self._sum += value
+            self._max = max(self._max, value)
+
+    def snapshot(self):
+        with self._lock:
+            labels = [str(b) for b in self.buckets] + ["+Inf"]
+            return {
+                "count": self._count,
+                "sum": round(self._sum, 6),
+                "mean": round(self._sum / self._count, 6) if self._count else 0.0,
+                "max": round(self._max, 6),
+                "buckets": dict(zip(labels, self._counts))
+            }
+
+
+# Seuils par défaut pour les durées exprimées en millisecondes
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name, factory):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = factory()
+                    self._metrics[name] = metric
+        return metric
+
+    def counter(self, name):
+        return self._get_or_create(name, Counter)
+
+    def gauge(self, name):
+        return self._get_or_create(name, Gauge)
+
+    def histogram(self, name, buckets=None):
+        return self._get_or_create(name, lambda: Histogram(buckets or LATENCY_BUCKETS_MS))
+
+    def snapshot(self, prefix=""):
+        """Retourne toutes les métriques dont le nom commence par `prefix`."""
+        return {
+            name: metric.snapshot()
+            for name, metric in sorted(self._metrics.items())
+            if name.startswith(prefix)
+        }
+
+
+metrics = MetricsRegistry()
+
+
+def elapsed_ms(start):
+    """Durée écoulée depuis `start` (time.perf_counter()) en millisecondes."""
+    return (time.perf_counter() - start) * 1000
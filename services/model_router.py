@@ -0,0 +1,141 @@
+import re
+import threading
+import logging
+from config import Config
+from services.knowledge_base import KNOWLEDGE_BASE, normalize_words
+from services.retrieval import STOPWORDS
+from services.metrics import metrics
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+ROUTE_SMALL = "small"
+ROUTE_LARGE = "large"
+ROUTE_DEFAULT = "default"  # Routage désactivé
+
+# Mots interrogatifs des clés de la base : fréquents, ils ne signalent pas une question technique
+QUESTION_WORDS = {"comment", "pourquoi", "quand", "quel", "quelle", "quels", "quelles", "combien", "faire", "meilleur"}
+
+# Éléments d'une question en plusieurs parties : "?" ou début de ligne numérotée / à puce
+_QUESTION_MARK_RE = re.compile(r"\?")
+_LIST_ITEM_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s", re.MULTILINE)
+
+
+def parse_fallbacks(spec):
+    """"gemma:7b=gemma:2b|tinyllama,phi3=gemma:2b" -> {"gemma:7b": ["gemma:2b", "tinyllama"], "phi3": ["gemma:2b"]}"""
+    fallbacks = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, chain = item.partition("=")
+        fallbacks[model.strip()] = [m.strip() for m in chain.split("|") if m.strip()]
+    return fallbacks
+
+
+class Route:
+    """Décision du routeur : nom de la route, modèles à essayer dans l'ordre, raison et caractéristiques mesurées."""
+
+    def __init__(self, name, models, reason, features):
+        self.name = name
+        self.models = models
+        self.reason = reason
+        self.features = features
+
+    @property
+    def model(self):
+        return self.models[0]
+
+    def __repr__(self):
+        return f"Route({self.name}, {self.models}, {self.reason})"
+
+
+class ModelRouter:
+    """
+    Choisit le modèle Ollama d'après des caractéristiques peu coûteuses du message :
+    longueur, nombre de questions, termes agricoles présents dans les clés de la base de connaissances
+    et présence d'une analyse d'image. Les messages simples vont au petit modèle rapide, les autres au grand.
+    Chaque route se termine par ses modèles de secours (LLM_MODEL_FALLBACKS), essayés si le modèle échoue.
+    """
+
+    def __init__(self, enabled, small_model, large_model, default_model, long_chars,
+                 multi_questions, domain_terms, image_to_large, fallbacks):
+        self.enabled = enabled
+        self.small_model = small_model
+        self.large_model = large_model
+        self.default_model = default_model
+        self.long_chars = long_chars
+        self.multi_questions = multi_questions
+        self.domain_terms = domain_terms
+        self.image_to_large = image_to_large
+        self.fallbacks = fallbacks
+        self.vocabulary = {
+            word for key in KNOWLEDGE_BASE for word in normalize_words(key)
+            if len(word) >= 4 and word not in STOPWORDS and word not in QUESTION_WORDS
+        }
+
+    def features(self, message, has_image=False):
+        words = set(normalize_words(message))
+        return {
+            "chars": len(message),
+            "questions": max(1, len(_QUESTION_MARK_RE.findall(message)), len(_LIST_ITEM_RE.findall(message))),
+            "domain_terms": len(words & self.vocabulary),
+            "image": has_image
+        }
+
+    def _chain(self, model):
+        models = [model]
+        for fallback in self.fallbacks.get(model, []):
+            if fallback not in models:
+                models.append(fallback)
+        return models
+
+    def route(self, message, has_image=False):
+        features = self.features(message, has_image)
+        if not self.enabled:
+            name, reason = ROUTE_DEFAULT, "routage désactivé"
+        elif has_image and self.image_to_large:
+            name, reason = ROUTE_LARGE, "analyse d'image"
+        elif features["chars"] >= self.long_chars:
+            name, reason = ROUTE_LARGE, "message long"
+        elif features["questions"] >= self.multi_questions:
+            name, reason = ROUTE_LARGE, "plusieurs questions"
+        elif features["domain_terms"] >= self.domain_terms:
+            name, reason = ROUTE_LARGE, "termes techniques"
+        else:
+            name, reason = ROUTE_SMALL, "message simple"
+        model = {ROUTE_SMALL: self.small_model, ROUTE_LARGE: self.large_model}.get(name, self.default_model)
+        metrics.counter(f"chat.router.{name}.requests").inc()
+        logger.debug(f"Routage vers {model} ({name} : {reason}) ; caractéristiques : {features}")
+        return Route(name, self._chain(model), reason, features)
+
+
+def record_route_result(route, model, latency_ms, generated_tokens=None):
+    """Latence et volume par route (et par modèle effectivement utilisé, secours compris)."""
+    metrics.histogram(f"chat.router.{route.name}.latency_ms").observe(latency_ms)
+    metrics.counter(f"chat.router.model.{model}.requests").inc()
+    if generated_tokens:
+        metrics.counter(f"chat.router.{route.name}.generated_tokens").inc(generated_tokens)
+    if model != route.model:
+        metrics.counter(f"chat.router.{route.name}.fallbacks").inc()
+
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_model_router():
+    """Routeur partagé (créé à la première utilisation)."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(
+                    enabled=Config.LLM_ROUTING_ENABLED,
+                    small_model=Config.LLM_SMALL_MODEL,
+                    large_model=Config.LLM_LARGE_MODEL,
+                    default_model=Config.OLLAMA_MODEL,
+                    long_chars=Config.LLM_ROUTE_LONG_CHARS,
+                    multi_questions=Config.LLM_ROUTE_MULTI_QUESTIONS,
+                    domain_terms=Config.LLM_ROUTE_DOMAIN_TERMS,
+                    image_to_large=Config.LLM_ROUTE_IMAGE_TO_LARGE,
+                    fallbacks=parse_fallbacks(Config.LLM_MODEL_FALLBACKS)
+                )
+    return _router
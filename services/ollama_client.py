@@ -0,0 +1,276 @@
+import json
+import threading
+from contextlib import contextmanager
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from config import Config
+from services.metrics import metrics, elapsed_ms
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailable(requests.RequestException):
+    """Ollama est marqué indisponible (circuit ouvert ou dernier contrôle de santé en échec)."""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur : s'ouvre après `failure_threshold` échecs consécutifs ; tant qu'il est ouvert, les appels
+    sont refusés sans toucher au réseau. Après `reset_timeout_s`, un seul appel d'essai est laissé passer
+    (semi-ouvert) : un succès le referme, un échec le rouvre pour une nouvelle période. Un essai abandonné
+    sans verdict (`release`) libère la place pour l'appel suivant.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout_s):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def would_allow(self):
+        """Lecture seule : vrai si un appel serait laissé passer maintenant (l'état n'est pas modifié)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN:
+                return not self._trial_in_flight
+            return time.monotonic() - self._opened_at >= self.reset_timeout_s
+
+    def acquire(self):
+        """
+        À appeler juste avant un appel réel : peut passer l'état d'ouvert à semi-ouvert et réserve alors
+        l'appel d'essai, jusqu'à `record_success`, `record_failure` ou `release`.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                self.state = self.HALF_OPEN
+                logger.info("Disjoncteur Ollama semi-ouvert : appel d'essai autorisé.")
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release(self):
+        """Appel interrompu sans verdict : l'état ne change pas, l'essai semi-ouvert redevient disponible."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Disjoncteur Ollama refermé.")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+        metrics.gauge("chat.ollama.circuit_open").set(0)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Disjoncteur Ollama ouvert après {self._failures} échec(s) consécutif(s).")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+        if self.state == self.OPEN:
+            metrics.gauge("chat.ollama.circuit_open").set(1)
+
+
+class OllamaClient:
+    """
+    Client HTTP d'Ollama partagé par tout le processus :
+    - session requests avec pool de connexions keep-alive (plus de nouvelle connexion TCP par message) ;
+    - délais de connexion et de lecture (un Ollama bloqué ne fige plus le greenlet indéfiniment) ;
+    - disjoncteur sur les échecs consécutifs ;
+    - état de santé rafraîchi en tâche de fond plutôt qu'à chaque message.
+    """
+
+    def __init__(self, base_url, connect_timeout, read_timeout, pool_size,
+                 failure_threshold, reset_timeout_s, health_interval_s):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.health_interval_s = health_interval_s
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout_s)
+        self.healthy = None  # None tant qu'aucun contrôle n'a été fait
+        self.last_health_check = None
+        self._monitor = None
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def check_health(self):
+        """Interroge la racine d'Ollama (délai court) et met à jour l'état de santé."""
+        try:
+            response = self.session.get(self.base_url + "/", timeout=(self.timeout[0], self.timeout[0]))
+            healthy = response.status_code == 200
+            if not healthy:
+                logger.warning(f"Ollama renvoie un statut inattendu : {response.status_code}")
+        except requests.RequestException as e:
+            logger.warning(f"Ollama n'est pas accessible : {e.__class__.__name__} - {str(e)}")
+            healthy = False
+        if healthy != self.healthy:
+            logger.info(f"État de santé d'Ollama : {'accessible' if healthy else 'inaccessible'}")
+        self.healthy = healthy
+        self.last_health_check = time.time()
+        metrics.gauge("chat.ollama.healthy").set(int(healthy))
+        return healthy
+
+    def _monitor_loop(self):
+        while True:
+            time.sleep(self.health_interval_s)
+            self.check_health()
+
+    def start_health_monitor(self):
+        """Démarre (une seule fois) le rafraîchissement périodique de l'état de santé."""
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._monitor_loop, name="ollama-health", daemon=True)
+            self._monitor.start()
+            logger.debug(f"Surveillance de la santé d'Ollama démarrée (toutes les {self.health_interval_s} s)")
+
+    def is_available(self):
+        """Faux si le dernier contrôle de santé a échoué ou si le disjoncteur refuserait l'appel (sans changer son état)."""
+        return self.healthy is not False and self.breaker.would_allow()
+
+    def _before_call(self):
+        # Seul endroit où le disjoncteur peut passer en semi-ouvert : l'essai est l'appel qui suit
+        if self.healthy is False or not self.breaker.acquire():
+            metrics.counter("chat.ollama.short_circuited").inc()
+            reason = "contrôle de santé en échec" if self.healthy is False else f"circuit {self.breaker.state}"
+            raise OllamaUnavailable(f"Le service Ollama est momentanément indisponible ({reason}).")
+        metrics.counter("chat.ollama.requests").inc()
+
+    def _record_failure(self, e):
+        metrics.counter("chat.ollama.failures").inc()
+        logger.error(f"Échec de l'appel à Ollama : {e.__class__.__name__} - {str(e)}")
+        response = getattr(e, "response", None)
+        if response is not None and 400 <= response.status_code < 500:
+            # Demande refusée (ex. modèle absent : 404) : Ollama répond, ce n'est pas une panne du service
+            self.breaker.record_success()
+            return
+        self.breaker.record_failure()
+
+    @contextmanager
+    def _call(self, errors=(requests.RequestException, ValueError)):
+        """
+        Encadre un appel à Ollama : court-circuit si indisponible, puis un verdict toujours enregistré
+        (sans quoi un appel d'essai abandonné laisserait le disjoncteur semi-ouvert indéfiniment).
+        """
+        self._before_call()
+        try:
+            yield
+        except GeneratorExit:
+            # Flux abandonné par le client (déconnexion) : Ollama répondait, l'essai est réussi
+            self.breaker.record_success()
+            raise
+        except errors as e:
+            self._record_failure(e)
+            raise
+        except BaseException:
+            # Interrompu sans réponse exploitable (délai du greenlet, arrêt) : libérer l'essai
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+
+    def chat(self, payload):
+        """POST /api/chat (sans flux) ; retourne le JSON de la réponse."""
+        start = time.perf_counter()
+        with self._call():
+            response = self.session.post(self.base_url + "/api/chat", json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        metrics.histogram("chat.ollama.request_ms").observe(elapsed_ms(start))
+        return data
+
+    def chat_stream(self, payload):
+        """
+        POST /api/chat en flux ; génère les objets JSON envoyés par Ollama (un par ligne).
+        Le délai de lecture s'applique entre deux fragments, pas à la génération entière.
+        """
+        with self._call():
+            with self.session.post(self.base_url + "/api/chat", json=dict(payload, stream=True),
+                                   timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise requests.RequestException(chunk["error"])
+                    yield chunk
+                    if chunk.get("done"):
+                        break
+
+    def embed(self, model, texts):
+        """POST /api/embed ; retourne un vecteur (liste de floats) par texte."""
+        start = time.perf_counter()
+        with self._call((requests.RequestException, ValueError, KeyError)):
+            response = self.session.post(self.base_url + "/api/embed", json={"model": model, "input": texts}, timeout=self.timeout)
+            response.raise_for_status()
+            embeddings = response.json()["embeddings"]
+        metrics.histogram("chat.ollama.embed_ms").observe(elapsed_ms(start))
+        return embeddings
+
+    def get_status(self):
+        return {
+            "healthy": self.healthy,
+            "last_health_check": self.last_health_check,
+            "circuit": self.breaker.state
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_ollama_client():
+    """Client Ollama partagé (créé à la première utilisation)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = OllamaClient(
+                    Config.OLLAMA_BASE_URL,
+                    connect_timeout=Config.OLLAMA_CONNECT_TIMEOUT,
+                    read_timeout=Config.OLLAMA_READ_TIMEOUT,
+                    pool_size=Config.OLLAMA_POOL_SIZE,
+                    failure_threshold=Config.OLLAMA_FAILURE_THRESHOLD,
+                    reset_timeout_s=Config.OLLAMA_RESET_TIMEOUT,
+                    health_interval_s=Config.OLLAMA_HEALTH_INTERVAL
+                )
+    return _client
+
+
+_embedding_client = None
+
+def get_embedding_client():
+    """
+    Client Ollama des embeddings du cache sémantique (créé à la première utilisation) : disjoncteur et délai
+    de lecture distincts, pour que ses échecs n'ouvrent pas le circuit des générations du chat.
+    """
+    global _embedding_client
+    if _embedding_client is None:
+        with _client_lock:
+            if _embedding_client is None:
+                _embedding_client = OllamaClient(
+                    Config.OLLAMA_BASE_URL,
+                    connect_timeout=Config.OLLAMA_CONNECT_TIMEOUT,
+                    read_timeout=Config.SEMANTIC_CACHE_EMBED_TIMEOUT,
+                    pool_size=max(1, Config.SEMANTIC_CACHE_EMBED_CONCURRENCY),
+                    failure_threshold=Config.OLLAMA_FAILURE_THRESHOLD,
+                    reset_timeout_s=Config.OLLAMA_RESET_TIMEOUT,
+                    health_interval_s=Config.OLLAMA_HEALTH_INTERVAL
+                )
+    return _embedding_client
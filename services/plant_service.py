@@ -1,9 +1,17 @@
 import os
-from datetime import datetime
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
+import threading
+import time
 import numpy as np
 import logging
+from io import BytesIO
+from config import Config
+from services.inference_batcher import InferenceBatcher
+from services.inference_pool import InferencePool, InferenceQueueFull
+from services.inference_backends import create_backend, os_lock
+from services.diagnosis_cache import DiagnosisCache, model_fingerprint, content_hash
+from services.storage import UPLOAD_ROOT, blob_relative_path, store_bytes, register_blob, add_reference
+from services.cascade import CascadeClassifier
+from services.metrics import metrics, elapsed_ms
 
 # Configurer le logging
 logging.basicConfig(level=logging.DEBUG)
@@ -12,13 +20,20 @@ logger = logging.getLogger(__name__)
 # Chemin vers le modèle fine-tuné
 MODEL_PATH = "models/mobilenetv2_color.h5"
 
-# Charger le modèle fine-tuné
-try:
-    model = tf.keras.models.load_model(MODEL_PATH)
-    logger.debug(f"Modèle fine-tuné chargé avec succès depuis {MODEL_PATH}")
-except Exception as e:
-    logger.error(f"Erreur lors du chargement du modèle : {e}")
-    raise
+# Artefacts quantifiés produits par scripts/convert_tflite.py
+TFLITE_MODEL_PATHS = {
+    "float16": "models/mobilenetv2_color_float16.tflite",
+    "int8": "models/mobilenetv2_color_int8.tflite"
+}
+
+# Taille d'entrée attendue par MobileNetV2
+INPUT_SIZE = (224, 224)
+
+# Le modèle (et TensorFlow) n'est plus chargé à l'import : voir get_backend() / start_background_loading()
+_backend = None
+# Verrou système : get_backend() est appelé depuis les threads de eventlet.tpool (predict, warm_up)
+_backend_lock = os_lock()
+_status = {"ready": False, "loading": False, "error": None, "load_seconds": None}
 
 # Liste des classes fournies
 CLASSES = [
@@ -104,53 +119,444 @@ RECOMMENDATIONS = {
     "Tomato___healthy": "Aucune action nécessaire, continuez les bonnes pratiques."
 }
 
+# Pool d'exécution et batcher partagés par toutes les requêtes (créés à la première utilisation)
+_pool = None
+_batcher = None
+_diagnosis_cache = None
+_cascade = None
+_cascade_retry_at = 0.0  # Après un échec de chargement du premier étage : pas de nouvel essai avant cette date
+
+def get_backend_spec():
+    """(nom du backend, chemin de l'artefact, options) sélectionnés par la configuration."""
+    name = Config.INFERENCE_BACKEND
+    if name == "tflite":
+        model_path = Config.INFERENCE_MODEL_PATH or TFLITE_MODEL_PATHS[Config.TFLITE_QUANTIZATION]
+        return name, model_path, {"num_threads": Config.TFLITE_NUM_THREADS}
+    if name == "stub":
+        return name, None, {"batch_latency_ms": Config.STUB_BATCH_LATENCY_MS, "image_latency_ms": Config.STUB_IMAGE_LATENCY_MS}
+    return name, Config.INFERENCE_MODEL_PATH or MODEL_PATH, {}
+
+def get_backend():
+    """
+    Crée et charge le backend d'inférence à la première utilisation (sûr entre threads système).
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name, model_path, options = get_backend_spec()
+                try:
+                    _backend = create_backend(name, model_path, **options).load()
+                    logger.debug(f"Backend d'inférence {name} chargé avec succès depuis {model_path}")
+                except Exception as e:
+                    logger.error(f"Erreur lors du chargement du modèle : {e}")
+                    raise
+    return _backend
+
+def _predict_batch(img_batch):
+    return get_backend().predict(img_batch)
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = InferencePool(
+            _predict_batch,
+            mode=Config.INFERENCE_MODE,
+            workers=Config.INFERENCE_WORKERS,
+            queue_size=Config.INFERENCE_QUEUE_SIZE,
+            backend_spec=get_backend_spec()
+        )
+    return _pool
+
+def get_batcher():
+    global _batcher
+    if _batcher is None:
+        _batcher = InferenceBatcher(
+            get_pool().run,
+            max_batch_size=Config.INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=Config.INFERENCE_MAX_WAIT_MS,
+            workers=Config.INFERENCE_WORKERS
+        )
+    return _batcher
+
+def predict(img_array):
+    """
+    Retourne le vecteur de probabilités pour un tenseur prétraité (1, 224, 224, 3).
+    Les requêtes concurrentes sont regroupées en micro-lots si INFERENCE_BATCHING_ENABLED est actif.
+    Lève InferenceQueueFull si trop de requêtes sont déjà en attente.
+    """
+    with get_pool().admission():
+        if Config.INFERENCE_BATCHING_ENABLED:
+            predictions = get_batcher().submit(img_array)
+        else:
+            predictions = get_pool().run(img_array)[0]
+    _status["ready"] = True
+    return predictions
+
+def warm_up():
+    """
+    Charge le modèle et exécute une prédiction sur un tenseur factice pour que la première
+    vraie requête ne paie pas la construction du graphe.
+    """
+    start = time.perf_counter()
+    _status.update(loading=True, error=None)
+    try:
+        get_pool().warm_up(np.zeros((1, *INPUT_SIZE, 3), dtype=np.float32))
+        _status.update(ready=True, load_seconds=round(time.perf_counter() - start, 3))
+        logger.info(f"Modèle prêt pour l'inférence en {_status['load_seconds']} s")
+    except Exception as e:
+        _status["error"] = str(e)
+        logger.error(f"Échec du préchargement du modèle : {e}")
+    finally:
+        _status["loading"] = False
+
+def start_background_loading():
+    """Lance warm_up() dans un thread d'arrière-plan (exécuté une fois le serveur démarré)."""
+    if _status["ready"] or _status["loading"]:
+        return
+    _status["loading"] = True
+    threading.Thread(target=warm_up, name="plant-model-loader", daemon=True).start()
+
+def get_inference_status():
+    """Indique si l'inférence est disponible (modèle chargé et préchauffé)."""
+    return {
+        "ready": _status["ready"],
+        "loading": _status["loading"],
+        "error": _status["error"],
+        "load_seconds": _status["load_seconds"],
+        "mode": Config.INFERENCE_MODE,
+        "backend": Config.INFERENCE_BACKEND
+    }
+
+def preprocess(img_array):
+    """Équivalent de tf.keras.applications.mobilenet_v2.preprocess_input (pixels ramenés dans [-1, 1])."""
+    return img_array / 127.5 - 1.0
+
+def decode_image(data, size=INPUT_SIZE, timings=None):
+    """
+    Décode une image (octets) directement en tenseur prétraité (1, H, W, 3), sans passer par le disque.
+    Pour les JPEG, le mode draft de Pillow décode à échelle réduite (1/2, 1/4, 1/8) au plus près de `size`,
+    ce qui évite de décompresser entièrement une photo de plusieurs mégapixels.
+    """
+    return decode_image_sizes(data, [size], timings)[0]
+
+def decode_image_sizes(data, sizes, timings=None):
+    """
+    Variante de decode_image produisant un tenseur par taille à partir d'un seul décodage
+    (premier étage de la cascade et modèle complet).
+    """
+    from PIL import Image
+    start = time.perf_counter()
+    img = Image.open(BytesIO(data))
+    img.draft("RGB", (max(size[0] for size in sizes), max(size[1] for size in sizes)))
+    img.load()
+    if timings is not None:
+        timings["decode_ms"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    img = img.convert("RGB")
+    # Interpolation "nearest" comme keras.preprocessing.image.load_img, utilisé jusqu'ici
+    img_arrays = [preprocess(np.asarray(img.resize(size, Image.NEAREST), dtype=np.float32)[np.newaxis, ...]) for size in sizes]
+    if timings is not None:
+        timings["resize_ms"] = elapsed_ms(start)
+    return img_arrays
+
+def _persist_upload(data, ext, digest):
+    start = time.perf_counter()
+    try:
+        store_bytes(data, ext, digest)
+        metrics.histogram("plant.stage.persist_ms").observe(elapsed_ms(start))
+    except OSError as e:
+        logger.error(f"Erreur lors de l'enregistrement de l'image {digest} : {e}")
+
+def persist_upload_async(data, ext, digest):
+    """Écrit l'image originale dans le stockage adressé par contenu, en arrière-plan, une fois la prédiction calculée."""
+    threading.Thread(target=_persist_upload, args=(data, ext, digest), daemon=True).start()
+
+def _record_stage_timings(timings):
+    for stage, value in timings.items():
+        metrics.histogram(f"plant.stage.{stage}").observe(value)
+
+def get_inference_metrics():
+    """Profondeur de file, histogramme des tailles de lot, temps d'attente et rejets du pool."""
+    return metrics.snapshot(prefix="plant.")
+
+def get_diagnosis_cache():
+    global _diagnosis_cache
+    if _diagnosis_cache is None:
+        _diagnosis_cache = DiagnosisCache(
+            max_entries=Config.DIAGNOSIS_CACHE_SIZE,
+            perceptual=Config.DIAGNOSIS_CACHE_PERCEPTUAL,
+            max_distance=Config.DIAGNOSIS_CACHE_MAX_DISTANCE
+        )
+    return _diagnosis_cache
+
+def _image_ext(filename):
+    return os.path.splitext(filename)[1].lower()
+
+def _diagnosis(predictions):
+    """(maladie, confiance, recommandation) à partir d'un vecteur de probabilités."""
+    predicted_class_idx = int(np.argmax(predictions))  # Indice de la classe avec la plus haute probabilité
+    confidence = float(predictions[predicted_class_idx])  # Score de confiance
+    disease = CLASSES[predicted_class_idx] if predicted_class_idx < len(CLASSES) else "Inconnue"
+    return disease, confidence, RECOMMENDATIONS.get(disease, "Aucune recommandation disponible.")
+
+def pipeline_fingerprint():
+    """
+    Empreinte du pipeline de diagnostic : artefact du modèle complet et, cascade activée, artefact du premier
+    étage et ses réglages (backend, résolution, seuil). Tout changement invalide le cache des diagnostics.
+    """
+    fingerprint = model_fingerprint(get_backend_spec()[1])
+    if Config.CASCADE_ENABLED:
+        fingerprint += "|cascade:" + ":".join([
+            model_fingerprint(Config.CASCADE_STAGE1_MODEL_PATH),
+            Config.CASCADE_STAGE1_BACKEND,
+            str(Config.CASCADE_STAGE1_INPUT_SIZE),
+            str(Config.CASCADE_THRESHOLD)
+        ])
+    return fingerprint
+
+def _lookup_cache(data, filename, user_id):
+    """
+    Retourne (clé, hash perceptuel, résultat, entrée pour _save_diagnoses ou None).
+    Le résultat vaut None si l'image n'a jamais été diagnostiquée. La clé est le SHA-256 du contenu.
+    """
+    if not Config.DIAGNOSIS_CACHE_ENABLED:
+        return None, None, None, None
+    from models.plant_disease import PlantDisease
+    cache_key, phash, cached = get_diagnosis_cache().get(data, pipeline_fingerprint())
+    if cached is None:
+        return cache_key, phash, None, None
+    if cached["key"] != cache_key:
+        # Quasi-doublon : seul le diagnostic est repris, l'image reçue est stockée comme un nouvel upload
+        # (jamais la photo d'origine, qui peut appartenir à un autre utilisateur)
+        diagnosis = (cached["disease"], cached["confidence"], cached["recommendation"])
+        result, row = _store_result(data, filename, diagnosis, user_id, cache_key, phash)
+        logger.debug(f"Diagnostic d'un quasi-doublon servi depuis le cache : {cached['disease']}, Chemin : {result['image_path']}")
+        return cache_key, phash, result, row
+    result = {
+        "disease": cached["disease"],
+        "recommendation": cached["recommendation"],
+        "image_path": cached["image_path"],
+        "confidence": cached["confidence"]
+    }
+    # Même utilisateur, même image : le diagnostic est déjà dans son historique
+    row = None
+    if str(cached["user_id"]) != str(user_id):
+        row = (PlantDisease(user_id=user_id, image_path=cached["image_path"], disease=cached["disease"], recommendation=cached["recommendation"]), cache_key, None)
+    logger.debug(f"Diagnostic servi depuis le cache : {cached['disease']}, Chemin : {cached['image_path']}")
+    return cache_key, phash, result, row
+
+def _store_diagnosis(data, filename, predictions, user_id, cache_key, phash):
+    """
+    Enregistre le blob de l'image et retourne (résultat, (ligne PlantDisease, hash du blob, après-commit)).
+    L'écriture du fichier et l'alimentation du cache n'ont lieu qu'une fois la transaction validée
+    (cf. _save_diagnoses) : un lot annulé ne laisse ni fichier orphelin ni entrée de cache sans ligne.
+    """
+    return _store_result(data, filename, _diagnosis(predictions), user_id, cache_key, phash)
+
+def _store_result(data, filename, diagnosis, user_id, cache_key, phash):
+    """Variante de _store_diagnosis pour un diagnostic déjà établi (maladie, confiance, recommandation)."""
+    from models.plant_disease import PlantDisease
+    # Stockage adressé par contenu : uploads/blobs/ab/cd/<sha256><ext>
+    digest = cache_key or content_hash(data)
+    ext = _image_ext(filename)
+    relative_path = register_blob(digest, blob_relative_path(digest, ext), len(data))
+    image_path = f"{UPLOAD_ROOT}/{relative_path}"
+    disease, confidence, recommendation = diagnosis
+    result = {
+        "disease": disease,
+        "recommendation": recommendation,
+        "image_path": image_path,
+        "confidence": confidence  # Optionnel : renvoyer la confiance
+    }
+    row = PlantDisease(user_id=user_id, image_path=image_path, disease=disease, recommendation=recommendation)
+
+    def after_commit():
+        # L'original est écrit sur disque en arrière-plan, sans bloquer la réponse (sous le chemin enregistré)
+        persist_upload_async(data, os.path.splitext(relative_path)[1], digest)
+        if cache_key is not None:
+            get_diagnosis_cache().put(cache_key, dict(result, user_id=user_id), phash)
+    return result, (row, digest, after_commit)
+
+def _save_diagnoses(entries):
+    """
+    Insère les lignes PlantDisease puis leurs références de blob, en une seule transaction,
+    et ne lance l'écriture des images (et l'alimentation du cache) qu'après le commit.
+    """
+    from extensions import db
+    db.session.add_all([row for row, _, _ in entries])
+    db.session.flush()
+    for row, digest, _ in entries:
+        add_reference(digest, "plant_disease", row.id)
+    db.session.commit()
+    for _, _, after_commit in entries:
+        if after_commit is not None:
+            after_commit()
+
+def get_cascade():
+    """
+    Premier étage de la cascade, chargé à la première utilisation. Retourne None s'il n'a pas pu être
+    chargé : la cascade est alors désactivée pendant CASCADE_RETRY_SECONDS (modèle complet seul).
+    """
+    global _cascade, _cascade_retry_at
+    if _cascade is None and time.monotonic() >= _cascade_retry_at:
+        size = Config.CASCADE_STAGE1_INPUT_SIZE
+        try:
+            _cascade = CascadeClassifier(
+                create_backend(Config.CASCADE_STAGE1_BACKEND, Config.CASCADE_STAGE1_MODEL_PATH).load(),
+                input_size=(size, size),
+                threshold=Config.CASCADE_THRESHOLD,
+                execute_fn=get_pool().execute
+            )
+        except Exception as e:
+            _cascade_retry_at = time.monotonic() + Config.CASCADE_RETRY_SECONDS
+            metrics.counter("plant.cascade.load_errors").inc()
+            logger.warning(f"Premier étage de la cascade indisponible, nouvel essai dans {Config.CASCADE_RETRY_SECONDS:.0f} s : {e}")
+    return _cascade
+
 def detect_plant_disease(image_file, user_id):
     """
     Détecte une maladie des plantes à partir d'un fichier image uploadé avec le modèle fine-tuné.
+    Une image déjà diagnostiquée (même contenu) est servie depuis le cache, sans inférence
+    ni nouvelle copie du fichier.
     """
     try:
-        # Générer un chemin pour sauvegarder l'image
-        image_path = f"uploads/{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{os.path.splitext(image_file.filename)[1]}"
-        os.makedirs("uploads", exist_ok=True)
-
-        # Sauvegarder le fichier uploadé
-        image_file.save(image_path)
+        # Lire l'upload une seule fois
+        data = image_file.read()
 
-        # Prétraiter l'image pour le modèle (MobileNetV2 attend 224x224)
-        img = image.load_img(image_path, target_size=(224, 224))
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = tf.keras.applications.mobilenet_v2.preprocess_input(img_array)
+        cache_key, phash, result, row = _lookup_cache(data, image_file.filename, user_id)
+        if result is not None:
+            if row is not None:
+                _save_diagnoses([row])
+            return result
 
-        # Faire une prédiction avec le modèle fine-tuné
-        predictions = model.predict(img_array)
-        predicted_class_idx = np.argmax(predictions[0])  # Indice de la classe avec la plus haute probabilité
-        confidence = predictions[0][predicted_class_idx]  # Score de confiance
+        # Décoder l'image en mémoire (MobileNetV2 attend 224x224), une seule fois pour les deux étages
+        timings = {}
+        predictions = None
+        cascade = get_cascade() if Config.CASCADE_ENABLED else None
+        if cascade is not None:
+            img_array, stage1_array = decode_image_sizes(data, [INPUT_SIZE, cascade.input_size], timings)
+            # Premier étage de la cascade : le modèle léger répond seul s'il est assez confiant
+            try:
+                with get_pool().admission():
+                    predictions = cascade.first_stage([stage1_array])[0]
+            except InferenceQueueFull:
+                raise
+            except Exception as e:
+                logger.warning(f"Premier étage de la cascade en échec, modèle complet utilisé : {e}")
+        else:
+            img_array = decode_image(data, timings=timings)
 
-        # Récupérer la maladie prédite
-        disease = CLASSES[predicted_class_idx] if predicted_class_idx < len(CLASSES) else "Inconnue"
-        recommendation = RECOMMENDATIONS.get(disease, "Aucune recommandation disponible.")
+        if predictions is None:
+            # Faire une prédiction avec le modèle fine-tuné
+            start = time.perf_counter()
+            predictions = predict(img_array)
+            timings["predict_ms"] = elapsed_ms(start)
+            _record_stage_timings(timings)
 
         # Enregistrer dans la base de données
-        from models.plant_disease import PlantDisease
-        from extensions import db
-        plant = PlantDisease(
-            user_id=user_id,
-            image_path=image_path,
-            disease=disease,
-            recommendation=recommendation
-        )
-        db.session.add(plant)
-        db.session.commit()
+        result, row = _store_diagnosis(data, image_file.filename, predictions, user_id, cache_key, phash)
+        _save_diagnoses([row])
 
-        logger.debug(f"Maladie détectée : {disease} (confiance: {confidence:.2f}), Recommandation : {recommendation}, Chemin : {image_path}")
-        return {
-            "disease": disease,
-            "recommendation": recommendation,
-            "image_path": image_path,
-            "confidence": float(confidence)  # Optionnel : renvoyer la confiance
-        }
+        logger.debug(f"Maladie détectée : {result['disease']} (confiance: {result['confidence']:.2f}), Recommandation : {result['recommendation']}, "
+                     f"Chemin : {result['image_path']}, Durées : " + ", ".join(f"{stage}={value:.1f}" for stage, value in timings.items()))
+        return result
 
     except Exception as e:
         logger.error(f"Erreur lors de la détection de la maladie : {e}")
-        raise
\ No newline at end of file
+        raise
+
+def detect_plant_diseases(image_files, user_id):
+    """
+    Diagnostique plusieurs images (relevé de terrain) et produit un résultat par image dès qu'il est prêt.
+
+    Les images déjà en cache sont renvoyées immédiatement ; les autres sont décodées une seule fois, puis
+    celles tranchées par le premier étage de la cascade (si activée) sont renvoyées et le reste est prédit
+    par lots de INFERENCE_MAX_BATCH_SIZE (un seul predict par lot, hors du hub via le pool).
+    Toutes les lignes PlantDisease sont insérées en une seule fois à la fin.
+    Chaque résultat porte son `index` dans la requête et le `filename` d'origine ; une image
+    illisible produit un résultat avec une clé `error`.
+    L'appelant réserve une seule admission du pool pour tout le lot avant de consommer le générateur.
+    """
+    from extensions import db
+    rows = []
+    uncached = []  # (index, filename, data, clé de cache, hash perceptuel)
+    pending = []  # (index, filename, data, tenseur, clé de cache, hash perceptuel)
+
+    try:
+        for index, image_file in enumerate(image_files):
+            data = image_file.read()
+            cache_key, phash, result, row = _lookup_cache(data, image_file.filename, user_id)
+            if result is not None:
+                if row is not None:
+                    rows.append(row)
+                yield dict(result, index=index, filename=image_file.filename, cached=True)
+                continue
+            uncached.append((index, image_file.filename, data, cache_key, phash))
+
+        # Un seul décodage par image : tenseur du modèle complet et, cascade activée, du premier étage
+        cascade = get_cascade() if Config.CASCADE_ENABLED and uncached else None
+        sizes = [INPUT_SIZE, cascade.input_size] if cascade is not None else [INPUT_SIZE]
+        decoded = []  # (index, filename, data, tenseurs, clé de cache, hash perceptuel)
+        for index, filename, data, cache_key, phash in uncached:
+            try:
+                timings = {}
+                img_arrays = decode_image_sizes(data, sizes, timings)
+                _record_stage_timings(timings)
+            except Exception as e:
+                logger.warning(f"Image illisible dans le lot ({filename}) : {e}")
+                yield {"index": index, "filename": filename, "error": "Image illisible."}
+                continue
+            decoded.append((index, filename, data, img_arrays, cache_key, phash))
+
+        # Premier étage de la cascade sur toutes les images lisibles, en un seul lot
+        first_stage = [None] * len(decoded)
+        if cascade is not None and decoded:
+            try:
+                first_stage = cascade.first_stage([item[3][1] for item in decoded])
+            except Exception as e:
+                logger.warning(f"Premier étage de la cascade en échec pour ce lot : {e}")
+
+        for (index, filename, data, img_arrays, cache_key, phash), predictions in zip(decoded, first_stage):
+            if predictions is not None:
+                result, row = _store_diagnosis(data, filename, predictions, user_id, cache_key, phash)
+                rows.append(row)
+                yield dict(result, index=index, filename=filename, cached=False)
+                continue
+            # Escalade : le tenseur du modèle complet est déjà prêt
+            pending.append((index, filename, data, img_arrays[0], cache_key, phash))
+
+        for offset in range(0, len(pending), Config.INFERENCE_MAX_BATCH_SIZE):
+            chunk = pending[offset:offset + Config.INFERENCE_MAX_BATCH_SIZE]
+            start = time.perf_counter()
+            predictions = get_pool().run(np.concatenate([item[3] for item in chunk], axis=0))
+            metrics.histogram("plant.stage.predict_ms").observe(elapsed_ms(start))
+            for (index, filename, data, _, cache_key, phash), image_predictions in zip(chunk, predictions):
+                result, row = _store_diagnosis(data, filename, image_predictions, user_id, cache_key, phash)
+                rows.append(row)
+                yield dict(result, index=index, filename=filename, cached=False)
+
+        # Insertion groupée de tous les diagnostics du lot
+        if rows:
+            _save_diagnoses(rows)
+        logger.debug(f"Lot de diagnostics traité : {len(rows)} enregistrements pour l'utilisateur {user_id}")
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Erreur lors de la détection des maladies par lot : {e}")
+        raise
+
+def summarize_diagnoses(results):
+    """Synthèse d'un lot : nombre d'images par maladie et confiance moyenne."""
+    diagnosed = [r for r in results if "error" not in r]
+    class_counts = {}
+    for r in diagnosed:
+        class_counts[r["disease"]] = class_counts.get(r["disease"], 0) + 1
+    return {
+        "total": len(results),
+        "diagnosed": len(diagnosed),
+        "errors": len(results) - len(diagnosed),
+        "class_counts": dict(sorted(class_counts.items(), key=lambda item: -item[1])),
+        "mean_confidence": round(sum(r["confidence"] for r in diagnosed) / len(diagnosed), 4) if diagnosed else None
+    }
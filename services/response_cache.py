@@ -0,0 +1,121 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+from config import Config
+from services.knowledge_base import normalize_words
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt):
+    """Forme canonique d'un message : minuscules, sans accents ni ponctuation, espaces réduits."""
+    return " ".join(normalize_words(prompt))
+
+
+def cache_key(prompt, model, system_version):
+    return hashlib.sha256("\0".join([model, system_version, normalize_prompt(prompt)]).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Cache des réponses du LLM dans une base SQLite locale (partagée entre workers, mode WAL) :
+    clé = message normalisé + modèle + version de l'instruction système ; expiration après `ttl_s`
+    et éviction des entrées les moins récemment lues au-delà de `max_entries`.
+    """
+
+    def __init__(self, path, max_entries, ttl_s):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                " key TEXT PRIMARY KEY, prompt TEXT NOT NULL, model TEXT NOT NULL, system_version TEXT NOT NULL,"
+                " response TEXT NOT NULL, generation_ms REAL NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_access ON llm_responses (last_access)")
+
+    def get(self, prompt, model, system_version):
+        """Retourne (réponse, durée de génération d'origine en ms) ou None (absente ou expirée)."""
+        key = cache_key(prompt, model, system_version)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, generation_ms, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.ttl_s:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_responses SET last_access = ? WHERE key = ?", (now, key))
+        return row[0], row[1]
+
+    def put(self, prompt, model, system_version, response, generation_ms):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (cache_key(prompt, model, system_version), normalize_prompt(prompt), model, system_version,
+                 response, generation_ms, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM llm_responses WHERE key IN"
+                    " (SELECT key FROM llm_responses ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def purge(self, model=None, prompt=None, expired_only=False):
+        """Supprime les entrées (toutes, d'un modèle, d'un message normalisé ou seulement expirées) ; retourne leur nombre."""
+        clauses, params = [], []
+        if model:
+            clauses.append("model = ?")
+            params.append(model)
+        if prompt:
+            clauses.append("prompt = ?")
+            params.append(normalize_prompt(prompt))
+        if expired_only:
+            clauses.append("created_at < ?")
+            params.append(time.time() - self.ttl_s)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            deleted = self._conn.execute(f"DELETE FROM llm_responses{where}", params).rowcount
+        logger.info(f"Cache des réponses du LLM purgé : {deleted} entrée(s)")
+        return deleted
+
+    def get_stats(self):
+        with self._lock:
+            entries, oldest = self._conn.execute("SELECT COUNT(*), MIN(created_at) FROM llm_responses").fetchone()
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "oldest_entry_age_s": round(time.time() - oldest, 1) if oldest else None,
+            "path": self.path
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache():
+    """Cache des réponses du LLM (None si LLM_CACHE_ENABLED est faux)."""
+    global _cache
+    if not Config.LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(Config.LLM_CACHE_PATH, Config.LLM_CACHE_MAX_ENTRIES, Config.LLM_CACHE_TTL)
+    return _cache
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import logging
+import numpy as np
+from config import Config
+from services.knowledge_base import normalize_words
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+DATASET_PATH = "agri_dataset.txt"
+
+# Paramètres BM25 usuels
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Mots vides français retirés des questions et des messages avant indexation
+# (les mots interrogatifs sont conservés : "comment planter" et "quand planter" n'appellent pas la même réponse)
+STOPWORDS = set("""
+a au aux avec ce ces cela ca d de des du en est et il ils je j l la le les leur leurs ma mes mon
+ne ou par pas pour qu que qui sa se ses si son sur ta te tes ton tu un une vos votre vous y elle
+elles on nous dois doit faut peux peut
+""".split())
+
+# Tableaux mémoire-mappés (np.load(mmap_mode="r")) : partagés via le cache de pages entre workers
+ARRAYS = ("postings_docs", "postings_tf", "term_offsets", "term_idf", "doc_lengths", "doc_self_scores")
+
+
+def tokenize(text):
+    return [w for w in normalize_words(text) if w not in STOPWORDS]
+
+
+def parse_dataset(path):
+    """Retourne la liste des couples (question, réponse) : blocs séparés par une ligne vide, question en première ligne."""
+    pairs = []
+    with open(path, encoding="utf-8") as f:
+        blocks = re.split(r"\n\s*\n", f.read())
+    for block in blocks:
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if len(lines) >= 2:
+            pairs.append((lines[0], " ".join(lines[1:])))
+    return pairs
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def build_index(dataset_path, index_dir, k1=BM25_K1, b=BM25_B):
+    """
+    Construit l'index inversé BM25 des questions du jeu de données et l'écrit dans `index_dir`
+    (fichiers .npy + meta.json), via un dossier temporaire renommé à la fin.
+    """
+    pairs = parse_dataset(dataset_path)
+    docs = [tokenize(question) for question, _ in pairs]
+    vocabulary = {}
+    postings = {}
+    for doc_id, tokens in enumerate(docs):
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            term_id = vocabulary.setdefault(token, len(vocabulary))
+            postings.setdefault(term_id, []).append((doc_id, tf))
+
+    n_docs = len(docs)
+    doc_lengths = np.array([len(tokens) for tokens in docs], dtype=np.float32)
+    avgdl = float(doc_lengths.mean()) if n_docs else 0.0
+    term_offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    term_idf = np.zeros(len(vocabulary), dtype=np.float32)
+    postings_docs, postings_tf = [], []
+    for term_id in range(len(vocabulary)):
+        entries = postings[term_id]
+        term_offsets[term_id + 1] = term_offsets[term_id] + len(entries)
+        term_idf[term_id] = math.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+        postings_docs.extend(doc_id for doc_id, _ in entries)
+        postings_tf.extend(tf for _, tf in entries)
+
+    arrays = {
+        "postings_docs": np.array(postings_docs, dtype=np.int32),
+        "postings_tf": np.array(postings_tf, dtype=np.float32),
+        "term_offsets": term_offsets,
+        "term_idf": term_idf,
+        "doc_lengths": doc_lengths,
+    }
+    index = BM25Index(arrays, vocabulary, pairs, avgdl, k1, b)
+    # Score de chaque question contre elle-même : sert à normaliser les scores dans [0, 1]
+    arrays["doc_self_scores"] = np.array(
+        [index.raw_scores(list(dict.fromkeys(tokens)))[doc_id] if tokens else 0.0 for doc_id, tokens in enumerate(docs)],
+        dtype=np.float32
+    )
+
+    parent = os.path.dirname(os.path.abspath(index_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent)
+    for name in ARRAYS:
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), arrays[name])
+    with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "source_sha256": file_sha256(dataset_path),
+            "k1": k1,
+            "b": b,
+            "avgdl": avgdl,
+            "vocabulary": vocabulary,
+            "pairs": pairs
+        }, f, ensure_ascii=False)
+    if os.path.isdir(index_dir):
+        shutil.rmtree(index_dir)
+    os.replace(tmp_dir, index_dir)
+    logger.info(f"Index BM25 construit : {n_docs} questions, {len(vocabulary)} termes -> {index_dir}")
+
+
+class BM25Index:
+    def __init__(self, arrays, vocabulary, pairs, avgdl, k1, b):
+        self.arrays = arrays
+        self.vocabulary = vocabulary
+        self.pairs = pairs
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def load(cls, index_dir):
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(index_dir, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        index = cls(arrays, meta["vocabulary"], meta["pairs"], meta["avgdl"], meta["k1"], meta["b"])
+        index.source_sha256 = meta["source_sha256"]
+        return index
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def raw_scores(self, tokens):
+        """Scores BM25 de toutes les questions pour les termes `tokens`."""
+        scores = np.zeros(len(self.pairs), dtype=np.float32)
+        offsets, idf = self.arrays["term_offsets"], self.arrays["term_idf"]
+        doc_lengths = self.arrays["doc_lengths"]
+        for token in tokens:
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            start, end = offsets[term_id], offsets[term_id + 1]
+            docs = self.arrays["postings_docs"][start:end]
+            tf = self.arrays["postings_tf"][start:end]
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / self.avgdl)
+            scores[docs] += idf[term_id] * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def query_self_score(self, tokens):
+        """
+        Masse BM25 propre du message : son score contre lui-même, calculé comme doc_self_scores (tf = 1,
+        longueur = nombre de termes). Un terme absent du vocabulaire compte pour l'idf moyen.
+        """
+        idf = self.arrays["term_idf"]
+        unknown_idf = float(np.mean(idf)) if len(idf) else 0.0
+        norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avgdl)
+        weights = [float(idf[term_id]) if term_id is not None else unknown_idf
+                   for term_id in (self.vocabulary.get(token) for token in tokens)]
+        return sum(weights) * (self.k1 + 1) / (1 + norm)
+
+    def missing_entities(self, tokens, question, max_df):
+        """
+        Termes rares du message (présents dans au plus `max_df` questions, ou inconnus de l'index) absents de
+        `question` : un message sur une autre culture que la question trouvée en contient au moins un.
+        """
+        offsets = self.arrays["term_offsets"]
+        question_tokens = set(tokenize(question))
+        missing = []
+        for token in tokens:
+            if token in question_tokens:
+                continue
+            term_id = self.vocabulary.get(token)
+            if term_id is None or offsets[term_id + 1] - offsets[term_id] <= max_df:
+                missing.append(token)
+        return missing
+
+    def search(self, text, entity_max_df=0):
+        """
+        Retourne (question, réponse, score normalisé, termes rares manquants) de la meilleure question, ou None.
+        Le score normalisé est le plus petit de deux rapports : score BM25 / score de la question contre
+        elle-même (part de la question couverte) et score BM25 / masse propre du message (part du message
+        couverte). 1.0 = mêmes termes des deux côtés ; un long message qui ne partage qu'un terme rare avec
+        une question courte reste ainsi sous le seuil. Avec `entity_max_df`, la liste des termes rares du
+        message absents de la question est renvoyée (cf. missing_entities), vide sinon.
+        """
+        tokens = list(dict.fromkeys(tokenize(text)))  # Un terme répété dans le message ne compte qu'une fois
+        if not tokens or not len(self.pairs):
+            return None
+        scores = self.raw_scores(tokens)
+        best = int(np.argmax(scores))
+        if scores[best] <= 0:
+            return None
+        question, answer = self.pairs[best]
+        score = float(scores[best])
+        confidence = min(score / float(self.arrays["doc_self_scores"][best]), score / self.query_self_score(tokens))
+        missing = self.missing_entities(tokens, question, entity_max_df) if entity_max_df else []
+        return question, answer, confidence, missing
+
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index():
+    """Index BM25 du jeu de données, reconstruit si absent ou si agri_dataset.txt a changé."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index_dir = Config.RETRIEVAL_INDEX_DIR
+                meta_path = os.path.join(index_dir, "meta.json")
+                stale = True
+                if os.path.exists(meta_path):
+                    with open(meta_path, encoding="utf-8") as f:
+                        stale = json.load(f)["source_sha256"] != file_sha256(DATASET_PATH)
+                if stale:
+                    logger.info("Index BM25 absent ou obsolète, reconstruction...")
+                    build_index(DATASET_PATH, index_dir)
+                _index = BM25Index.load(index_dir)
+                logger.debug(f"Index BM25 chargé depuis {index_dir} ({len(_index)} questions)")
+    return _index
+
+
+def retrieve_answer(message):
+    """
+    Réponse du jeu de données si la meilleure question dépasse RETRIEVAL_MIN_SCORE et couvre tous les termes
+    rares du message (cf. RETRIEVAL_ENTITY_MAX_DF), sinon None. Retourne (question, réponse, score).
+    """
+    if not Config.RETRIEVAL_ENABLED:
+        return None
+    try:
+        match = get_index().search(message, entity_max_df=Config.RETRIEVAL_ENTITY_MAX_DF)
+    except Exception as e:
+        logger.error(f"Erreur lors de la recherche BM25 : {e}")
+        return None
+    if match is None:
+        return None
+    question, answer, score, missing = match
+    if score < Config.RETRIEVAL_MIN_SCORE:
+        logger.debug(f"Meilleure question BM25 sous le seuil ({score:.2f}) : {question}")
+        return None
+    if missing:
+        logger.debug(f"Meilleure question BM25 écartée, termes du message absents ({', '.join(missing)}) : {question}")
+        return None
+    logger.debug(f"Réponse trouvée par BM25 (score {score:.2f}) : {question}")
+    return question, answer, score
@@ -0,0 +1,263 @@
+import atexit
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import logging
+import numpy as np
+from config import Config
+from services.metrics import metrics
+from services.response_cache import normalize_prompt
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Seuils pour la similarité cosinus de la meilleure entrée trouvée
+SIMILARITY_BUCKETS = [0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 1.0]
+
+
+class SemanticCache:
+    """
+    Cache des réponses du LLM par similarité de sens : chaque message traité est représenté par son
+    embedding (normalisé), rangé dans une matrice NumPy de `max_entries` lignes. Une recherche exhaustive
+    (produit matrice-vecteur) trouve l'entrée la plus proche parmi celles du même modèle et de la même
+    version de génération ; au-dessus de `threshold` (cosinus), sa réponse est réutilisée.
+    Au-delà de `max_entries`, l'entrée la moins récemment utilisée est remplacée ; les entrées expirent
+    après `ttl_s`. L'index est enregistré dans `index_dir` (vectors.npy + entries.json) toutes les
+    `save_every` insertions et à l'arrêt du processus, et rechargé au démarrage.
+    Une part `sample_rate` des réponses servies est journalisée (`samples_path`) pour repérer les faux positifs.
+    Les embeddings passent par un client Ollama distinct de celui du chat, au plus `embed_concurrency` à la fois :
+    au-delà, la recherche est sautée (simple absence du cache) plutôt que mise en attente.
+    """
+
+    def __init__(self, embed_model, index_dir, max_entries, threshold, ttl_s, save_every=20,
+                 sample_rate=0.0, samples_path=None, embed_concurrency=2):
+        self.embed_model = embed_model
+        self.index_dir = index_dir
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl_s = ttl_s
+        self.save_every = save_every
+        self.sample_rate = sample_rate
+        self.samples_path = samples_path
+        self._vectors = None  # float32 (max_entries, dimension), créé au premier embedding
+        self._entries = []  # Métadonnées, même ordre que les lignes de _vectors
+        # Par ligne : groupe (modèle, version), date de création et dernier accès, pour filtrer sans boucle Python
+        self._groups = {}
+        self._group_of = np.full(max_entries, -1, dtype=np.int32)
+        self._created_at = np.zeros(max_entries, dtype=np.float64)
+        self._last_access = np.zeros(max_entries, dtype=np.float64)
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Une seule écriture sur disque à la fois
+        self._embed_slots = threading.BoundedSemaphore(max(1, embed_concurrency))
+        self._load()
+
+    def embed(self, text):
+        """Embedding normalisé du message (via Ollama), ou None si le service ne répond pas ou est déjà sollicité."""
+        from services.ollama_client import get_embedding_client
+        import requests
+        if not self._embed_slots.acquire(blocking=False):
+            metrics.counter("chat.semantic_cache.embed_skipped").inc()
+            return None
+        try:
+            vector = np.asarray(get_embedding_client().embed(self.embed_model, [text.strip()])[0], dtype=np.float32)
+        except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+            metrics.counter("chat.semantic_cache.embed_errors").inc()
+            logger.warning(f"Embedding du message impossible ({self.embed_model}) : {e}")
+            return None
+        finally:
+            self._embed_slots.release()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    def search(self, vector, model, version):
+        """
+        Entrée la plus proche de `vector` pour ce modèle et cette version :
+        (réponse, similarité, message d'origine, durée de génération d'origine en ms), ou None sous le seuil.
+        """
+        now = time.time()
+        with self._lock:
+            count = len(self._entries)
+            group = self._groups.get((model, version))
+            if not count or group is None or vector.shape[0] != self._vectors.shape[1]:
+                return None
+            scores = self._vectors[:count] @ vector
+            stale = (self._group_of[:count] != group) | (self._created_at[:count] < now - self.ttl_s)
+            scores[stale] = -1.0
+            best = int(np.argmax(scores))
+            similarity = float(scores[best])
+            if similarity < 0:
+                return None
+            metrics.histogram("chat.semantic_cache.best_similarity", SIMILARITY_BUCKETS).observe(similarity)
+            if similarity < self.threshold:
+                return None
+            self._last_access[best] = now
+            entry = self._entries[best]
+            return entry["answer"], similarity, entry["prompt"], entry["generation_ms"]
+
+    def add(self, vector, prompt, model, version, answer, generation_ms):
+        entry = {
+            "prompt": normalize_prompt(prompt),
+            "model": model,
+            "version": version,
+            "answer": answer,
+            "generation_ms": generation_ms,
+            "created_at": time.time()
+        }
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._vectors.shape[1]:
+                logger.warning("Dimension d'embedding inattendue : entrée ignorée par le cache sémantique.")
+                return
+            if len(self._entries) < self.max_entries:
+                index = len(self._entries)
+                self._entries.append(entry)
+            else:
+                # Remplacer l'entrée la moins récemment utilisée
+                index = int(np.argmin(self._last_access))
+                self._entries[index] = entry
+                metrics.counter("chat.semantic_cache.evictions").inc()
+            self._vectors[index] = vector
+            self._set_row(index, entry, entry["created_at"])
+            self._unsaved += 1
+            save = self._unsaved >= self.save_every
+        metrics.gauge("chat.semantic_cache.entries").set(len(self._entries))
+        if save:
+            self.save()
+
+    def _set_row(self, index, entry, last_access):
+        """Métadonnées vectorisées de la ligne `index` (verrou détenu)."""
+        group = self._groups.setdefault((entry["model"], entry["version"]), len(self._groups))
+        self._group_of[index] = group
+        self._created_at[index] = entry["created_at"]
+        self._last_access[index] = last_access
+
+    def sample_hit(self, query, similarity, matched_prompt, answer):
+        """Journalise (au hasard, `sample_rate`) une réponse servie par similarité, pour relecture."""
+        if not self.samples_path or random.random() >= self.sample_rate:
+            return
+        sample = {
+            "at": time.time(),
+            "query": normalize_prompt(query),
+            "matched_prompt": matched_prompt,
+            "similarity": round(similarity, 4),
+            "answer": answer
+        }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.samples_path)), exist_ok=True)
+            with self._lock, open(self.samples_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(sample, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"Échantillon du cache sémantique non enregistré : {e}")
+
+    def save(self):
+        """Enregistre l'index (dossier temporaire renommé à la fin, comme l'index BM25)."""
+        with self._lock:
+            if self._vectors is None:
+                return
+            count = len(self._entries)
+            vectors = self._vectors[:count].copy()
+            entries = [dict(entry, last_access=float(self._last_access[i])) for i, entry in enumerate(self._entries)]
+            self._unsaved = 0
+        parent = os.path.dirname(os.path.abspath(self.index_dir))
+        os.makedirs(parent, exist_ok=True)
+        with self._save_lock:
+            tmp_dir = tempfile.mkdtemp(dir=parent)
+            np.save(os.path.join(tmp_dir, "vectors.npy"), vectors)
+            with open(os.path.join(tmp_dir, "entries.json"), "w", encoding="utf-8") as f:
+                json.dump({"embed_model": self.embed_model, "entries": entries}, f, ensure_ascii=False)
+            if os.path.isdir(self.index_dir):
+                shutil.rmtree(self.index_dir)
+            os.replace(tmp_dir, self.index_dir)
+        logger.debug(f"Cache sémantique enregistré : {count} entrée(s) -> {self.index_dir}")
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.index_dir, "entries.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            vectors = np.load(os.path.join(self.index_dir, "vectors.npy"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache sémantique illisible, il repart de zéro : {e}")
+            return
+        entries = meta.get("entries", [])
+        if meta.get("embed_model") != self.embed_model or len(entries) != len(vectors):
+            logger.info("Cache sémantique construit avec un autre modèle d'embedding : il repart de zéro.")
+            return
+        now = time.time()
+        keep = [i for i, entry in enumerate(entries) if now - entry["created_at"] <= self.ttl_s]
+        keep = sorted(keep, key=lambda i: entries[i].get("last_access", 0), reverse=True)[:self.max_entries]
+        if not keep:
+            return
+        self._vectors = np.zeros((self.max_entries, vectors.shape[1]), dtype=np.float32)
+        self._vectors[:len(keep)] = vectors[keep]
+        for index, i in enumerate(keep):
+            entry = dict(entries[i])
+            self._set_row(index, entry, entry.pop("last_access", entry["created_at"]))
+            self._entries.append(entry)
+        metrics.gauge("chat.semantic_cache.entries").set(len(self._entries))
+        logger.info(f"Cache sémantique chargé : {len(self._entries)} entrée(s) depuis {self.index_dir}")
+
+    def purge(self, model=None):
+        """Supprime les entrées (toutes ou celles d'un modèle) ; retourne leur nombre."""
+        with self._lock:
+            keep = [i for i, entry in enumerate(self._entries) if model and entry["model"] != model]
+            deleted = len(self._entries) - len(keep)
+            if self._vectors is not None:
+                self._vectors[:len(keep)] = self._vectors[keep]
+            for array in (self._group_of, self._created_at, self._last_access):
+                array[:len(keep)] = array[keep]
+            self._group_of[len(keep):] = -1
+            self._last_access[len(keep):] = 0
+            self._entries = [self._entries[i] for i in keep]
+            self._unsaved += deleted
+        metrics.gauge("chat.semantic_cache.entries").set(len(self._entries))
+        self.save()
+        logger.info(f"Cache sémantique purgé : {deleted} entrée(s)")
+        return deleted
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "dimension": int(self._vectors.shape[1]) if self._vectors is not None else None,
+                "embed_model": self.embed_model,
+                "threshold": self.threshold,
+                "ttl_s": self.ttl_s,
+                "index_dir": self.index_dir,
+                "sample_rate": self.sample_rate
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_semantic_cache():
+    """Cache sémantique des réponses du LLM (None si SEMANTIC_CACHE_ENABLED est faux)."""
+    global _cache
+    if not Config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticCache(
+                    embed_model=Config.SEMANTIC_CACHE_EMBED_MODEL,
+                    index_dir=Config.SEMANTIC_CACHE_DIR,
+                    max_entries=Config.SEMANTIC_CACHE_MAX_ENTRIES,
+                    threshold=Config.SEMANTIC_CACHE_THRESHOLD,
+                    ttl_s=Config.LLM_CACHE_TTL,
+                    save_every=Config.SEMANTIC_CACHE_SAVE_EVERY,
+                    sample_rate=Config.SEMANTIC_CACHE_SAMPLE_RATE,
+                    samples_path=Config.SEMANTIC_CACHE_SAMPLES_PATH,
+                    embed_concurrency=Config.SEMANTIC_CACHE_EMBED_CONCURRENCY
+                )
+                atexit.register(_cache.save)
+    return _cache
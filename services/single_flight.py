@@ -0,0 +1,58 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Regroupe les appels concurrents portant la même clé : le premier exécute la fonction,
+    les suivants attendent et reçoivent le même résultat. Si le premier échoue, son exception n'est pas
+    partagée (elle peut lui être propre, ex. file de l'ordonnanceur pleine pour son utilisateur) :
+    chaque appel en attente retente pour son compte, en rejoignant ou en menant une nouvelle exécution.
+    Une fois l'appel terminé, la clé est libérée : un nouvel appel relance la fonction.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Retourne (résultat, partagé) ; `partagé` est vrai si l'appel a rejoint une exécution en cours."""
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                if call is not None:
+                    call.waiters += 1
+                    leader = False
+                else:
+                    call = _Call()
+                    self._calls[key] = call
+                    leader = True
+
+            if leader:
+                break
+            call.done.wait()
+            if call.error is None:
+                return call.result, True
+            # Échec du premier appel : nouvel essai (une seule exécution à la fois reste garantie)
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import tempfile
+import logging
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+
+# Configurer le logging
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Les fichiers restent servis par /uploads/<path> et /expert/uploads/<path>
+UPLOAD_ROOT = "uploads"
+BLOB_DIR = "blobs"
+TMP_DIR = "tmp"
+CHUNK_SIZE = 64 * 1024
+
+
+def blob_relative_path(digest, ext):
+    """Chemin relatif à uploads/ d'un contenu : blobs/ab/cd/<sha256><ext> (2 niveaux de 256 répertoires)."""
+    return "/".join([BLOB_DIR, digest[:2], digest[2:4], f"{digest}{ext.lower()}"])
+
+
+def _commit_temp_file(tmp_path, digest, ext):
+    """Renomme atomiquement le fichier temporaire vers son emplacement définitif (ou le supprime si doublon)."""
+    relative_path = blob_relative_path(digest, ext)
+    final_path = os.path.join(UPLOAD_ROOT, relative_path)
+    if os.path.exists(final_path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(tmp_path, final_path)
+    return relative_path
+
+
+def _temp_file():
+    tmp_dir = os.path.join(UPLOAD_ROOT, TMP_DIR)  # Même système de fichiers : os.replace est atomique
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+
+
+def store_stream(stream, ext):
+    """
+    Écrit un flux par morceaux dans un fichier temporaire en calculant son SHA-256,
+    puis le range sous son hash. Retourne (hash, chemin relatif, taille).
+    """
+    sha = hashlib.sha256()
+    size = 0
+    with _temp_file() as tmp:
+        try:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+        except Exception:
+            os.remove(tmp.name)
+            raise
+    digest = sha.hexdigest()
+    return digest, _commit_temp_file(tmp.name, digest, ext), size
+
+
+def store_bytes(data, ext, digest=None):
+    """Variante de store_stream pour un contenu déjà en mémoire (hash éventuellement déjà calculé)."""
+    digest = digest or hashlib.sha256(data).hexdigest()
+    relative_path = blob_relative_path(digest, ext)
+    if os.path.exists(os.path.join(UPLOAD_ROOT, relative_path)):
+        return digest, relative_path, len(data)
+    with _temp_file() as tmp:
+        tmp.write(data)
+    return digest, _commit_temp_file(tmp.name, digest, ext), len(data)
+
+
+def register_blob(digest, relative_path, size):
+    """
+    Insère la ligne Blob si elle n'existe pas encore (le commit reste à l'appelant) et retourne le chemin
+    relatif enregistré, qui fait foi : un même contenu reçu avec une autre extension reste servi depuis le
+    fichier déjà stocké. L'insertion se fait dans un SAVEPOINT : si un upload simultané du même contenu
+    l'a devancée, le conflit de clé n'annule que ce SAVEPOINT et la ligne existante est relue.
+    """
+    from models.blob import Blob
+    blob = db.session.get(Blob, digest)
+    if blob is None:
+        try:
+            with db.session.begin_nested():
+                blob = Blob(hash=digest, path=relative_path, size=size)
+                db.session.add(blob)
+        except IntegrityError:
+            # Lecture verrouillante : voit la ligne validée par l'autre transaction
+            blob = db.session.get(Blob, digest, with_for_update={"read": True}, populate_existing=True)
+            logger.debug(f"Blob {digest[:12]} déjà enregistré par un upload simultané")
+    return blob.path
+
+
+def add_reference(digest, record_type, record_id):
+    """Lie un enregistrement (PlantDisease, PublicRequest, SessionMessage) à un blob (commit à l'appelant)."""
+    from models.blob import BlobReference
+    db.session.add(BlobReference(blob_hash=digest, record_type=record_type, record_id=record_id))
+
+
+def save_upload(file_storage, ext):
+    """
+    Enregistre un fichier uploadé (FileStorage) dans le stockage adressé par contenu.
+    Retourne (hash, URL publique /uploads/...) ; la ligne Blob est ajoutée à la session.
+    """
+    digest, relative_path, size = store_stream(file_storage.stream, ext)
+    relative_path = register_blob(digest, relative_path, size)
+    logger.debug(f"Fichier stocké - hash: {digest[:12]}, chemin: {relative_path}, taille: {size}")
+    return digest, f"/{UPLOAD_ROOT}/{relative_path}"